@@ -3,88 +3,181 @@ import json
 import logging
 import os
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 
-# Setup logging
-log_dir = os.path.join(os.path.dirname(__file__), '..', 'logs')
-os.makedirs(log_dir, exist_ok=True)
-logging.basicConfig(
-    filename=os.path.join(log_dir, 'opsbot.log'),
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    force=True
-)
-console = logging.StreamHandler()
-console.setLevel(logging.INFO)
-console.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-logging.getLogger().addHandler(console)
+from prometheus import MEMORY_RANGE_QUERY, PROCESS_QUERY, query, query_range, parse_range_series, parse_processes
+from trend import analyze_series
+from loki import LokiTail
+from local_logs import LocalLogSource
+from log_templates import TemplateMiner, render
+import rules
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Runs the Prometheus range query while the Loki query is in flight
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="analyze")
+
+# Error lines are tailed incrementally; the analysis window is served from
+# the tail's ring buffer instead of re-downloading it every cycle.
+log_tail = LokiTail()
+
+# When Loki fails or is slower than its budget, the window is read from the
+# local log files instead, and Loki is left alone for LOKI_RETRY_AFTER.
+local_logs = LocalLogSource()
+LOKI_BUDGET = float(os.environ.get("OPSBOT_LOKI_BUDGET", "3"))
+LOKI_RETRY_AFTER = float(os.environ.get("OPSBOT_LOKI_RETRY_AFTER", "60"))
+_loki_down_until = [0.0]
+
+# Window lines are collapsed into templates before they reach Slack, the
+# history store and the LLM prompt; the miner keeps learning across cycles.
+template_miner = TemplateMiner()
+LOG_TOKENS = int(os.environ.get("OPSBOT_LOG_TOKENS", "300"))
+
+# Concurrent per-target analyses of one cycle share a single query per report
+_reports = {}
+_reports_lock = threading.Lock()
 
 def analyze_memory_patterns(timestamp, current_memory_usage):
     try:
         start_time = timestamp - 3600  # Last hour
         end_time = timestamp
         step = "60s"  # 1-minute intervals
-        query = '100 - (avg by(instance) (node_memory_MemAvailable_bytes / node_memory_MemTotal_bytes) * 100)'
-        prometheus_url = f"http://localhost:9090/api/v1/query_range?query={query}&start={start_time}&end={end_time}&step={step}"
-        
-        response = requests.get(prometheus_url, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        
-        values = data['data']['result'][0]['values'] if data['data']['result'] else []
-        if not values:
-            return "No memory usage data available from Prometheus"
-        
-        memory_usages = [float(v[1]) for v in values]
-        avg_memory = sum(memory_usages) / len(memory_usages)
-        trend = "increasing" if memory_usages[-1] > memory_usages[0] else "stable or decreasing"
-        
-        analysis = f"Memory usage over the last hour: avg {avg_memory:.2f}%, current {current_memory_usage:.2f}%, trend: {trend}."
-        if memory_usages[-1] > 20:
-            analysis += " High memory usage detected. Suggest setting Docker memory limits and investigating memory leaks."
-        return analysis
+        result = query_range(MEMORY_RANGE_QUERY, start_time, end_time, step=step)
+        series = [(instance, timestamps, values) for _, instance, timestamps, values in parse_range_series(result)]
+        return {"current": current_memory_usage, "series": analyze_series(series)}
+    except Exception as e:
+        logger.error("Memory pattern analysis error: %s", e)
+        return {"current": current_memory_usage, "series": [], "error": str(e)}
+
+def analyze_processes():
+    try:
+        return {"processes": parse_processes(query(PROCESS_QUERY))}
     except Exception as e:
-        logging.error(f"Memory pattern analysis error: {str(e)}")
-        return f"Error analyzing memory patterns: {str(e)}"
+        logger.error("Process analysis error: %s", e)
+        return {"processes": [], "error": str(e)}
+
+def shared_report(name, timestamp, fn, *args):
+    with _reports_lock:
+        future = _reports.get((name, timestamp))
+        if future is not None:
+            metrics.CACHE_HITS.labels(name).inc()
+        else:
+            metrics.CACHE_MISSES.labels(name).inc()
+            for key in [key for key in _reports if key[1] < timestamp - 300]:
+                del _reports[key]
+            future = _reports[(name, timestamp)] = _executor.submit(fn, *args)
+    return future
+
+def memory_report_future(timestamp, current_memory_usage):
+    return shared_report("memory_report", timestamp, analyze_memory_patterns, timestamp, current_memory_usage)
+
+def process_report_future(timestamp):
+    return shared_report("process_report", timestamp, analyze_processes)
+
+def memory_report_for(report, current_memory_usage, instance=None):
+    if instance is None:
+        return report
+    series = [s for s in report["series"] if s["instance"] == instance] or report["series"]
+    return {**report, "current": current_memory_usage, "series": series}
+
+def describe_memory_patterns(report):
+    if report.get("error"):
+        return f"Error analyzing memory patterns: {report['error']}"
+    if not report["series"]:
+        return "No memory usage data available from Prometheus"
+    sentences = []
+    for series in report["series"]:
+        sentence = (
+            f"Memory usage on {series['instance']} over the last hour: avg {series['mean']:.2f}%, "
+            f"p90 {series['p90']:.2f}%, current {series['current']:.2f}%, "
+            f"trend: {series['trend']} ({series['slope_per_hour']:+.2f}%/h)."
+        )
+        if series["exhaustion_seconds"] is not None:
+            sentence += f" Projected to exhaust memory in {series['exhaustion_seconds'] / 3600:.1f}h."
+        sentences.append(sentence)
+    if any(series["trend"] == "leak" for series in report["series"]):
+        sentences.append("Memory growth looks like a leak. Suggest setting Docker memory limits and investigating memory leaks.")
+    elif any(series["current"] > 20 for series in report["series"]):
+        sentences.append("High memory usage detected. Suggest setting Docker memory limits and investigating memory leaks.")
+    return " ".join(sentences)
+
+def describe_processes(report, instance=None, top=3):
+    """Name the busiest processes, preferring those on the anomalous instance."""
+    processes = [p for p in report["processes"] if p["instance"] == instance] or report["processes"]
+    if not processes:
+        return ""
+    busiest = sorted(processes, key=lambda p: p["cpu"], reverse=True)[:top]
+    described = ", ".join(
+        f"pid {p['pid']} ({p['role']}) on {p['instance']} {p['cpu']:.2f} cores / {p['rss'] / 1048576:.0f} MB"
+        for p in busiest
+    )
+    return f"Busiest app processes: {described}."
+
+def fetch_log_window(timestamp, start_time, end_time):
+    """Error lines for the window and where they came from ("loki" or "local files")."""
+    if time.monotonic() >= _loki_down_until[0]:
+        # One poll per cycle, shared by every target; if it overruns it keeps
+        # running in the background and still fills the tail's ring buffer
+        future = shared_report("loki_poll", timestamp, log_tail.poll, 300, LOKI_BUDGET)
+        try:
+            new_logs = future.result(timeout=LOKI_BUDGET)
+            logger.debug("Fetched %d new log lines from Loki", len(new_logs))
+            return log_tail.window(start_time, end_time), "loki"
+        except FutureTimeout:
+            reason = "slow"
+            logger.warning("Loki exceeded its %.1fs budget, reading local log files", LOKI_BUDGET)
+        except (requests.exceptions.RequestException, KeyError, TypeError, ValueError) as e:
+            # ValueError covers an unparseable body, KeyError/TypeError a malformed one
+            reason = "error"
+            logger.warning("Loki query failed, reading local log files for %.0fs: %r", LOKI_RETRY_AFTER, e)
+        _loki_down_until[0] = time.monotonic() + LOKI_RETRY_AFTER
+        metrics.LOG_FALLBACKS.labels(reason).inc()
+    return local_logs.window(start_time, end_time), "local files"
 
 def analyze_logs(input_data):
     try:
         data = json.loads(input_data) if isinstance(input_data, str) else input_data
         timestamp = data.get("timestamp", int(time.time()))
         memory_usage = data.get("memory_usage", 0)
+        instance = data.get("instance")
+        memory_future = memory_report_future(timestamp, memory_usage)
+        process_future = process_report_future(timestamp)
 
-        # Query logs within 5 minutes to ensure freshness
+        # Analyze logs within 5 minutes to ensure freshness
         start_time = timestamp - 300
         end_time = timestamp + 300
-        loki_url = f"http://localhost:3100/loki/api/v1/query_range?query={{job=\"varlogs\"}} |= \"ERROR\"&start={start_time}&end={end_time}&limit=100"
-        
-        for attempt in range(3):
-            try:
-                logging.info(f"[DEBUG] Querying Loki (attempt {attempt + 1}): {loki_url}")
-                response = requests.get(loki_url, timeout=10)
-                response.raise_for_status()
-                logs_data = response.json()
-                
-                logs = [entry[1] for stream in logs_data['data']['result'] for entry in stream['values']]
-                logging.info(f"[DEBUG] Logs retrieved: {logs}")
-
-                if not logs:
-                    logging.info("No logs found in Loki")
-                    return {"logs": "", "analysis": "No recent logs available, check Loki and Promtail configurations", "actionable": False}
-
-                logs_str = "\n".join(logs)
-                analysis = "Possible causes for high CPU usage include an OutOfMemory error or infinite loop. "
-                analysis += analyze_memory_patterns(timestamp, memory_usage)
-                analysis += " Suggested remediation: Restart the app container and investigate the application code for memory leaks or infinite loops."
-                logging.info(f"Log analysis completed: {{'logs': '{logs_str}', 'analysis': '{analysis}', 'actionable': True}}")
-                return {"logs": logs_str, "analysis": analysis, "actionable": True}
-
-            except requests.exceptions.RequestException as e:
-                logging.warning(f"Loki query attempt {attempt + 1} failed: {str(e)}")
-                time.sleep(2)
-        
-        logging.error("All Loki query attempts failed")
-        return {"logs": "", "analysis": "Failed to query Loki after multiple attempts", "actionable": False}
+
+        logs, source = fetch_log_window(timestamp, start_time, end_time)
+        if not logs:
+            logger.info("No logs found in %s", source)
+            return {"logs": "", "analysis": f"No recent logs available from {source}, check Loki and Promtail configurations",
+                    "actionable": False, "log_source": source}
+
+        classification = rules.engine.classify(logs)
+        templates = template_miner.summarize(logs)
+        for template in templates:
+            rule = rules.engine.classify_line(template["template"])
+            template["category"] = rule.category if rule else None
+        # Known failure patterns first, so a budget never cuts them
+        templates.sort(key=lambda template: (template["category"] is None, -template["count"]))
+        logs_str = render(templates, LOG_TOKENS)
+        memory = memory_report_for(memory_future.result(), memory_usage, instance)
+        analysis = " ".join(part for part in [
+            rules.describe_classification(classification),
+            describe_memory_patterns(memory),
+            describe_processes(process_future.result(), instance),
+            rules.describe_actions(classification),
+            "Logs were read from local files because Loki was unavailable." if source != "loki" else ""
+        ] if part)
+        actionable = bool(classification["actions"])
+        logger.info("Log analysis for %s: %d lines (%d templates) from %s, %d matched, actionable=%s",
+                    instance, len(logs), len(templates), source, classification["matched"], actionable)
+        logger.debug("Log analysis detail for %s: %s", instance, analysis)
+        return {"logs": logs_str, "templates": templates, "analysis": analysis, "actionable": actionable,
+                "memory": memory, "classification": classification, "log_source": source}
 
     except Exception as e:
-        logging.error(f"Analyze logs error: {str(e)}", exc_info=True)
+        logger.exception("Analyze logs error: %s", e)
         return {"logs": "", "analysis": f"Error analyzing logs: {str(e)}", "actionable": False}
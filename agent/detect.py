@@ -0,0 +1,174 @@
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass, replace
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Streaming anomaly detection over per-metric, per-instance sample windows
+
+
+@dataclass
+class DetectorConfig:
+    threshold: float = 80.0     # static ceiling in percent
+    sustained: float = 30.0     # seconds above threshold before firing
+    ewma_alpha: float = 0.3     # smoothing factor for the EWMA level
+    zscore: float = 3.0         # spike threshold against the rolling window
+    window: int = 120           # samples kept per series
+    min_samples: int = 10       # samples needed before z-scores are trusted
+    spike_floor: float = 0.5    # spikes only count above this fraction of threshold
+    min_std: float = 1.0        # std floor in percentage points for z-scores
+
+
+# Rules that make a target anomalous. A z-score spike is reported with the
+# detections but acts only once the EWMA or sustained rule agrees.
+ANOMALY_RULES = ("sustained", "ewma")
+
+DETECTORS = {
+    "cpu": DetectorConfig(),
+    "memory": DetectorConfig(sustained=60.0, ewma_alpha=0.1)
+}
+
+# Per-metric overrides, e.g. OPSBOT_DETECTORS='{"cpu": {"threshold": 90}}'
+for _metric, _overrides in json.loads(os.environ.get("OPSBOT_DETECTORS", "{}")).items():
+    DETECTORS[_metric] = replace(DETECTORS.get(_metric, DetectorConfig()), **_overrides)
+
+
+class SeriesState:
+    """Fixed-size ring buffer with O(1) rolling mean/std and EWMA."""
+
+    def __init__(self, config):
+        self.config = config
+        self.values = np.zeros(config.window)
+        self.count = 0
+        self.index = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.updates = 0
+        self.ewma = None
+        self.above_since = None
+        self.last_timestamp = None
+
+    def stats(self):
+        if self.count == 0:
+            return 0.0, 0.0
+        mean = self.total / self.count
+        variance = max(self.total_sq / self.count - mean * mean, 0.0)
+        return mean, variance ** 0.5
+
+    def push(self, timestamp, value):
+        if self.count == self.config.window:
+            old = self.values[self.index]
+            self.total -= old
+            self.total_sq -= old * old
+        else:
+            self.count += 1
+        self.values[self.index] = value
+        self.index = (self.index + 1) % self.config.window
+        self.total += value
+        self.total_sq += value * value
+        self.updates += 1
+        # Re-anchor the running sums periodically so float error cannot drift
+        if self.updates % self.config.window == 0:
+            live = self.values[:self.count]
+            self.total = float(live.sum())
+            self.total_sq = float(np.dot(live, live))
+
+        alpha = self.config.ewma_alpha
+        self.ewma = value if self.ewma is None else alpha * value + (1 - alpha) * self.ewma
+        if value > self.config.threshold:
+            if self.above_since is None:
+                self.above_since = timestamp
+        else:
+            self.above_since = None
+        self.last_timestamp = timestamp
+
+    def seed(self, timestamps, values):
+        values = np.asarray(values, dtype=float)[-self.config.window:]
+        timestamps = np.asarray(timestamps, dtype=float)[-self.config.window:]
+        if values.size == 0:
+            return
+        self.count = values.size
+        self.values[:self.count] = values
+        self.index = self.count % self.config.window
+        self.total = float(values.sum())
+        self.total_sq = float(np.dot(values, values))
+
+        # Closed-form EWMA over the seed window
+        alpha = self.config.ewma_alpha
+        weights = alpha * (1 - alpha) ** np.arange(values.size - 1, -1, -1)
+        weights[0] = (1 - alpha) ** (values.size - 1)
+        self.ewma = float(np.dot(weights, values))
+
+        below = np.nonzero(values <= self.config.threshold)[0]
+        if below.size == values.size:
+            self.above_since = None
+        elif below.size == 0:
+            self.above_since = float(timestamps[0])
+        else:
+            tail = below[-1] + 1
+            self.above_since = float(timestamps[tail]) if tail < values.size else None
+        self.last_timestamp = float(timestamps[-1])
+
+    def evaluate(self, timestamp, value):
+        """Score a new sample against the window, then add it."""
+        config = self.config
+        mean, std = self.stats()
+        # A flat baseline would turn a few points of jitter into a huge z-score
+        std = max(std, config.min_std)
+        zscore = (value - mean) / std if std > 0 and self.count >= config.min_samples else 0.0
+        self.push(timestamp, value)
+
+        rules = []
+        if self.above_since is not None and timestamp - self.above_since >= config.sustained:
+            rules.append("sustained")
+        if self.ewma > config.threshold:
+            rules.append("ewma")
+        if zscore >= config.zscore and value >= config.spike_floor * config.threshold:
+            rules.append("spike")
+        return {
+            "value": value,
+            "ewma": round(self.ewma, 2),
+            "zscore": round(float(zscore), 2),
+            "rules": rules
+        }
+
+
+class AnomalyDetector:
+    def __init__(self, detectors=None):
+        self.detectors = detectors or DETECTORS
+        self.series = {}
+        # Ring buffers are not thread-safe; a monitor call abandoned at its
+        # deadline may still be feeding them when the next one starts
+        self.lock = threading.Lock()
+
+    def _state(self, metric, instance):
+        key = (metric, instance)
+        state = self.series.get(key)
+        if state is None:
+            state = self.series[key] = SeriesState(self.detectors.get(metric, DetectorConfig()))
+        return state
+
+    def seed(self, metric, instance, timestamps, values):
+        with self.lock:
+            self._state(metric, instance).seed(timestamps, values)
+
+    def update(self, metric, instance, timestamp, value):
+        with self.lock:
+            verdict = self._state(metric, instance).evaluate(timestamp, value)
+        verdict.update({"metric": metric, "instance": instance})
+        return verdict
+
+    def evaluate(self, series):
+        """Feed (metric, instance, timestamp, value) samples; return fired verdicts."""
+        fired = []
+        for metric, instance, timestamp, value in series:
+            verdict = self.update(metric, instance, timestamp, value)
+            if verdict["rules"]:
+                fired.append(verdict)
+        if fired:
+            logger.info("Detectors fired: %s", fired)
+        return fired
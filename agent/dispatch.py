@@ -0,0 +1,235 @@
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Durable outbound notification queue with a background delivery worker
+log_dir = os.path.join(os.path.dirname(__file__), '..', 'logs')
+QUEUE_DB = os.environ.get("OPSBOT_QUEUE_DB", os.path.join(log_dir, 'notify_queue.db'))
+
+MAX_ATTEMPTS = 6
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 60.0
+DELIVERY_TIMEOUT = 10
+IDLE_WAIT = 5.0
+# Rate-limited retries do not use up attempts, so they are bounded by age
+MAX_RATE_LIMITED_AGE = 3600.0
+# Delivered and failed rows are kept this long, then pruned
+RETENTION = float(os.environ.get("OPSBOT_QUEUE_RETENTION", str(7 * 86400)))
+PRUNE_INTERVAL = 3600.0
+
+
+class DeliveryResult:
+    def __init__(self, ok, retryable=True, retry_after=None, error=None):
+        self.ok = ok
+        self.retryable = retryable
+        self.retry_after = retry_after
+        self.error = error
+
+
+class SlackSink:
+    """Posts payloads to a Slack incoming webhook."""
+
+    def __init__(self, webhook_url):
+        self.webhook_url = webhook_url
+
+    def deliver(self, session, payload):
+        try:
+            response = session.post(self.webhook_url, json=payload, timeout=DELIVERY_TIMEOUT)
+        except requests.exceptions.RequestException as e:
+            return DeliveryResult(False, error=str(e))
+        if response.status_code == 200:
+            return DeliveryResult(True)
+        error = f"{response.status_code} - {response.text}"
+        if response.status_code == 429:
+            try:
+                retry_after = float(response.headers.get("Retry-After", 1))
+            except ValueError:
+                retry_after = 1.0
+            return DeliveryResult(False, retry_after=retry_after, error=error)
+        return DeliveryResult(False, retryable=response.status_code >= 500, error=error)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return round(sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))], 3)
+
+
+def backoff_delay(attempts):
+    """Full-jitter exponential backoff."""
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempts))
+
+
+class Dispatcher:
+    """Delivers queued payloads; on_delivered(sink, record) is called with the
+    record stored alongside each payload once the sink accepts it."""
+
+    def __init__(self, db_path=QUEUE_DB, max_attempts=MAX_ATTEMPTS, on_delivered=None):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.on_delivered = on_delivered
+        self.sinks = {}
+        self.latencies = deque(maxlen=500)
+        self.cond = threading.Condition()
+        self.worker = None
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=4)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    sink TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    enqueued_at REAL NOT NULL,
+                    next_attempt_at REAL NOT NULL,
+                    delivered_at REAL,
+                    last_error TEXT,
+                    record TEXT
+                )
+            """)
+            # Queues created before records were stored lack the column
+            columns = [row[1] for row in self.conn.execute("PRAGMA table_info(outbox)")]
+            if "record" not in columns:
+                self.conn.execute("ALTER TABLE outbox ADD COLUMN record TEXT")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, next_attempt_at)")
+
+    def register_sink(self, name, sink):
+        self.sinks[name] = sink
+
+    def enqueue(self, sink, payload, record=None):
+        """Persist a payload for delivery and wake the worker; returns its id."""
+        now = time.time()
+        with self.cond:
+            with self.conn:
+                cursor = self.conn.execute(
+                    "INSERT INTO outbox (sink, payload, enqueued_at, next_attempt_at, record) VALUES (?, ?, ?, ?, ?)",
+                    (sink, json.dumps(payload), now, now, json.dumps(record) if record is not None else None)
+                )
+            self.cond.notify()
+        self.start()
+        return cursor.lastrowid
+
+    def start(self):
+        if self.worker is None or not self.worker.is_alive():
+            with self.cond:
+                if self.worker is None or not self.worker.is_alive():
+                    self.worker = threading.Thread(target=self._run, name="notify-dispatcher", daemon=True)
+                    self.worker.start()
+
+    def _next_due(self):
+        with self.cond:
+            row = self.conn.execute(
+                "SELECT id, sink, payload, attempts, enqueued_at, record, next_attempt_at FROM outbox "
+                "WHERE status = 'pending' ORDER BY next_attempt_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                self.cond.wait(IDLE_WAIT)
+                return None
+            wait = row[6] - time.time()
+            if wait > 0:
+                self.cond.wait(min(wait, IDLE_WAIT))
+                return None
+            return row
+
+    def prune(self, now=None):
+        """Delete delivered and failed rows older than RETENTION; returns how many."""
+        cutoff = (time.time() if now is None else now) - RETENTION
+        with self.cond:
+            with self.conn:
+                cursor = self.conn.execute(
+                    "DELETE FROM outbox WHERE status != 'pending' AND COALESCE(delivered_at, next_attempt_at) < ?", (cutoff,)
+                )
+        if cursor.rowcount:
+            logger.info("Pruned %d finished notifications from the queue", cursor.rowcount)
+        return cursor.rowcount
+
+    def _run(self):
+        pruned_at = 0.0
+        while True:
+            try:
+                if time.monotonic() - pruned_at >= PRUNE_INTERVAL:
+                    pruned_at = time.monotonic()
+                    self.prune()
+                row = self._next_due()
+                if row is not None:
+                    self._deliver(*row[:6])
+            except Exception as e:
+                logger.exception("Notification dispatcher error: %s", e)
+                time.sleep(IDLE_WAIT)
+
+    def _update(self, sql, params):
+        with self.cond:
+            with self.conn:
+                self.conn.execute(sql, params)
+
+    def _deliver(self, item_id, sink_name, payload, attempts, enqueued_at, record=None):
+        sink = self.sinks.get(sink_name)
+        if sink is None:
+            self._update("UPDATE outbox SET status = 'failed', last_error = ? WHERE id = ?", (f"unknown sink {sink_name}", item_id))
+            metrics.NOTIFICATIONS.labels(sink_name, "failed").inc()
+            logger.error("Notification %s dropped: unknown sink %s", item_id, sink_name)
+            return
+        result = sink.deliver(self.session, json.loads(payload))
+        now = time.time()
+        if result.ok:
+            self._update("UPDATE outbox SET status = 'delivered', delivered_at = ?, attempts = ? WHERE id = ?", (now, attempts + 1, item_id))
+            metrics.NOTIFICATIONS.labels(sink_name, "delivered").inc()
+            latency = now - enqueued_at
+            self.latencies.append(latency)
+            logger.info("Notification %s delivered to %s after %.2fs (%d attempts)", item_id, sink_name, latency, attempts + 1)
+            if record is not None and self.on_delivered is not None:
+                try:
+                    self.on_delivered(sink_name, json.loads(record))
+                except Exception as e:
+                    logger.exception("Delivery callback error for notification %s: %s", item_id, e)
+            return
+        if result.retry_after is not None and now - enqueued_at < MAX_RATE_LIMITED_AGE:
+            # Rate limited: wait as long as the sink asks without using up the retry budget
+            self._update("UPDATE outbox SET next_attempt_at = ?, last_error = ? WHERE id = ?", (now + result.retry_after, result.error, item_id))
+            metrics.NOTIFICATIONS.labels(sink_name, "rate_limited").inc()
+            logger.warning("Notification %s rate limited by %s, retrying in %ss", item_id, sink_name, result.retry_after)
+            return
+        attempts += 1
+        if result.retry_after is not None:
+            result.error = f"{result.error} (still rate limited after {MAX_RATE_LIMITED_AGE:.0f}s)"
+            result.retryable = False
+        if not result.retryable or attempts >= self.max_attempts:
+            self._update("UPDATE outbox SET status = 'failed', attempts = ?, last_error = ? WHERE id = ?", (attempts, result.error, item_id))
+            metrics.NOTIFICATIONS.labels(sink_name, "failed").inc()
+            logger.error("Notification %s to %s failed permanently: %s", item_id, sink_name, result.error)
+            return
+        delay = backoff_delay(attempts)
+        self._update("UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?", (attempts, now + delay, result.error, item_id))
+        metrics.NOTIFICATIONS.labels(sink_name, "retry").inc()
+        logger.warning("Notification %s to %s failed (%s), retry %d in %.1fs", item_id, sink_name, result.error, attempts, delay)
+
+    def stats(self):
+        """Queue depth and enqueue-to-delivery latency percentiles."""
+        with self.cond:
+            counts = dict(self.conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+        latencies = sorted(self.latencies)
+        return {
+            "queue": counts,
+            "latency_p50": percentile(latencies, 0.5),
+            "latency_p95": percentile(latencies, 0.95),
+            "delivered": len(latencies)
+        }
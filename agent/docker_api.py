@@ -0,0 +1,85 @@
+import http.client
+import json
+import os
+import queue
+import socket
+from urllib.parse import quote
+
+# Minimal Docker Engine API client over the local unix socket
+DOCKER_SOCKET = os.environ.get("DOCKER_SOCKET", "/var/run/docker.sock")
+
+
+class DockerAPIError(Exception):
+    def __init__(self, status, message):
+        super().__init__(f"Docker API {status}: {message}")
+        self.status = status
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout=30):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+class DockerClient:
+    """Keep-alive connection pool to the Docker daemon."""
+
+    def __init__(self, socket_path=DOCKER_SOCKET, pool_size=4, timeout=30):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.pool = queue.LifoQueue(maxsize=pool_size)
+
+    def _acquire(self):
+        try:
+            return self.pool.get_nowait()
+        except queue.Empty:
+            return UnixHTTPConnection(self.socket_path, timeout=self.timeout)
+
+    def _release(self, conn):
+        try:
+            self.pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def request(self, method, path, timeout=None):
+        """Send one request and return (status, decoded JSON body or None)."""
+        # A pooled connection may have been closed by the daemon; retry once
+        # on a fresh connection before giving up.
+        for attempt in range(2):
+            conn = self._acquire() if attempt == 0 else UnixHTTPConnection(self.socket_path, timeout=self.timeout)
+            try:
+                conn.timeout = timeout or self.timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(conn.timeout)
+                conn.request(method, path, headers={"Host": "docker"})
+                response = conn.getresponse()
+                body = response.read()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                conn.close()
+                if attempt == 1:
+                    raise
+                continue
+            except Exception:
+                conn.close()
+                raise
+            if response.will_close:
+                conn.close()
+            else:
+                self._release(conn)
+            data = json.loads(body) if body and response.getheader("Content-Type", "").startswith("application/json") else None
+            if response.status >= 400:
+                message = data.get("message") if isinstance(data, dict) else body.decode(errors="replace")
+                raise DockerAPIError(response.status, message)
+            return response.status, data
+
+    def restart(self, container, stop_timeout=10):
+        self.request("POST", f"/containers/{quote(container)}/restart?t={stop_timeout}", timeout=stop_timeout + self.timeout)
+
+    def inspect(self, container):
+        return self.request("GET", f"/containers/{quote(container)}/json")[1]
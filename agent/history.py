@@ -0,0 +1,181 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Incident history store shared by the agent and the dashboard
+log_dir = os.path.join(os.path.dirname(__file__), '..', 'logs')
+DB_PATH = os.environ.get("OPSBOT_HISTORY_DB", os.path.join(log_dir, 'incidents.db'))
+LEGACY_JSON = os.path.join(log_dir, 'notification_history.json')
+
+SCHEMA_VERSION = 2
+COLUMNS = ("id", "timestamp", "instance", "cpu_usage", "memory_usage", "severity", "analysis", "logs", "remediation", "summary")
+
+INSERT_SQL = (
+    "INSERT INTO incidents (timestamp, cpu_usage, memory_usage, severity, analysis, logs, remediation, summary, instance) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = False
+
+
+def classify_severity(cpu_usage, memory_usage=None):
+    usages = [u for u in (cpu_usage, memory_usage) if isinstance(u, (int, float))]
+    peak = max(usages) if usages else 0
+    if peak >= 95:
+        return "critical"
+    if peak > 80:
+        return "warning"
+    return "info"
+
+
+def _connect():
+    conn = sqlite3.connect(DB_PATH, timeout=10)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def _get_connection():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        init_store()
+        conn = _local.conn = _connect()
+    return conn
+
+
+def init_store():
+    """Create the schema and import the legacy JSON history exactly once."""
+    global _initialized
+    if _initialized:
+        return
+    with _init_lock:
+        if _initialized:
+            return
+        os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+        conn = _connect()
+        try:
+            # BEGIN IMMEDIATE serializes the agent and the dashboard so the
+            # legacy file is imported by whichever process gets here first.
+            conn.isolation_level = None
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS incidents (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        timestamp INTEGER NOT NULL,
+                        cpu_usage REAL,
+                        memory_usage REAL,
+                        severity TEXT NOT NULL,
+                        analysis TEXT,
+                        logs TEXT,
+                        remediation TEXT,
+                        summary TEXT
+                    )
+                """)
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_incidents_timestamp ON incidents(timestamp)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_incidents_remediation ON incidents(remediation, timestamp)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_incidents_severity ON incidents(severity, timestamp)")
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                if version < 2:
+                    conn.execute("ALTER TABLE incidents ADD COLUMN instance TEXT")
+                    conn.execute("CREATE INDEX IF NOT EXISTS idx_incidents_instance ON incidents(instance, timestamp)")
+                if version < 1:
+                    migrate_json_history(conn, LEGACY_JSON)
+                if version < SCHEMA_VERSION:
+                    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+        _initialized = True
+
+
+def migrate_json_history(conn, path):
+    if not os.path.exists(path):
+        return 0
+    try:
+        with open(path, 'r') as f:
+            entries = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error("Could not read legacy history %s: %s", path, e)
+        return 0
+    conn.executemany(INSERT_SQL, [_row_values(entry) for entry in entries])
+    logger.info("Migrated %d entries from %s into the incident store", len(entries), path)
+    return len(entries)
+
+
+def _number_or_none(value):
+    return value if isinstance(value, (int, float)) else None
+
+
+def _row_values(entry):
+    cpu_usage = _number_or_none(entry.get("cpu_usage"))
+    memory_usage = _number_or_none(entry.get("memory_usage"))
+    return (
+        int(entry.get("timestamp", time.time())),
+        cpu_usage,
+        memory_usage,
+        entry.get("severity") or classify_severity(cpu_usage, memory_usage),
+        entry.get("analysis"),
+        entry.get("logs"),
+        entry.get("remediation"),
+        entry.get("summary"),
+        entry.get("instance")
+    )
+
+
+def append_entry(entry):
+    """Append one history entry and return its row id."""
+    conn = _get_connection()
+    with conn:
+        cursor = conn.execute(INSERT_SQL, _row_values(entry))
+    return cursor.lastrowid
+
+
+def set_summary(timestamp, summary, instance=None):
+    """Attach an LLM summary to the latest entry recorded at timestamp."""
+    conn = _get_connection()
+    with conn:
+        cursor = conn.execute(
+            "UPDATE incidents SET summary = ? WHERE id = "
+            "(SELECT id FROM incidents WHERE timestamp = ? AND (? IS NULL OR instance = ?) ORDER BY id DESC LIMIT 1)",
+            (summary, timestamp, instance, instance)
+        )
+    return cursor.rowcount > 0
+
+
+def query_entries(start=None, end=None, action=None, severity=None, instance=None, limit=100):
+    """Return the newest entries matching the filters, newest first."""
+    clauses, params = [], []
+    if start is not None:
+        clauses.append("timestamp >= ?")
+        params.append(int(start))
+    if end is not None:
+        clauses.append("timestamp <= ?")
+        params.append(int(end))
+    if action is not None:
+        clauses.append("remediation = ?")
+        params.append(action)
+    if severity is not None:
+        clauses.append("severity = ?")
+        params.append(severity)
+    if instance is not None:
+        clauses.append("instance = ?")
+        params.append(instance)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    params.append(int(limit))
+    rows = _get_connection().execute(
+        f"SELECT {', '.join(COLUMNS)} FROM incidents {where} ORDER BY timestamp DESC, id DESC LIMIT ?",
+        params
+    ).fetchall()
+    return [dict(row) for row in rows]
@@ -0,0 +1,254 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import history
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Incident lifecycle shared across cycles (and agent restarts). An anomaly
+# is fingerprinted by target alone; the metrics that fired are merged into
+# the open incident and its log signature is updated as the logs change.
+# Repeats of an open incident are suppressed, so remediation, Slack and the
+# LLM run once per transition instead of once per cycle:
+#
+#   open -> mitigating -> cooldown -> (still firing) mitigating -> ...
+#   any active state -> resolved once unseen for RESOLVE_AFTER cycles
+#
+# A restart blocked by the cooldown or the circuit breaker sends the
+# incident straight to cooldown; an open breaker is reported once.
+DB_PATH = os.environ.get("OPSBOT_INCIDENT_DB", history.DB_PATH)
+RESTART_COOLDOWN = float(os.environ.get("OPSBOT_RESTART_COOLDOWN", "300"))
+RESOLVE_AFTER = int(os.environ.get("OPSBOT_RESOLVE_AFTER", "2"))
+# Circuit breaker: no more restarts of a container once it has been
+# restarted this many times within the window.
+BREAKER_RESTARTS = int(os.environ.get("OPSBOT_BREAKER_RESTARTS", "3"))
+BREAKER_WINDOW = float(os.environ.get("OPSBOT_BREAKER_WINDOW", "1800"))
+
+
+def fingerprint(anomaly):
+    """Incidents are keyed by target, so a metric that starts firing during
+    an outage joins the open incident instead of opening a second one."""
+    return hashlib.sha1(str(anomaly.get("instance")).encode()).hexdigest()[:16]
+
+
+def fired_metrics(anomaly):
+    return sorted({detection.get("metric") for detection in anomaly.get("detections", []) if detection.get("metric")})
+
+
+def signature(fired, analysis):
+    classification = analysis.get("classification") or {}
+    categories = sorted(category["category"] for category in classification.get("categories", []))
+    return f"{','.join(fired) or 'unknown'}|{','.join(categories) or 'no-logs'}"
+
+
+class IncidentTracker:
+    def __init__(self, db_path=DB_PATH, cooldown=RESTART_COOLDOWN, resolve_after=RESOLVE_AFTER,
+                 breaker_restarts=BREAKER_RESTARTS, breaker_window=BREAKER_WINDOW, clock=time.time):
+        self.db_path = db_path
+        self.cooldown = cooldown
+        self.resolve_after = resolve_after
+        self.breaker_restarts = breaker_restarts
+        self.breaker_window = breaker_window
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.conn = None
+
+    def _connection(self):
+        if self.conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS tracked_incidents (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        fingerprint TEXT NOT NULL,
+                        instance TEXT,
+                        container TEXT,
+                        signature TEXT,
+                        state TEXT NOT NULL,
+                        opened_at REAL NOT NULL,
+                        last_seen REAL NOT NULL,
+                        cooldown_until REAL,
+                        resolved_at REAL,
+                        cycles INTEGER NOT NULL DEFAULT 1,
+                        missed INTEGER NOT NULL DEFAULT 0,
+                        restarts INTEGER NOT NULL DEFAULT 0,
+                        escalated INTEGER NOT NULL DEFAULT 0,
+                        anomaly TEXT,
+                        metrics TEXT
+                    )
+                """)
+                # Databases from before fired metrics were merged lack the column
+                # and fingerprint by target and metrics; re-key them by target
+                columns = [row[1] for row in conn.execute("PRAGMA table_info(tracked_incidents)")]
+                if "metrics" not in columns:
+                    conn.execute("ALTER TABLE tracked_incidents ADD COLUMN metrics TEXT")
+                    for incident_id, instance, label in conn.execute(
+                            "SELECT id, instance, signature FROM tracked_incidents").fetchall():
+                        conn.execute("UPDATE tracked_incidents SET fingerprint = ?, metrics = ? WHERE id = ?",
+                                     (fingerprint({"instance": instance}), (label or "").split("|")[0].replace("unknown", ""), incident_id))
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_tracked_state ON tracked_incidents (state, fingerprint)")
+                conn.execute("CREATE TABLE IF NOT EXISTS restart_log (container TEXT NOT NULL, at REAL NOT NULL)")
+            self.conn = conn
+        return self.conn
+
+    def _update(self, incident_id, **fields):
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self.conn:
+            self.conn.execute(f"UPDATE tracked_incidents SET {assignments} WHERE id = ?", (*fields.values(), incident_id))
+
+    def _get(self, incident_id):
+        return dict(self.conn.execute("SELECT * FROM tracked_incidents WHERE id = ?", (incident_id,)).fetchone())
+
+    def breaker_open(self, container, now=None):
+        now = self.clock() if now is None else now
+        conn = self._connection()
+        (restarts,) = conn.execute(
+            "SELECT COUNT(*) FROM restart_log WHERE container = ? AND at > ?", (container, now - self.breaker_window)
+        ).fetchone()
+        return restarts >= self.breaker_restarts
+
+    def _restart_blocked(self, container, now):
+        """Why a restart of container is not allowed right now, or None."""
+        if self.breaker_open(container, now):
+            return f"circuit breaker open ({self.breaker_restarts} restarts within {self.breaker_window:.0f}s)"
+        (last,) = self.conn.execute("SELECT MAX(at) FROM restart_log WHERE container = ?", (container,)).fetchone()
+        if last is not None and now - last < self.cooldown:
+            return f"{container} restarted {now - last:.0f}s ago (cooldown {self.cooldown:.0f}s)"
+        return None
+
+    def observe(self, anomaly, analysis):
+        """Record an anomalous target and decide what this cycle should do.
+
+        Returns the incident plus the transition (None when the anomaly is
+        a repeat) and whether to remediate, notify and summarize.
+        """
+        digest = fingerprint(anomaly)
+        fired = fired_metrics(anomaly)
+        container = anomaly.get("container", "app")
+        with self.lock:
+            now = self.clock()
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT * FROM tracked_incidents WHERE fingerprint = ? AND state IN ('open', 'mitigating', 'cooldown')",
+                (digest,)
+            ).fetchone()
+            transition, blocked = None, None
+            if row is None:
+                label = signature(fired, analysis)
+                with conn:
+                    cursor = conn.execute(
+                        "INSERT INTO tracked_incidents (fingerprint, instance, container, signature, state, opened_at, last_seen, anomaly, metrics) "
+                        "VALUES (?, ?, ?, ?, 'open', ?, ?, ?, ?)",
+                        (digest, anomaly.get("instance"), container, label, now, now, json.dumps(anomaly, default=str), ",".join(fired))
+                    )
+                incident = self._get(cursor.lastrowid)
+                transition = "opened"
+            else:
+                incident = dict(row)
+                # Every metric that fired during the incident stays on it
+                fired = sorted(set(filter(None, (incident["metrics"] or "").split(","))) | set(fired))
+                label = signature(fired, analysis)
+                self._update(incident["id"], last_seen=now, cycles=incident["cycles"] + 1, missed=0,
+                             signature=label, metrics=",".join(fired), anomaly=json.dumps(anomaly, default=str))
+                if incident["state"] == "cooldown" and now >= incident["cooldown_until"]:
+                    transition = "refiring"
+
+            remediate = False
+            if transition is not None:
+                blocked = self._restart_blocked(container, now)
+                if blocked is None:
+                    remediate = True
+                    self._update(incident["id"], state="mitigating")
+                else:
+                    self._update(incident["id"], state="cooldown", cooldown_until=now + self.cooldown)
+                    if self.breaker_open(container, now):
+                        if incident["escalated"]:
+                            # Already reported; stay quiet until it resolves
+                            transition = None
+                        else:
+                            transition = "escalated"
+                            self._update(incident["id"], escalated=1)
+            incident = self._get(incident["id"])
+
+        if transition is None:
+            metrics.INCIDENT_SUPPRESSED.inc()
+            logger.info("Incident %s on %s still %s, no action (%d cycles)",
+                        incident["id"], incident["instance"], incident["state"], incident["cycles"])
+        else:
+            metrics.INCIDENT_TRANSITIONS.labels(transition).inc()
+            logger.info("Incident %s on %s %s [%s]%s", incident["id"], incident["instance"], transition, incident["signature"],
+                        f", restart blocked: {blocked}" if blocked else "")
+        return {
+            "incident": incident,
+            "transition": transition,
+            "remediate": remediate,
+            "notify": transition is not None,
+            "summarize": transition is not None,
+            "blocked": blocked
+        }
+
+    def record_restart(self, container):
+        """Count one Docker restart of container towards its cooldown and breaker."""
+        with self.lock:
+            now = self.clock()
+            conn = self._connection()
+            with conn:
+                conn.execute("INSERT INTO restart_log (container, at) VALUES (?, ?)", (container, now))
+                conn.execute("DELETE FROM restart_log WHERE at < ?", (now - max(self.breaker_window, self.cooldown),))
+
+    def record_remediation(self, incident_id, remediation):
+        """Move a mitigating incident on once its remediation has run.
+
+        The restart itself is logged by record_restart, once per Docker
+        restart, however many incidents shared it.
+        """
+        with self.lock:
+            now = self.clock()
+            self._connection()
+            incident = self._get(incident_id)
+            restarts = incident["restarts"] + 1 if remediation.get("attempted") else incident["restarts"]
+            # Without a restart, remind again only after a cooldown too
+            self._update(incident_id, state="cooldown", cooldown_until=now + self.cooldown, restarts=restarts)
+
+    def sweep(self, seen_ids, skip_instances=()):
+        """Age incidents not seen this cycle; returns the ones that resolved."""
+        resolved = []
+        with self.lock:
+            now = self.clock()
+            conn = self._connection()
+            rows = conn.execute("SELECT * FROM tracked_incidents WHERE state IN ('open', 'mitigating', 'cooldown')").fetchall()
+            for row in rows:
+                if row["id"] in seen_ids or row["instance"] in skip_instances:
+                    continue
+                missed = row["missed"] + 1
+                if missed >= self.resolve_after:
+                    self._update(row["id"], state="resolved", resolved_at=now, missed=missed)
+                    resolved.append(self._get(row["id"]))
+                else:
+                    self._update(row["id"], missed=missed)
+        for incident in resolved:
+            metrics.INCIDENT_TRANSITIONS.labels("resolved").inc()
+            logger.info("Incident %s on %s resolved after %.0fs", incident["id"], incident["instance"],
+                        incident["resolved_at"] - incident["opened_at"])
+        return resolved
+
+    def active(self):
+        with self.lock:
+            conn = self._connection()
+            rows = conn.execute(
+                "SELECT * FROM tracked_incidents WHERE state IN ('open', 'mitigating', 'cooldown') ORDER BY opened_at"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+
+tracker = IncidentTracker()
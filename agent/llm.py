@@ -0,0 +1,211 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+import requests
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Gateway in front of the chat model: prompt cache, coalescing and timeouts
+log_dir = os.path.join(os.path.dirname(__file__), '..', 'logs')
+CACHE_FILE = os.path.join(log_dir, 'llm_cache.json')
+CACHE_TTL = 3600
+CACHE_MAX_ENTRIES = 256
+
+OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://localhost:11434")
+LLM_MODEL = os.environ.get("OPSBOT_LLM_MODEL", "tinyllama")
+# How long Ollama keeps the model loaded after each request
+LLM_KEEP_ALIVE = os.environ.get("OPSBOT_LLM_KEEP_ALIVE", "30m")
+
+# Volatile fragments that change every cycle without changing the incident
+_NORMALIZERS = [
+    (re.compile(r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?"), "<time>"),
+    (re.compile(r"\b\d{10,19}\b"), "<epoch>"),
+    (re.compile(r"\b(\d+)\.\d+\b"), r"\1"),
+    (re.compile(r"\s+"), " ")
+]
+
+
+def normalize_prompt(prompt):
+    for pattern, replacement in _NORMALIZERS:
+        prompt = pattern.sub(replacement, prompt)
+    return prompt.strip()
+
+
+class LLMTimeout(Exception):
+    pass
+
+
+def ollama_factory(model=LLM_MODEL, base_url=OLLAMA_URL, timeout=120, keep_alive=LLM_KEEP_ALIVE):
+    """Return a callable that builds the Ollama chat model on first use.
+
+    langchain_ollama takes about a second to import, so it is only loaded
+    when the model is first needed or warmed up.
+    """
+    def build():
+        from langchain_ollama import ChatOllama
+        return ChatOllama(base_url=base_url, model=model, keep_alive=keep_alive, client_kwargs={"timeout": timeout})
+    return build
+
+
+def load_model(model=LLM_MODEL, base_url=OLLAMA_URL, keep_alive=LLM_KEEP_ALIVE, timeout=300):
+    """Load the model into Ollama's memory and keep it resident."""
+    started = time.monotonic()
+    # A request without a prompt only loads the model
+    response = requests.post(f"{base_url}/api/generate", json={"model": model, "keep_alive": keep_alive}, timeout=timeout)
+    response.raise_for_status()
+    return time.monotonic() - started
+
+
+class LLMGateway:
+    """Caches, coalesces and time-limits requests to a LangChain chat model.
+
+    llm may be a chat model or a zero-argument factory that builds one on
+    first use.
+    """
+
+    def __init__(self, llm, model="", timeout=120, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, cache_file=CACHE_FILE):
+        self._llm = llm if hasattr(llm, "stream") else None
+        self._factory = None if self._llm is not None else llm
+        self.model = model
+        self.timeout = timeout
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.cache_file = cache_file
+        self.cache = OrderedDict()
+        self.inflight = {}
+        self.lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._load_cache()
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            with self._build_lock:
+                if self._llm is None:
+                    self._llm = self._factory()
+        return self._llm
+
+    def warm_up(self, base_url=OLLAMA_URL, keep_alive=LLM_KEEP_ALIVE):
+        """Build the client and load the model; meant for a background thread."""
+        try:
+            self.llm  # builds the client, importing langchain
+            seconds = load_model(self.model, base_url, keep_alive)
+        except Exception as e:
+            logger.warning("LLM warm-up failed: %s", e)
+            return None
+        metrics.LLM_WARMUP_SECONDS.set(seconds)
+        logger.info("LLM %s loaded in %.2fs, kept alive for %s", self.model, seconds, keep_alive)
+        return seconds
+
+    def key(self, prompt):
+        return hashlib.sha256(f"{self.model}\0{normalize_prompt(prompt)}".encode()).hexdigest()
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_file, 'r') as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        for key, entry in sorted(entries.items(), key=lambda item: item[1]["created"]):
+            if now - entry["created"] < self.ttl:
+                self.cache[key] = entry
+        while len(self.cache) > self.max_entries:
+            self.cache.popitem(last=False)
+
+    def _save_cache(self):
+        try:
+            tmp_file = f"{self.cache_file}.tmp"
+            with open(tmp_file, 'w') as f:
+                json.dump(dict(self.cache), f)
+            os.replace(tmp_file, self.cache_file)
+        except OSError as e:
+            logger.error("Failed to persist LLM cache: %s", e)
+
+    def _cached(self, key):
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry["created"] >= self.ttl:
+            del self.cache[key]
+            return None
+        self.cache.move_to_end(key)
+        return entry["text"]
+
+    def _store(self, key, text):
+        self.cache[key] = {"text": text, "created": time.time()}
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.max_entries:
+            self.cache.popitem(last=False)
+        self._save_cache()
+
+    def generate(self, prompt, on_token=None, timeout=None):
+        """Return the model's reply to prompt, from cache when possible.
+
+        Identical in-flight prompts share one generation. Raises LLMTimeout
+        if no complete reply arrives within the timeout.
+        """
+        key = self.key(prompt)
+        with self.lock:
+            text = self._cached(key)
+            if text is not None:
+                metrics.CACHE_HITS.labels("llm").inc()
+                logger.info("LLM cache hit")
+                return text
+            future = self.inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self.inflight[key] = Future()
+
+        if not owner:
+            metrics.CACHE_HITS.labels("llm_inflight").inc()
+            logger.info("Joining in-flight LLM request for identical prompt")
+            return future.result()
+
+        metrics.CACHE_MISSES.labels("llm").inc()
+
+        try:
+            text = self._stream(prompt, on_token, self.timeout if timeout is None else timeout)
+            with self.lock:
+                self._store(key, text)
+            future.set_result(text)
+            return text
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                self.inflight.pop(key, None)
+
+    def _stream(self, prompt, on_token, timeout):
+        tokens = []
+        cancelled = threading.Event()
+        done = Future()
+
+        def consume():
+            try:
+                for chunk in self.llm.stream(prompt):
+                    if cancelled.is_set():
+                        return
+                    tokens.append(chunk.content)
+                    if on_token:
+                        on_token(chunk.content)
+                done.set_result("".join(tokens))
+            except BaseException as e:
+                done.set_exception(e)
+
+        threading.Thread(target=consume, name="llm-stream", daemon=True).start()
+        try:
+            return done.result(timeout=timeout)
+        except FutureTimeout:
+            cancelled.set()
+            raise LLMTimeout(f"no complete response within {timeout}s ({len(tokens)} tokens received)")
@@ -0,0 +1,149 @@
+import bisect
+import glob
+import json
+import logging
+import mmap
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Fallback log source for when Loki is unreachable: the same log files
+# Promtail ships, read straight from disk. Each file is memory-mapped and a
+# sparse (timestamp, byte offset) index is kept every INDEX_STRIDE bytes and
+# persisted, so a time window is found by bisecting the index and only the
+# bytes from there on are scanned, jumping between severity matches with
+# mmap.find rather than splitting the file into lines.
+log_dir = os.path.join(os.path.dirname(__file__), '..', 'logs')
+LOCAL_LOG_FILES = os.environ.get(
+    "OPSBOT_LOCAL_LOGS",
+    f"{os.path.join(log_dir, 'app.log')},{os.path.join(log_dir, 'test_logs.log')}"
+)
+INDEX_FILE = os.path.join(log_dir, 'local_log_index.json')
+INDEX_STRIDE = 64 * 1024
+SEVERITY = b"ERROR"  # same filter as loki.ERROR_QUERY
+
+# Lines start with logging's default asctime, e.g. "2025-07-06 14:59:04,633"
+TIMESTAMP_LENGTH = 19
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def parse_timestamp(line):
+    """Epoch seconds of a log line's leading asctime, or None."""
+    try:
+        return time.mktime(time.strptime(line[:TIMESTAMP_LENGTH].decode("ascii"), TIMESTAMP_FORMAT))
+    except (UnicodeDecodeError, ValueError):
+        return None
+
+
+def _line_at(view, offset):
+    end = view.find(b"\n", offset)
+    return view[offset:end if end != -1 else len(view)], end
+
+
+class LocalLogSource:
+    """Serves error lines in a time window from local log files."""
+
+    def __init__(self, patterns=LOCAL_LOG_FILES, index_file=INDEX_FILE, severity=SEVERITY, stride=INDEX_STRIDE):
+        self.patterns = [pattern.strip() for pattern in patterns.split(",") if pattern.strip()]
+        self.index_file = index_file
+        self.severity = severity
+        self.stride = stride
+        self.lock = threading.Lock()
+        self.index = self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(self.index_file, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self):
+        try:
+            tmp_file = f"{self.index_file}.tmp"
+            with open(tmp_file, 'w') as f:
+                json.dump(self.index, f)
+            os.replace(tmp_file, self.index_file)
+        except OSError as e:
+            logger.error("Failed to persist local log index: %s", e)
+
+    def files(self):
+        return sorted({os.path.abspath(path) for pattern in self.patterns for path in glob.glob(pattern)})
+
+    def _extend_index(self, path, view, stat):
+        """Index bytes appended since the last call; returns True if it changed."""
+        entry = self.index.get(path)
+        if entry is None or entry["inode"] != stat.st_ino or entry["size"] > stat.st_size:
+            # New, rotated or truncated file: start over
+            entry = self.index[path] = {"inode": stat.st_ino, "size": 0, "checkpoints": []}
+        if entry["size"] == stat.st_size:
+            return False
+        checkpoints = entry["checkpoints"]
+        offset = checkpoints[-1][1] + self.stride if checkpoints else 0
+        while offset < stat.st_size:
+            if offset > 0:
+                # Checkpoints sit on line starts
+                newline = view.find(b"\n", offset - 1)
+                if newline == -1:
+                    break
+                offset = newline + 1
+            line, end = _line_at(view, offset)
+            timestamp = parse_timestamp(line)
+            if timestamp is not None:
+                if end == -1:
+                    break  # line still being written
+                checkpoints.append([timestamp, offset])
+                offset += self.stride
+            else:
+                # Continuation lines (tracebacks) carry no timestamp
+                if end == -1:
+                    break
+                offset = end + 1
+        entry["size"] = stat.st_size
+        return True
+
+    def _scan(self, path, view, start, end, limit):
+        checkpoints = self.index[path]["checkpoints"]
+        # The last checkpoint at or before start is the earliest place to look
+        position = bisect.bisect_right([timestamp for timestamp, _ in checkpoints], start) - 1
+        offset = checkpoints[position][1] if position >= 0 else 0
+        entries = []
+        while True:
+            match = view.find(self.severity, offset)
+            if match == -1:
+                break
+            line_start = view.rfind(b"\n", 0, match) + 1
+            line, line_end = _line_at(view, line_start)
+            timestamp = parse_timestamp(line)
+            if timestamp is not None:
+                if timestamp > end:
+                    break
+                if timestamp >= start:
+                    entries.append((timestamp, line.decode("utf-8", "replace")))
+            if line_end == -1:
+                break
+            offset = line_end + 1
+        return entries[-limit:]
+
+    def window(self, start, end, limit=100):
+        """Return up to `limit` error lines in [start, end] seconds, newest first."""
+        entries = []
+        with self.lock:
+            changed = False
+            for path in self.files():
+                try:
+                    with open(path, 'rb') as f:
+                        stat = os.fstat(f.fileno())
+                        if stat.st_size == 0:
+                            continue
+                        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                            changed |= self._extend_index(path, view, stat)
+                            entries.extend(self._scan(path, view, start, end, limit))
+                except (OSError, ValueError) as e:
+                    logger.warning("Could not read local log %s: %s", path, e)
+            if changed:
+                self._save_index()
+        entries.sort(reverse=True)
+        return [line for _, line in entries[:limit]]
@@ -0,0 +1,145 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+import metrics
+
+# One logging setup for the agent and the dashboard, applied by their entry
+# points. Callers only put records on a queue; a listener thread formats
+# them and does the file and console I/O, so a slow disk never stalls a
+# monitoring cycle.
+log_dir = os.path.join(os.path.dirname(__file__), '..', 'logs')
+LOG_FILE = os.environ.get("OPSBOT_LOG_FILE", os.path.join(log_dir, 'opsbot.log'))
+LOG_LEVEL = os.environ.get("OPSBOT_LOG_LEVEL", "INFO").upper()
+LOG_MAX_BYTES = int(os.environ.get("OPSBOT_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUPS = int(os.environ.get("OPSBOT_LOG_BACKUPS", "5"))
+QUEUE_SIZE = 10000
+# Identical warnings and errors inside this window are written once
+DEDUP_SECONDS = float(os.environ.get("OPSBOT_LOG_DEDUP_SECONDS", "60"))
+DEDUP_MAX_KEYS = 1000
+CONSOLE_FORMAT = '%(asctime)s - %(levelname)s - %(name)s - %(message)s'
+# Client libraries that log every HTTP request at INFO
+QUIET_LOGGERS = ("httpx", "httpcore", "urllib3")
+
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "suppressed"}
+
+_listener = None
+_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; `extra=` fields are kept as top-level keys."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value
+        if getattr(record, "suppressed", 0):
+            entry["suppressed"] = record.suppressed
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class ConsoleFormatter(logging.Formatter):
+    def format(self, record):
+        text = super().format(record)
+        if getattr(record, "suppressed", 0):
+            text += f" ({record.suppressed} identical messages suppressed)"
+        return text
+
+
+class DuplicateFilter(logging.Filter):
+    """Drops repeats of the same warning or error within a time window.
+
+    The next copy after the window passes with the number of suppressed
+    repeats attached, so a failing backend produces one line per window
+    instead of a traceback every cycle.
+    """
+
+    def __init__(self, window=DEDUP_SECONDS, min_level=logging.WARNING):
+        super().__init__()
+        self.window = window
+        self.min_level = min_level
+        self.seen = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno < self.min_level or self.window <= 0:
+            return True
+        key = (record.name, record.levelno, record.getMessage())
+        now = time.monotonic()
+        with self.lock:
+            entry = self.seen.get(key)
+            if entry is not None and now - entry[0] < self.window:
+                entry[1] += 1
+                return False
+            record.suppressed = entry[1] if entry else 0
+            self.seen[key] = [now, 0]
+            if len(self.seen) > DEDUP_MAX_KEYS:
+                self.seen = {k: v for k, v in self.seen.items() if now - v[0] < self.window}
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Pin the message now in case the arguments are mutated later, but
+        # leave formatting and tracebacks to the listener thread.
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.LOG_RECORDS_DROPPED.inc()
+
+
+def configure_logging(log_file=LOG_FILE, level=LOG_LEVEL, console=True):
+    """Install the queue handler on the root logger; later calls are no-ops."""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return _listener
+        os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8", delay=True
+        )
+        file_handler.setFormatter(JsonFormatter())
+        handlers = [file_handler]
+        if console:
+            stream_handler = logging.StreamHandler()
+            stream_handler.setFormatter(ConsoleFormatter(CONSOLE_FORMAT))
+            handlers.append(stream_handler)
+
+        log_queue = queue.Queue(QUEUE_SIZE)
+        queue_handler = NonBlockingQueueHandler(log_queue)
+        queue_handler.addFilter(DuplicateFilter())
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(queue_handler)
+        root.setLevel(level)
+        for name in QUIET_LOGGERS:
+            logging.getLogger(name).setLevel(logging.WARNING)
+
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+        return _listener
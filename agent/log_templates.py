@@ -0,0 +1,169 @@
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Online log template mining in the style of Drain (He et al., ICWS 2017).
+# Lines are split on whitespace and routed through a fixed-depth tree
+# (token count, then first token) to a short list of templates; the most
+# similar one above SIMILARITY absorbs the line, with differing positions
+# turned into wildcards, otherwise a new template is started. Tokens that
+# contain a digit are treated as variables up front, as Drain does.
+SIMILARITY = float(os.environ.get("OPSBOT_TEMPLATE_SIMILARITY", "0.5"))
+MAX_TEMPLATES = 1000    # least recently matched templates are dropped first
+MAX_CHILDREN = 100      # first tokens per length before falling back to a wildcard
+MAX_EXAMPLES = 3
+MAX_EXAMPLE_CHARS = 80
+WILDCARD = "<*>"
+# No tokenizer here; about four characters per token is close enough for budgets
+CHARS_PER_TOKEN = 4
+OMITTED_NOTE_TOKENS = 16
+
+_TIMESTAMP = re.compile(r"^(\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?)(?:\s+-)?\s*")
+
+
+def split_timestamp(line):
+    """Split a leading asctime off a log line: (timestamp or None, message)."""
+    match = _TIMESTAMP.match(line)
+    if match is None:
+        return None, line
+    return match.group(1), line[match.end():]
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+class Template:
+    __slots__ = ("id", "tokens", "path", "count")
+
+    def __init__(self, template_id, tokens, path):
+        self.id = template_id
+        self.tokens = tokens
+        self.path = path
+        self.count = 0
+
+    def text(self):
+        return " ".join(self.tokens)
+
+
+class TemplateMiner:
+    """Learns templates across calls; safe to share between threads."""
+
+    def __init__(self, similarity=SIMILARITY, max_templates=MAX_TEMPLATES, max_children=MAX_CHILDREN):
+        self.similarity = similarity
+        self.max_templates = max_templates
+        self.max_children = max_children
+        self.tree = {}
+        self.templates = OrderedDict()
+        self.next_id = 1
+        self.lock = threading.Lock()
+
+    def _best_match(self, candidates, tokens):
+        best, best_key = None, None
+        for template_id in candidates:
+            template = self.templates[template_id]
+            same = wildcards = 0
+            for slot, token in zip(template.tokens, tokens):
+                if slot == WILDCARD:
+                    wildcards += 1
+                elif slot == token:
+                    same += 1
+            # Ties go to the more general template
+            key = (same / len(tokens), wildcards)
+            if best_key is None or key > best_key:
+                best, best_key = template, key
+        if best is None or best_key[0] < self.similarity:
+            return None
+        return best
+
+    def add(self, message):
+        """Match a message to a template, learning from it; returns (template, variables)."""
+        raw = message.split()
+        tokens = [WILDCARD if any(char.isdigit() for char in token) else token for token in raw]
+        with self.lock:
+            by_first = self.tree.setdefault(len(tokens), {})
+            first = tokens[0] if tokens else ""
+            if first not in by_first and len(by_first) >= self.max_children:
+                first = WILDCARD
+            path = (len(tokens), first)
+            candidates = by_first.setdefault(first, [])
+            template = self._best_match(candidates, tokens)
+            if template is None:
+                template = Template(self.next_id, tokens, path)
+                self.next_id += 1
+                candidates.append(template.id)
+                self.templates[template.id] = template
+                if len(self.templates) > self.max_templates:
+                    self._evict()
+            else:
+                template.tokens = [slot if slot == token else WILDCARD for slot, token in zip(template.tokens, tokens)]
+                self.templates.move_to_end(template.id)
+            template.count += 1
+            variables = [value for value, slot in zip(raw, template.tokens) if slot == WILDCARD]
+        return template, variables
+
+    def _evict(self):
+        _, oldest = self.templates.popitem(last=False)
+        length, first = oldest.path
+        self.tree[length][first].remove(oldest.id)
+
+    def summarize(self, lines):
+        """Collapse lines into templates with counts, first/last seen times and
+        example variables, most frequent first."""
+        groups = {}
+        for line in lines:
+            timestamp, message = split_timestamp(line.rstrip("\n"))
+            if not message.strip():
+                continue
+            template, variables = self.add(message)
+            group = groups.get(template.id)
+            if group is None:
+                group = groups[template.id] = {"template": template, "count": 0, "first_seen": timestamp,
+                                               "last_seen": timestamp, "examples": []}
+            group["count"] += 1
+            if timestamp is not None:
+                # asctime strings sort chronologically
+                group["first_seen"] = min(filter(None, (group["first_seen"], timestamp)))
+                group["last_seen"] = max(filter(None, (group["last_seen"], timestamp)))
+            example = " ".join(variables)[:MAX_EXAMPLE_CHARS]
+            if example and example not in group["examples"] and len(group["examples"]) < MAX_EXAMPLES:
+                group["examples"].append(example)
+        summary = [{**group, "template": group["template"].text()} for group in groups.values()]
+        summary.sort(key=lambda group: (-group["count"], group["first_seen"] or ""))
+        return summary
+
+
+def describe_template(group):
+    category = f" {group['category']}" if group.get("category") else ""
+    line = f"[{group['count']}x{category}] {group['template']}"
+    if group["first_seen"]:
+        line += f" (first {group['first_seen']}, last {group['last_seen']})" if group["count"] > 1 else f" (at {group['first_seen']})"
+    if group["examples"]:
+        line += f" e.g. {' | '.join(group['examples'])}"
+    return line
+
+
+def render(templates, max_tokens=None):
+    """One line per template, in order, cut off to fit max_tokens."""
+    lines, used = [], 0
+    for position, group in enumerate(templates):
+        line = describe_template(group)
+        cost = estimate_tokens(line)
+        # Leave room for the "omitted" note while more templates follow
+        reserve = OMITTED_NOTE_TOKENS if position + 1 < len(templates) else 0
+        if max_tokens is not None and used + cost + reserve > max_tokens:
+            if not lines and max_tokens > OMITTED_NOTE_TOKENS:
+                # Even one template is over budget: keep what fits of it
+                lines.append(line[:(max_tokens - OMITTED_NOTE_TOKENS) * CHARS_PER_TOKEN])
+                position += 1
+            rest = templates[position:]
+            if rest:
+                lines.append(f"... {len(rest)} more templates ({sum(group['count'] for group in rest)} lines) omitted")
+            break
+        lines.append(line)
+        used += cost
+    return "\n".join(lines)
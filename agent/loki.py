@@ -0,0 +1,149 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Shared Loki client with an incremental tail for the agent
+LOKI_URL = os.environ.get("LOKI_URL", "http://localhost:3100")
+ERROR_QUERY = '{job="varlogs"} |= "ERROR"'
+
+log_dir = os.path.join(os.path.dirname(__file__), '..', 'logs')
+CURSOR_FILE = os.path.join(log_dir, 'loki_cursor.json')
+
+PAGE_LIMIT = 500
+MAX_PAGES = 10
+RING_SIZE = 5000
+MAX_CATCHUP = 3600  # never tail further back than this after downtime
+NS = 1_000_000_000
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Return the process-wide keep-alive session for Loki."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=2, pool_maxsize=8)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
+def query_range(logql, start_ns, end_ns, limit=100, direction="backward", timeout=10):
+    """Run a range query and return the raw list of streams."""
+    params = {
+        "query": logql,
+        "start": str(start_ns),
+        "end": str(end_ns),
+        "limit": limit,
+        "direction": direction
+    }
+    response = get_session().get(f"{LOKI_URL}/loki/api/v1/query_range", params=params, timeout=timeout)
+    response.raise_for_status()
+    return response.json()['data']['result']
+
+
+def stream_key(labels):
+    return json.dumps(labels, sort_keys=True)
+
+
+class LokiTail:
+    """Fetches only entries newer than a persisted per-stream cursor.
+
+    Recently seen lines are kept in a bounded ring buffer so the analysis
+    window can be served without downloading the same lines again.
+    """
+
+    def __init__(self, logql=ERROR_QUERY, cursor_file=CURSOR_FILE, ring_size=RING_SIZE):
+        self.logql = logql
+        self.cursor_file = cursor_file
+        self.ring = deque(maxlen=ring_size)
+        self.cursors = self._load_cursors()
+        self.lock = threading.Lock()
+
+    def _load_cursors(self):
+        try:
+            with open(self.cursor_file, 'r') as f:
+                return json.load(f).get(self.logql, {})
+        except (OSError, ValueError):
+            return {}
+
+    def _save_cursors(self):
+        try:
+            state = {}
+            if os.path.exists(self.cursor_file):
+                with open(self.cursor_file, 'r') as f:
+                    state = json.load(f)
+            state[self.logql] = self.cursors
+            tmp_file = f"{self.cursor_file}.tmp"
+            with open(tmp_file, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp_file, self.cursor_file)
+        except (OSError, ValueError) as e:
+            logger.error("Failed to persist Loki cursor: %s", e)
+
+    def poll(self, lookback=300, timeout=10):
+        """Fetch entries past the cursor and return them oldest first.
+
+        On the first poll of a process the last `lookback` seconds are also
+        loaded into the ring buffer so the analysis window is populated.
+        """
+        with self.lock:
+            now_ns = time.time_ns()
+            window_start = now_ns - lookback * NS
+            start_ns = min(self.cursors.values()) + 1 if self.cursors else window_start
+            if not self.ring:
+                start_ns = min(start_ns, window_start)
+            start_ns = max(start_ns, now_ns - MAX_CATCHUP * NS)
+
+            fetched = []
+            for _ in range(MAX_PAGES):
+                streams = query_range(self.logql, start_ns, now_ns, limit=PAGE_LIMIT, direction="forward", timeout=timeout)
+                page = [(int(ts), line, stream_key(stream['stream'])) for stream in streams for ts, line in stream['values']]
+                fetched.extend(page)
+                if len(page) < PAGE_LIMIT:
+                    break
+                start_ns = max(ts for ts, _, _ in page)
+
+            seeding = not self.ring
+            seen = set()
+            new_entries = []
+            for ts, line, key in sorted(fetched):
+                if (ts, line, key) in seen:
+                    continue
+                seen.add((ts, line, key))
+                is_new = ts > self.cursors.get(key, 0)
+                if is_new or seeding:
+                    self.ring.append((ts, line))
+                if is_new:
+                    new_entries.append((ts, line))
+
+            for ts, _, key in fetched:
+                if ts > self.cursors.get(key, 0):
+                    self.cursors[key] = ts
+            if new_entries:
+                metrics.LOKI_LINES.inc(len(new_entries))
+                self._save_cursors()
+            return new_entries
+
+    def window(self, start, end, limit=100):
+        """Return up to `limit` buffered lines in [start, end] seconds, newest first."""
+        start_ns, end_ns = start * NS, end * NS
+        with self.lock:
+            entries = [entry for entry in self.ring if start_ns <= entry[0] <= end_ns]
+        entries.sort(reverse=True)
+        return [line for _, line in entries[:limit]]
@@ -0,0 +1,268 @@
+"""Minimal Prometheus instrumentation for the agent.
+
+This deliberately does not use prometheus_client (which the sample app in
+app/metrics.py does). prometheus_client takes a lock on every inc() and
+observe(); here recording a sample only appends it to a deque (atomic in
+CPython), and samples are folded into counters and buckets when /metrics
+is scraped or once FOLD_AT of them have piled up. tests/bench_metrics.py
+measures the hot path at well under a microsecond per stage. The output
+follows the text exposition format 0.0.4, which tests/test_metrics.py
+checks with prometheus_client's own parser.
+"""
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+METRICS_PORT = int(os.environ.get("OPSBOT_METRICS_PORT", "9110"))
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+FOLD_AT = 1024
+
+# Stage latencies range from a cached LLM reply to a slow container restart
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Child:
+    __slots__ = ("pending", "lock")
+
+    def __init__(self):
+        self.pending = deque()
+        self.lock = threading.Lock()
+
+    def record(self, value):
+        pending = self.pending
+        pending.append(value)
+        if len(pending) >= FOLD_AT:
+            self.fold()
+
+    def fold(self):
+        """Drain pending samples into the totals; returns a consistent snapshot."""
+        with self.lock:
+            popleft = self.pending.popleft
+            while True:
+                try:
+                    self._add(popleft())
+                except IndexError:
+                    return self._snapshot()
+
+
+class _CounterChild(_Child):
+    __slots__ = ("value",)
+
+    def __init__(self):
+        super().__init__()
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.record(amount)
+
+    def _add(self, amount):
+        self.value += amount
+
+    def _snapshot(self):
+        return self.value
+
+
+class _HistogramChild(_Child):
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds):
+        super().__init__()
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.sum = 0.0
+
+    observe = _Child.record
+
+    def _add(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def _snapshot(self):
+        return list(self.counts), self.sum
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        self.lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+        registry.append(self)
+
+    def labels(self, *values):
+        child = self.children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self.lock:
+                child = self.children.setdefault(values, self._new_child())
+        return child
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self.children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{_labels(self.labelnames, values)} {_number(child.fold())}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, registry=REGISTRY):
+        self.bounds = tuple(sorted(float(bound) for bound in buckets)) + (float("inf"),)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def _render_child(self, values, child):
+        counts, total = child.fold()
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.bounds, counts):
+            cumulative += count
+            le = f'le="{_number(bound)}"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, values, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{_labels(self.labelnames, values)} {_number(total)}")
+        lines.append(f"{self.name}_count{_labels(self.labelnames, values)} {cumulative}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._default.set(value)
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{_labels(self.labelnames, values)} {_number(child.value)}"]
+
+
+def render(registry=REGISTRY):
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Agent metrics
+STAGE_SECONDS = Histogram("opsbot_stage_duration_seconds", "Time spent in each agent stage.", ["stage"])
+STAGE_DEADLINE_MISSES = Counter("opsbot_stage_deadline_misses_total", "Stages abandoned after exceeding their deadline.", ["stage"])
+STAGE_SKIPPED = Counter("opsbot_stage_skipped_total", "Stages not started because their abandoned previous run was still going.", ["stage"])
+CYCLE_SECONDS = Histogram("opsbot_cycle_duration_seconds", "Duration of a full monitoring cycle.")
+INCIDENTS = Counter("opsbot_incidents_total", "Anomalous targets handled.")
+INCIDENT_TRANSITIONS = Counter("opsbot_incident_transitions_total", "Incident lifecycle transitions (opened, refiring, escalated, resolved).", ["transition"])
+INCIDENT_SUPPRESSED = Counter("opsbot_incident_suppressed_total", "Anomalous targets that matched an active incident and triggered no action.")
+QUERY_RETRIES = Counter("opsbot_query_retries_total", "Failed backend queries that were retried.", ["backend"])
+LOKI_LINES = Counter("opsbot_loki_lines_total", "New log lines fetched from Loki.")
+LOG_FALLBACKS = Counter("opsbot_log_fallbacks_total", "Times Loki failed (error) or overran its budget (slow) and local log files were read instead.", ["reason"])
+CACHE_HITS = Counter("opsbot_cache_hits_total", "Cache lookups answered from cache.", ["cache"])
+CACHE_MISSES = Counter("opsbot_cache_misses_total", "Cache lookups that had to do the work.", ["cache"])
+RESTARTS = Counter("opsbot_restarts_total", "Container restarts by outcome (stable, unhealthy, failed).", ["container", "result"])
+LOG_RECORDS_DROPPED = Counter("opsbot_log_records_dropped_total", "Log records dropped because the log queue was full.")
+STARTUP_SECONDS = Gauge("opsbot_startup_seconds", "Time from process start to the first completed cycle.")
+LLM_WARMUP_SECONDS = Gauge("opsbot_llm_warmup_seconds", "Time taken to load the LLM at startup.")
+SCHEDULE_LAG = Histogram("opsbot_schedule_lag_seconds", "Delay between a cycle's deadline and its actual start.")
+MISSED_TICKS = Counter("opsbot_missed_ticks_total", "Scheduled cycles skipped because the previous cycle overran or left abandoned work running.")
+CYCLE_INTERVAL = Gauge("opsbot_cycle_interval_seconds", "Current interval until the next cycle.")
+NOTIFICATIONS = Counter("opsbot_notifications_total", "Notification delivery attempts by outcome (delivered, retry, rate_limited, failed).", ["sink", "result"])
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def process_start_time():
+    """Wall-clock time the current process started (Linux), else now."""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - uptime + start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return time.time()
+
+
+def start_http_server(port=METRICS_PORT, addr="0.0.0.0"):
+    """Serve /metrics from a daemon thread; returns the server or None."""
+    try:
+        server = ThreadingHTTPServer((addr, port), MetricsHandler)
+    except OSError as e:
+        logger.error("Could not start metrics endpoint on port %d: %s", port, e)
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logger.info("Serving Prometheus metrics on :%d/metrics", port)
+    return server
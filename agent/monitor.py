@@ -1,59 +1,114 @@
 import requests
-import json
 import logging
-import os
+import threading
 import time
 
-# Setup logging
-log_dir = os.path.join(os.path.dirname(__file__), '..', 'logs')
-os.makedirs(log_dir, exist_ok=True)
-logging.basicConfig(
-    filename=os.path.join(log_dir, 'opsbot.log'),
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    force=True
-)
-console = logging.StreamHandler()
-console.setLevel(logging.INFO)
-console.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-logging.getLogger().addHandler(console)
-
-def monitor_metrics():
+from prometheus import SAMPLE_QUERY, query, query_range, parse_sample, parse_series, parse_range_series
+from detect import ANOMALY_RULES, AnomalyDetector
+from targets import TargetRegistry
+import metrics
+
+logger = logging.getLogger(__name__)
+
+SEED_STEP = 15  # seconds, matches the Prometheus scrape interval
+QUERY_TIMEOUT = 10
+QUERY_ATTEMPTS = 3
+RETRY_DELAY = 2
+
+detector = None
+_detector_lock = threading.Lock()
+registry = TargetRegistry()
+
+def time_left(deadline, limit):
+    """limit, cut down to what is left until the monotonic deadline (if any)."""
+    return limit if deadline is None else min(limit, deadline - time.monotonic())
+
+def seed_detector(detector, step=SEED_STEP, timeout=QUERY_TIMEOUT):
+    """Fill every detector window from one range query."""
+    window = max(config.window for config in detector.detectors.values())
+    end_time = int(time.time())
     try:
-        # Delay to ensure CPU spike is captured
-        time.sleep(10)
-        cpu_query = "100 - (avg by(instance) (rate(node_cpu_seconds_total{mode=\"idle\"}[1m])) * 100)"
-        memory_query = "100 * (1 - (node_memory_MemAvailable_bytes / node_memory_MemTotal_bytes))"
-        prometheus_url = "http://localhost:9090/api/v1/query"
+        result = query_range(SAMPLE_QUERY, end_time - window * step, end_time, step=f"{step}s", timeout=timeout)
+        for metric, instance, timestamps, values in parse_range_series(result):
+            detector.seed(metric, instance, timestamps, values)
+        logger.info("Seeded anomaly detector with %d series", len(result))
+    except requests.exceptions.RequestException as e:
+        logger.warning("Could not seed anomaly detector: %s", e)
 
-        for attempt in range(3):
-            try:
-                cpu_response = requests.get(prometheus_url, params={"query": cpu_query}, timeout=10)
-                cpu_response.raise_for_status()
-                cpu_data = cpu_response.json()
-                cpu_usage = float(cpu_data['data']['result'][0]['value'][1]) if cpu_data['data']['result'] else 0
+def get_detector(deadline=None):
+    global detector
+    with _detector_lock:
+        if detector is None:
+            new_detector = AnomalyDetector()
+            timeout = time_left(deadline, QUERY_TIMEOUT)
+            if timeout > 0:
+                seed_detector(new_detector, timeout=timeout)
+            detector = new_detector
+    return detector
 
-                memory_response = requests.get(prometheus_url, params={"query": memory_query}, timeout=10)
-                memory_response.raise_for_status()
-                memory_data = memory_response.json()
-                memory_usage = float(memory_data['data']['result'][0]['value'][1]) if memory_data['data']['result'] else 0
+def evaluate_targets(series, detections):
+    """Group samples and fired detectors into per-target state."""
+    targets = {}
+    for metric, instance, timestamp, value in series:
+        state = targets.get(instance)
+        if state is None:
+            state = targets[instance] = {
+                "instance": instance,
+                "container": registry.get(instance).container,
+                "cpu_usage": 0,
+                "memory_usage": 0,
+                "timestamp": int(timestamp),
+                "anomaly_detected": False,
+                "detections": []
+            }
+        state[f"{metric}_usage"] = value
+    for detection in detections:
+        state = targets[detection["instance"]]
+        if any(rule in ANOMALY_RULES for rule in detection["rules"]):
+            state["anomaly_detected"] = True
+        state["detections"].append(detection)
+    for instance, state in targets.items():
+        registry.mark(instance, state["anomaly_detected"], state["timestamp"])
+    return targets
 
-                anomaly_detected = cpu_usage > 80 or memory_usage > 80
+def monitor_metrics(deadline=None):
+    """Query and evaluate every target; deadline is the monotonic time the
+    orchestrator stops waiting, and caps every query and retry delay."""
+    try:
+        anomaly_detector = get_detector(deadline)
+        timeout = time_left(deadline, QUERY_TIMEOUT)
+        if timeout > 0:
+            registry.refresh_if_stale(timeout=timeout)
+        for attempt in range(QUERY_ATTEMPTS):
+            timeout = time_left(deadline, QUERY_TIMEOUT)
+            if timeout <= 0:
+                break
+            try:
+                # One batched query returns every instance; detection is O(1)
+                # per sample so all targets are evaluated in-line.
+                result = query(SAMPLE_QUERY, timeout=timeout)
+                sample = parse_sample(result)
+                series = parse_series(result)
+                detections = anomaly_detector.evaluate(series)
+                targets = evaluate_targets(series, detections)
+                anomalous = [instance for instance, state in targets.items() if state["anomaly_detected"]]
                 result = {
-                    "anomaly_detected": anomaly_detected,
-                    "cpu_usage": cpu_usage,
-                    "memory_usage": memory_usage,
-                    "timestamp": int(cpu_data['data']['result'][0]['value'][0]) if cpu_data['data']['result'] else int(time.time())
+                    "anomaly_detected": bool(anomalous),
+                    **sample.to_dict(),
+                    "detections": detections,
+                    "targets": targets
                 }
-                logging.info(f"CPU Usage: {cpu_usage}%, Memory Usage: {memory_usage}%")
+                logger.info("CPU Usage: %s%%, Memory Usage: %s%%, %d targets, %d anomalous", sample.cpu_usage, sample.memory_usage, len(targets), len(anomalous))
                 return result
 
             except requests.exceptions.RequestException as e:
-                logging.warning(f"Prometheus query attempt {attempt + 1} failed: {str(e)}")
-                time.sleep(2)
-        logging.error("All Prometheus query attempts failed")
+                logger.warning("Prometheus query attempt %d failed: %s", attempt + 1, e)
+                metrics.QUERY_RETRIES.labels("prometheus").inc()
+                if attempt + 1 < QUERY_ATTEMPTS:
+                    time.sleep(max(0.0, time_left(deadline, RETRY_DELAY)))
+        logger.error("All Prometheus query attempts failed")
         return None
 
     except Exception as e:
-        logging.error(f"Monitor error: {str(e)}", exc_info=True)
+        logger.exception("Monitor error: %s", e)
         return None
@@ -1,47 +1,86 @@
-import requests
-import json
 import logging
 import os
+import threading
 import time
 
-# Setup logging
-log_dir = os.path.join(os.path.dirname(__file__), '..', 'logs')
-os.makedirs(log_dir, exist_ok=True)
-logging.basicConfig(
-    filename=os.path.join(log_dir, 'opsbot.log'),
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    force=True
-)
-console = logging.StreamHandler()
-console.setLevel(logging.INFO)
-console.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-logging.getLogger().addHandler(console)
-
-def save_notification_to_history(data):
+import history
+from dispatch import Dispatcher, SlackSink
+
+logger = logging.getLogger(__name__)
+
+# A summary can be ready before its notification is delivered and recorded;
+# it waits here until the history row exists.
+_pending_summaries = {}
+_pending_lock = threading.Lock()
+MAX_PENDING_SUMMARIES = 100
+
+def history_entry(data):
+    anomaly = data["anomaly"]
+    return {
+        "timestamp": anomaly.get("timestamp", int(time.time())),
+        "cpu_usage": anomaly.get("cpu_usage", "N/A"),
+        "memory_usage": anomaly.get("memory_usage"),
+        "instance": anomaly.get("instance"),
+        "analysis": data["analysis"].get("analysis", "No analysis available"),
+        "logs": data["analysis"].get("logs", "No logs available"),
+        "remediation": data["remediation"].get("action", "No action taken")
+    }
+
+def save_notification_to_history(sink, entry):
+    """Record a notification once its sink has accepted it."""
+    try:
+        with _pending_lock:
+            summary = _pending_summaries.pop((entry["timestamp"], entry.get("instance")), None)
+            history.append_entry({**entry, "summary": summary} if summary else entry)
+        logger.info("Saved notification to history")
+    except Exception as e:
+        logger.exception("Save notification history error: %s", e)
+
+def attach_summary_to_history(timestamp, summary, instance=None):
     try:
-        history_file = os.path.join(log_dir, 'notification_history.json')
-        history = []
-        if os.path.exists(history_file):
-            with open(history_file, 'r') as f:
-                history = json.load(f)
-        history.append({
-            "timestamp": data["anomaly"].get("timestamp", int(time.time())),
-            "cpu_usage": data["anomaly"].get("cpu_usage", "N/A"),
-            "analysis": data["analysis"].get("analysis", "No analysis available"),
-            "logs": data["analysis"].get("logs", "No logs available"),
-            "remediation": data["remediation"].get("action", "No action taken")
-        })
-        with open(history_file, 'w') as f:
-            json.dump(history, f, indent=2)
-        logging.info("Saved notification to history")
+        with _pending_lock:
+            if not history.set_summary(timestamp, summary, instance):
+                # Not delivered yet; attach it when the history row is written
+                _pending_summaries[(timestamp, instance)] = summary
+                while len(_pending_summaries) > MAX_PENDING_SUMMARIES:
+                    _pending_summaries.pop(next(iter(_pending_summaries)))
+                return False
+        logger.info("Attached LLM summary to notification history")
+        return True
     except Exception as e:
-        logging.error(f"Save notification history error: {str(e)}", exc_info=True)
+        logger.exception("Attach summary to history error: %s", e)
+        return False
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+def get_dispatcher(webhook_url):
+    global _dispatcher
+    # Incidents are notified from parallel workers; a second dispatcher
+    # would start its own worker and deliver the same outbox rows twice.
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = Dispatcher(on_delivered=save_notification_to_history)
+    _dispatcher.register_sink("slack", SlackSink(webhook_url))
+    return _dispatcher
+
+def resume_pending_notifications():
+    """Start delivering notifications left queued by a previous run."""
+    webhook_url = os.environ.get("SLACK_WEBHOOK_URL")
+    if webhook_url:
+        get_dispatcher(webhook_url).start()
+
+INCIDENT_TITLES = {
+    "opened": "Anomaly Detected",
+    "refiring": "Anomaly Still Firing",
+    "escalated": "Remediation Halted: Restart Limit Reached",
+    "resolved": "Anomaly Resolved"
+}
 
 def send_notification(data):
     try:
         if not all(key in data for key in ["anomaly", "analysis", "remediation"]):
-            logging.error("send_notification: Missing required keys in data")
+            logger.error("send_notification: Missing required keys in data")
             return "Failed: Missing required keys"
 
         anomaly = data.get("anomaly", {})
@@ -51,12 +90,20 @@ def send_notification(data):
 
         webhook_url = os.environ.get("SLACK_WEBHOOK_URL")
         if not webhook_url:
-            logging.error("send_notification: SLACK_WEBHOOK_URL not set")
+            logger.error("send_notification: SLACK_WEBHOOK_URL not set")
             return "Failed: SLACK_WEBHOOK_URL not set"
 
+        incident = data.get("incident") or {}
+        title = INCIDENT_TITLES.get(incident.get("transition"), "Anomaly Detected")
+        incident_line = (
+            f"Incident #{incident['id']} ({incident.get('signature', 'unknown')}), seen for {incident.get('cycles', 1)} cycles\n"
+            if incident.get("id") else ""
+        )
         message = (
-            f"*Anomaly Detected*\n"
-            f"Details: {anomaly.get('cpu_usage', 'N/A')}% CPU usage at {anomaly.get('timestamp', 'N/A')}\n"
+            f"*{title}*\n"
+            f"{incident_line}"
+            f"Details: {anomaly.get('cpu_usage', 'N/A')}% CPU usage at {anomaly.get('timestamp', 'N/A')}"
+            f"{' on ' + anomaly['instance'] if anomaly.get('instance') else ''}\n"
             f"*Analysis*\n{analysis.get('analysis', 'No analysis available')}\n"
             f"*Logs*\n{analysis.get('logs', 'No logs available')}\n"
             f"*Remediation*\n{remediation_message}"
@@ -68,15 +115,12 @@ def send_notification(data):
             "icon_emoji": ":robot_face:"
         }
 
-        response = requests.post(webhook_url, json=payload)
-        if response.status_code == 200:
-            logging.info("Notification sent to Slack successfully")
-            save_notification_to_history(data)
-            return "Sent to Slack"
-        else:
-            logging.error(f"Failed to send Slack notification: {response.status_code} - {response.text}")
-            return f"Failed: {response.status_code} - {response.text}"
+        # Delivery, retries and rate limiting happen on the dispatcher's worker
+        # History is written by the dispatcher once Slack accepts the message
+        item_id = get_dispatcher(webhook_url).enqueue("slack", payload, record=history_entry(data))
+        logger.info("Notification %s queued for Slack", item_id)
+        return "Queued for Slack"
 
     except Exception as e:
-        logging.error(f"send_notification error: {str(e)}", exc_info=True)
+        logger.exception("send_notification error: %s", e)
         return f"Failed: {str(e)}"
@@ -2,111 +2,292 @@ import logging
 import os
 import time
 import json
-from langchain_ollama import ChatOllama
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as StageTimeout, as_completed
 
 # Local modules
 from monitor import monitor_metrics
 from analyze import analyze_logs
-from remediate import remediate_service
-from notify import send_notification
-
-# Setup logging
-log_dir = os.path.join(os.path.dirname(__file__), '..', 'logs')
-os.makedirs(log_dir, exist_ok=True)
-logging.basicConfig(
-    filename=os.path.join(log_dir, 'opsbot.log'),
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    force=True
+from remediate import RESTART_DEADLINE, remediate_service
+from notify import send_notification, attach_summary_to_history, resume_pending_notifications
+from llm import LLM_MODEL, LLMGateway, LLMTimeout, ollama_factory
+from log_templates import estimate_tokens, render
+from log_config import configure_logging
+from scheduler import CycleScheduler
+from incidents import tracker
+import metrics
+
+# Logging is configured once, here in the entry point
+configure_logging()
+logger = logging.getLogger("orchestrate")  # __name__ is "__main__" when run as a script
+
+# Per-stage deadlines in seconds; a stage that overruns is abandoned and
+# the cycle continues with that stage's fallback result.
+STAGE_TIMEOUTS = {
+    "monitor": 20,
+    "analyze": 45,
+    "remediate": RESTART_DEADLINE + 10,  # margin for the restart API call
+    "notify": 15,
+    "llm": 120
+}
+
+# Ollama model behind the caching gateway; the client is built on first use
+# (or by the warm-up at startup) so importing this module stays fast.
+llm = LLMGateway(
+    ollama_factory(model=LLM_MODEL, timeout=STAGE_TIMEOUTS["llm"]),
+    model=LLM_MODEL,
+    timeout=STAGE_TIMEOUTS["llm"]
 )
-console = logging.StreamHandler()
-console.setLevel(logging.INFO)
-console.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-logging.getLogger().addHandler(console)
-
-# Initialize Ollama model
-try:
-    llm = ChatOllama(
-        base_url="http://localhost:11434",
-        model="llama2"
+
+# Token budget for the LLM prompt; the log templates are cut to fit it
+PROMPT_TOKENS = int(os.environ.get("OPSBOT_PROMPT_TOKENS", "1024"))
+PROMPT_LOG_MIN_TOKENS = 64
+
+# Anomalous targets are handled in parallel, each running its own stages
+TARGET_WORKERS = int(os.environ.get("OPSBOT_WORKERS", "16"))
+CYCLE_TIMEOUT = STAGE_TIMEOUTS["analyze"] + STAGE_TIMEOUTS["remediate"] + STAGE_TIMEOUTS["notify"]
+
+_target_executor = ThreadPoolExecutor(max_workers=TARGET_WORKERS, thread_name_prefix="target")
+_stage_executor = ThreadPoolExecutor(max_workers=TARGET_WORKERS * 2, thread_name_prefix="stage")
+# A single worker keeps LLM summaries off the cycle thread without piling
+# up concurrent generations on a loaded Ollama host.
+_llm_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="llm")
+LLM_MAX_PENDING = 4
+_llm_pending = []
+_llm_lock = threading.Lock()
+
+# Children bound once so timing a stage is two clock reads and a deque append
+_stage_seconds = {name: metrics.STAGE_SECONDS.labels(name) for name in STAGE_TIMEOUTS}
+
+# Stages abandoned at their deadline, by (stage, key), while they still run.
+# The same stage for the same key is not started again until it finishes,
+# and the scheduler skips ticks while any are left (see outstanding_work).
+_overrunning = {}
+_overrunning_lock = threading.Lock()
+
+def run_stage(name, fn, *args, fallback=None, key=None):
+    with _overrunning_lock:
+        previous = _overrunning.get((name, key))
+        if previous is not None:
+            if not previous.done():
+                metrics.STAGE_SKIPPED.labels(name).inc()
+                logger.warning("Stage '%s' skipped: its previous run is still going", name)
+                return fallback
+            del _overrunning[(name, key)]
+    started = time.perf_counter()
+    future = _stage_executor.submit(fn, *args)
+    try:
+        return future.result(timeout=STAGE_TIMEOUTS[name])
+    except StageTimeout:
+        with _overrunning_lock:
+            _overrunning[(name, key)] = future
+        metrics.STAGE_DEADLINE_MISSES.labels(name).inc()
+        logger.error("Stage '%s' exceeded its %ss deadline", name, STAGE_TIMEOUTS[name])
+        return fallback
+    finally:
+        _stage_seconds[name].observe(time.perf_counter() - started)
+
+def outstanding_work():
+    """Number of abandoned stage runs and target handlers still going."""
+    with _overrunning_lock:
+        for key in [key for key, future in _overrunning.items() if future.done()]:
+            del _overrunning[key]
+        return len(_overrunning)
+
+def build_prompt(anomaly, analysis, remediation):
+    def prompt(logs):
+        return f"""
+    You are an AI DevOps assistant. Given the following information, identify possible causes for the detected anomaly and suggest remediation steps. Include analysis of memory usage patterns if available.
+
+    Anomaly: {json.dumps(anomaly)}
+    Logs: {logs}
+    Analysis: {analysis.get('analysis', 'No analysis available')}
+    Remediation: {remediation.get('action', 'No action taken')}
+
+    If CPU usage is >80%, recommend restarting the app container and investigating code for inefficiencies or memory leaks. If memory usage is increasing over time, suggest setting Docker resource limits. If no logs are available, suggest checking Loki and Promtail configurations.
+    """
+
+    # The log templates get whatever the rest of the prompt leaves of the budget
+    if analysis.get("templates"):
+        budget = max(PROMPT_LOG_MIN_TOKENS, PROMPT_TOKENS - estimate_tokens(prompt("")))
+        return prompt(render(analysis["templates"], budget))
+    return prompt(analysis.get('logs', 'No logs available'))
+
+def summarize_incident(anomaly, analysis, remediation):
+    started = time.monotonic()
+    first_token = []
+
+    def on_token(token):
+        if not first_token:
+            first_token.append(time.monotonic() - started)
+            logger.info("LLM first token after %.2fs", first_token[0])
+
+    try:
+        summary = llm.generate(build_prompt(anomaly, analysis, remediation), on_token=on_token)
+        logger.info("LLM Summary (%.2fs): %s", time.monotonic() - started, summary)
+    except LLMTimeout as e:
+        logger.error("LLM timeout: %s", e)
+        summary = f"LLM error: {str(e)}"
+    except Exception as e:
+        logger.error("LLM invocation error: %s", e)
+        summary = f"LLM error: {str(e)}"
+    _stage_seconds["llm"].observe(time.monotonic() - started)
+    attach_summary_to_history(anomaly.get("timestamp"), summary, anomaly.get("instance"))
+    return summary
+
+def schedule_summary(anomaly, analysis, remediation):
+    with _llm_lock:
+        _llm_pending[:] = [future for future in _llm_pending if not future.done()]
+        if len(_llm_pending) >= LLM_MAX_PENDING:
+            logger.warning("LLM summary queue is full, skipping summary for this incident")
+            return "LLM busy, summary skipped"
+        _llm_pending.append(_llm_executor.submit(summarize_incident, anomaly, analysis, remediation))
+    return "pending"
+
+def handle_incident(anomaly):
+    """Analyze, remediate and notify for one anomalous target."""
+    analysis = run_stage(
+        "analyze", analyze_logs,
+        json.dumps({
+            "timestamp": anomaly.get("timestamp", int(time.time())),
+            "memory_usage": anomaly.get("memory_usage", 0),
+            "instance": anomaly.get("instance")
+        }),
+        fallback={"logs": "", "analysis": "Log analysis timed out", "actionable": False},
+        key=anomaly.get("instance")
     )
-except Exception as e:
-    logging.error(f"Failed to initialize Ollama: {str(e)}")
-    llm = None
+    analysis = json.loads(analysis) if isinstance(analysis, str) else analysis
+    analysis["container"] = anomaly.get("container", "app")
+    logger.debug("Analysis result for %s: %s", anomaly.get('instance'), analysis)
+
+    # Repeats of an active incident skip remediation, Slack and the LLM
+    decision = tracker.observe(anomaly, analysis)
+    incident = decision["incident"]
+    if decision["remediate"]:
+        remediation = run_stage(
+            "remediate", remediate_service, analysis,
+            fallback={"action": "Remediation timed out", "stable": False, "attempted": True},
+            key=analysis["container"]
+        )
+        tracker.record_remediation(incident["id"], remediation)
+        logger.info("Remediation result for %s: %s", anomaly.get('instance'), remediation)
+    elif decision["blocked"] and analysis.get("actionable"):
+        remediation = {"action": f"Restart skipped: {decision['blocked']}", "stable": False}
+    else:
+        remediation = {"action": "No action taken", "stable": False}
+
+    if decision["notify"]:
+        notification = run_stage(
+            "notify", send_notification,
+            {"anomaly": anomaly, "analysis": analysis, "remediation": remediation,
+             "incident": {**incident, "transition": decision["transition"]}},
+            fallback="Failed: notification timed out",
+            key=anomaly.get("instance")
+        )
+        logger.info("Notification result for %s: %s", anomaly.get('instance'), notification)
+        # The summary is attached to the incident's history entry when ready
+        summary = schedule_summary(anomaly, analysis, remediation)
+    else:
+        notification = summary = f"Suppressed: incident #{incident['id']} is {incident['state']}"
+
+    return {
+        "anomaly": anomaly,
+        "analysis": analysis,
+        "remediation": remediation,
+        "notification": notification,
+        "summary": summary,
+        "incident": {"id": incident["id"], "state": incident["state"], "transition": decision["transition"]}
+    }
+
+def notify_resolved(resolved):
+    for incident in resolved:
+        duration = incident["resolved_at"] - incident["opened_at"]
+        run_stage(
+            "notify", send_notification,
+            {
+                "anomaly": json.loads(incident["anomaly"] or "{}"),
+                "analysis": {"analysis": f"Not seen for {incident['missed']} cycles; resolved after {duration:.0f}s.", "logs": ""},
+                "remediation": {"action": f"{incident['restarts']} restart(s) during the incident"},
+                "incident": {**incident, "transition": "resolved"}
+            },
+            fallback="Failed: notification timed out",
+            key=incident["instance"]
+        )
 
 def run_agent():
+    started = time.perf_counter()
     try:
-        logging.info("Starting agent workflow")
-        anomaly = monitor_metrics()
+        logger.info("Starting agent workflow")
+        # The monitor gets the stage deadline so its queries and retries end by it
+        anomaly = run_stage("monitor", monitor_metrics, time.monotonic() + STAGE_TIMEOUTS["monitor"])
         if not anomaly:
-            logging.info("No anomalies detected.")
+            logger.info("No anomalies detected.")
             return {"status": "healthy"}
 
         anomaly = json.loads(anomaly) if isinstance(anomaly, str) else anomaly
         if not anomaly.get("anomaly_detected", False):
-            logging.info(f"No anomaly detected: CPU Usage: {anomaly.get('cpu_usage', 0)}%, Memory Usage: {anomaly.get('memory_usage', 0)}%")
+            logger.info("No anomaly detected: CPU Usage: %s%%, Memory Usage: %s%%", anomaly.get('cpu_usage', 0), anomaly.get('memory_usage', 0))
+            notify_resolved(tracker.sweep(set()))
             return {"status": "healthy", "anomaly": anomaly}
 
-        logging.info(f"Anomaly detected: {anomaly}")
-
-        analysis = analyze_logs(json.dumps({"timestamp": anomaly.get("timestamp", int(time.time())), "memory_usage": anomaly.get("memory_usage", 0)}))
-        analysis = json.loads(analysis) if isinstance(analysis, str) else analysis
-        logging.info(f"Analysis result: {analysis}")
-
-        remediation = remediate_service(analysis)
-        logging.info(f"Remediation result: {remediation}")
-
-        notification = send_notification({
-            "anomaly": anomaly,
-            "analysis": analysis,
-            "remediation": remediation
-        })
-        logging.info(f"Notification result: {notification}")
-
-        summary = "No LLM summary available"
-        if llm:
-            try:
-                prompt = f"""
-                You are an AI DevOps assistant. Given the following information, identify possible causes for the detected anomaly and suggest remediation steps. Include analysis of memory usage patterns if available.
-
-                Anomaly: {json.dumps(anomaly)}
-                Logs: {analysis.get('logs', 'No logs available')}
-                Analysis: {analysis.get('analysis', 'No analysis available')}
-                Remediation: {remediation.get('action', 'No action taken')}
-
-                If CPU usage is >80%, recommend restarting the app container and investigating code for inefficiencies or memory leaks. If memory usage is increasing over time, suggest setting Docker resource limits. If no logs are available, suggest checking Loki and Promtail configurations.
-                """
-                response = llm.invoke(prompt)
-                summary = response.content
-                logging.info(f"LLM Summary: {summary}")
-            except Exception as e:
-                logging.error(f"LLM invocation error: {str(e)}")
-                summary = f"LLM error: {str(e)}"
-
-        result = {
-            "anomaly": anomaly,
-            "analysis": analysis,
-            "remediation": remediation,
-            "notification": notification,
-            "summary": summary
-        }
-        logging.info(f"Agent cycle result: {result}")
+        targets = [target for target in anomaly.get("targets", {}).values() if target["anomaly_detected"]]
+        logger.info("Anomaly detected on %d targets: %s", len(targets), [target['instance'] for target in targets])
+        metrics.INCIDENTS.inc(len(targets))
+
+        futures = {_target_executor.submit(handle_incident, target): target["instance"] for target in targets}
+        incidents = []
+        try:
+            for future in as_completed(futures, timeout=CYCLE_TIMEOUT):
+                try:
+                    incidents.append(future.result())
+                except Exception as e:
+                    logger.exception("Incident handling error for %s: %s", futures[future], e)
+        except StageTimeout:
+            pending = [instance for future, instance in futures.items() if not future.done()]
+            logger.error("Incident handling exceeded %ss for targets: %s", CYCLE_TIMEOUT, pending)
+            with _overrunning_lock:
+                for future, instance in futures.items():
+                    if not future.done():
+                        _overrunning[("target", instance)] = future
+
+        # Every target that fired this cycle is still firing, whether or not its
+        # handling finished, so none of its incidents may age
+        seen = {incident["incident"]["id"] for incident in incidents}
+        notify_resolved(tracker.sweep(seen, skip_instances=set(futures.values())))
+
+        result = {"anomaly": anomaly, "incidents": incidents}
+        logger.debug("Agent cycle result: %s", result)
         return result
 
     except Exception as e:
-        logging.error(f"Agent error: {str(e)}", exc_info=True)
+        logger.exception("Agent error: %s", e)
         return {"error": str(e)}
+    finally:
+        metrics.CYCLE_SECONDS.observe(time.perf_counter() - started)
 
 if __name__ == "__main__":
-    while True:
-        try:
-            result = run_agent()
-            logging.info(f"Agent cycle result: {result}")
-            logging.info("Agent cycle completed, sleeping for 30 seconds")
-            time.sleep(30)
-        except KeyboardInterrupt:
-            logging.info("Agent stopped by user")
-            break
-        except Exception as e:
-            logging.error(f"Main loop error: {str(e)}", exc_info=True)
-            time.sleep(30)
+    process_started = metrics.process_start_time()
+    metrics.start_http_server()
+    # Load the model while the first cycles run so the first incident does
+    # not wait for a cold start
+    threading.Thread(target=llm.warm_up, name="llm-warmup", daemon=True).start()
+    resume_pending_notifications()
+    first_cycle = True
+
+    def agent_cycle():
+        global first_cycle
+        result = run_agent()
+        if first_cycle:
+            first_cycle = False
+            startup_seconds = time.time() - process_started
+            metrics.STARTUP_SECONDS.set(startup_seconds)
+            logger.info("First cycle completed %.2fs after process start", startup_seconds)
+        logger.info("Agent cycle completed with %d incidents", len(result.get("incidents", [])))
+        # Poll fast while any incident is still active
+        return bool(result.get("incidents")) or bool(tracker.active())
+
+    try:
+        # LLM summaries run on their own bounded queue and do not hold up cycles
+        CycleScheduler().run(agent_cycle, busy=outstanding_work)
+    except KeyboardInterrupt:
+        logger.info("Agent stopped by user")
@@ -0,0 +1,148 @@
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Shared Prometheus client used by the agent and the dashboard
+PROMETHEUS_URL = os.environ.get("PROMETHEUS_URL", "http://localhost:9090")
+
+CPU_QUERY = "100 - (avg by(instance) (rate(node_cpu_seconds_total{mode=\"idle\"}[1m])) * 100)"
+MEMORY_QUERY = "100 * (1 - (node_memory_MemAvailable_bytes / node_memory_MemTotal_bytes))"
+
+# The sample app exports its own container usage, so a spike can be pinned
+# on it rather than inferred from the host. Its series carry scope="process".
+APP_CPU_QUERY = "100 * rate(app_container_cpu_seconds_total[1m]) / app_cpu_count"
+APP_MEMORY_QUERY = "100 * app_container_memory_bytes / app_container_memory_limit_bytes"
+
+MEMORY_RANGE_QUERY = (
+    "100 - (avg by(instance) (node_memory_MemAvailable_bytes / node_memory_MemTotal_bytes) * 100) "
+    f"or {APP_MEMORY_QUERY}"
+)
+
+# Host and app CPU and memory in a single round trip; label_replace tags
+# each series so the parts of the "or" never collide and can be split apart.
+SAMPLE_QUERY = (
+    f'label_replace({CPU_QUERY}, "metric", "cpu", "", "") '
+    f'or label_replace({MEMORY_QUERY}, "metric", "memory", "", "") '
+    f'or label_replace(label_replace({APP_CPU_QUERY}, "metric", "cpu", "", ""), "scope", "process", "", "") '
+    f'or label_replace(label_replace({APP_MEMORY_QUERY}, "metric", "memory", "", ""), "scope", "process", "", "")'
+)
+
+# Per-process CPU (cores) and resident memory inside the app container
+PROCESS_QUERY = (
+    'label_replace(rate(app_process_cpu_seconds_total[1m]), "metric", "cpu", "", "") '
+    'or label_replace(app_process_resident_memory_bytes, "metric", "rss", "", "")'
+)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+@dataclass
+class MetricSample:
+    cpu_usage: float
+    memory_usage: float
+    timestamp: int
+
+    def to_dict(self):
+        return {
+            "cpu_usage": self.cpu_usage,
+            "memory_usage": self.memory_usage,
+            "timestamp": self.timestamp
+        }
+
+
+def get_session():
+    """Return the process-wide keep-alive session for Prometheus."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
+def query(promql, timeout=10):
+    """Run an instant query and return the raw result list."""
+    response = get_session().get(f"{PROMETHEUS_URL}/api/v1/query", params={"query": promql}, timeout=timeout)
+    response.raise_for_status()
+    return response.json()['data']['result']
+
+
+def query_range(promql, start, end, step="60s", timeout=10):
+    """Run a range query and return the raw result list."""
+    params = {"query": promql, "start": start, "end": end, "step": step}
+    response = get_session().get(f"{PROMETHEUS_URL}/api/v1/query_range", params=params, timeout=timeout)
+    response.raise_for_status()
+    return response.json()['data']['result']
+
+
+def list_targets(timeout=10):
+    """Return the labels and health of every active scrape target."""
+    response = get_session().get(f"{PROMETHEUS_URL}/api/v1/targets", params={"state": "active"}, timeout=timeout)
+    response.raise_for_status()
+    return [
+        {**target.get('labels', {}), "health": target.get('health', 'unknown')}
+        for target in response.json()['data']['activeTargets']
+    ]
+
+
+def parse_sample(result):
+    """Split the combined CPU/memory result into a host-level MetricSample."""
+    values = {}
+    timestamp = None
+    for series in result:
+        name = series['metric'].get('metric')
+        if name in values or series['metric'].get('scope') == "process":
+            continue
+        ts, value = series['value']
+        values[name] = float(value)
+        if timestamp is None:
+            timestamp = int(float(ts))
+    return MetricSample(
+        cpu_usage=values.get("cpu", 0),
+        memory_usage=values.get("memory", 0),
+        timestamp=timestamp if timestamp is not None else int(time.time())
+    )
+
+
+def parse_series(result):
+    """Flatten an instant result into (metric, instance, timestamp, value) tuples."""
+    return [
+        (series['metric'].get('metric'), series['metric'].get('instance', 'unknown'),
+         float(series['value'][0]), float(series['value'][1]))
+        for series in result
+    ]
+
+
+def parse_range_series(result):
+    """Flatten a range result into (metric, instance, timestamps, values) tuples."""
+    parsed = []
+    for series in result:
+        timestamps = [float(ts) for ts, _ in series['values']]
+        values = [float(value) for _, value in series['values']]
+        parsed.append((series['metric'].get('metric'), series['metric'].get('instance', 'unknown'), timestamps, values))
+    return parsed
+
+
+def parse_processes(result):
+    """Group a PROCESS_QUERY result into per-process dicts keyed by instance."""
+    processes = {}
+    for series in result:
+        labels = series['metric']
+        key = (labels.get('instance', 'unknown'), labels.get('pid'))
+        process = processes.setdefault(key, {"instance": key[0], "pid": key[1], "role": labels.get('role', 'unknown'), "cpu": 0.0, "rss": 0.0})
+        process[labels.get('metric')] = float(series['value'][1])
+    return list(processes.values())
+
+
+def fetch_sample(timeout=10):
+    """Fetch current CPU and memory usage with one Prometheus request."""
+    return parse_sample(query(SAMPLE_QUERY, timeout=timeout))
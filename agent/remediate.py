@@ -1,41 +1,112 @@
 import json
 import logging
 import os
-import subprocess
-
-# Setup logging
-log_dir = os.path.join(os.path.dirname(__file__), '..', 'logs')
-os.makedirs(log_dir, exist_ok=True)
-logging.basicConfig(
-    filename=os.path.join(log_dir, 'opsbot.log'),
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    force=True
-)
-console = logging.StreamHandler()
-console.setLevel(logging.INFO)
-console.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-logging.getLogger().addHandler(console)
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from docker_api import DockerClient
+from incidents import tracker
+import rules
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Restarts go through the Docker Engine API and are only reported stable
+# once the container is running (and healthy, if it has a healthcheck) and
+# its HTTP endpoint answers.
+# A restart (stop, start and health wait) must finish within RESTART_DEADLINE;
+# the orchestrator's remediate stage deadline is derived from it, so an
+# unhealthy result is reported before the stage is abandoned.
+STOP_TIMEOUT = 10
+HEALTH_TIMEOUT = 60
+RESTART_DEADLINE = STOP_TIMEOUT + HEALTH_TIMEOUT
+POLL_INTERVAL = 0.5
+PROBE_URLS = json.loads(os.environ.get("OPSBOT_PROBE_URLS", '{"app": "http://localhost:8080/"}'))
+
+docker = DockerClient()
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="remediate")
+_restarts = {}
+_restarts_lock = threading.Lock()
+
+def container_ready(container):
+    state = docker.inspect(container)["State"]
+    health = state.get("Health")
+    if not state.get("Running") or state.get("Restarting"):
+        return False, state.get("Status", "unknown")
+    if health and health.get("Status") != "healthy":
+        return False, f"health {health.get('Status')}"
+    return True, state.get("Status", "running")
+
+def probe_ready(url):
+    try:
+        return requests.get(url, timeout=2).status_code < 500
+    except requests.exceptions.RequestException:
+        return False
+
+def wait_until_healthy(container, probe_url=None, timeout=HEALTH_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    status = "unknown"
+    while time.monotonic() < deadline:
+        ready, status = container_ready(container)
+        if ready and (probe_url is None or probe_ready(probe_url)):
+            return True, status
+        if ready:
+            status = f"running, {probe_url} not answering"
+        time.sleep(POLL_INTERVAL)
+    return False, status
+
+def restart_container(container):
+    started = time.monotonic()
+    # Runs once per restart even when several incidents share it
+    tracker.record_restart(container)
+    try:
+        docker.restart(container, stop_timeout=STOP_TIMEOUT)
+        # Health polling gets whatever the restart call left of the deadline
+        remaining = max(POLL_INTERVAL, started + RESTART_DEADLINE - time.monotonic())
+        stable, status = wait_until_healthy(container, PROBE_URLS.get(container), timeout=remaining)
+    except Exception as e:
+        logger.error("Remediation failed: %s", e)
+        metrics.RESTARTS.labels(container, "failed").inc()
+        return {"action": f"Failed to restart {container} container: {str(e)}", "stable": False, "attempted": True}
+    recovery_seconds = round(time.monotonic() - started, 2)
+    metrics.RESTARTS.labels(container, "stable" if stable else "unhealthy").inc()
+    if stable:
+        logger.info("Remediation: Restarted %s container, healthy after %ss", container, recovery_seconds)
+        return {"action": f"Restarted {container} container", "stable": True, "recovery_seconds": recovery_seconds, "attempted": True}
+    logger.error("Remediation: %s not healthy %ss after restart (%s)", container, recovery_seconds, status)
+    return {
+        "action": f"Restarted {container} container but it did not become healthy ({status})",
+        "stable": False,
+        "recovery_seconds": recovery_seconds,
+        "attempted": True
+    }
+
+def restart_async(container):
+    """Start a restart in the background; concurrent callers share it."""
+    with _restarts_lock:
+        future = _restarts.get(container)
+        if future is None or future.done():
+            future = _restarts[container] = _executor.submit(restart_container, container)
+    return future
 
 def remediate_service(analysis):
     try:
         analysis = json.loads(analysis) if isinstance(analysis, str) else analysis
         if not analysis.get("actionable", False):
-            logging.info("No actionable remediation identified")
+            logger.info("No actionable remediation identified")
             return {"action": "No action taken", "stable": False}
 
-        if "OutOfMemory" in analysis.get("logs", "") or "Infinite loop" in analysis.get("logs", ""):
-            result = subprocess.run(["docker", "restart", "app"], capture_output=True, text=True)
-            if result.returncode == 0:
-                logging.info("Remediation: Restarted app container")
-                return {"action": "Restarted app container", "stable": True}
-            else:
-                logging.error(f"Remediation failed: {result.stderr}")
-                return {"action": f"Failed to restart app container: {result.stderr}", "stable": False}
+        container = analysis.get("container", "app")
+        classification = analysis.get("classification") or rules.engine.classify(analysis.get("logs", "").splitlines())
+        if "restart_container" in classification["actions"]:
+            return restart_async(container).result()
         else:
-            logging.info("No actionable remediation identified")
+            logger.info("No actionable remediation identified")
             return {"action": "No action taken", "stable": False}
 
     except Exception as e:
-        logging.error(f"Remediate error: {str(e)}", exc_info=True)
+        logger.exception("Remediate error: %s", e)
         return {"action": f"Remediation failed: {str(e)}", "stable": False}
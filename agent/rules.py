@@ -0,0 +1,158 @@
+import json
+import logging
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+# Log classification rules compiled into a single multi-pattern matcher.
+# OPSBOT_RULES_FILE may point at a JSON list of rules to replace the defaults.
+RULES_FILE = os.environ.get("OPSBOT_RULES_FILE")
+
+SEVERITY_ORDER = {"critical": 0, "error": 1, "warning": 2, "info": 3}
+MAX_EXAMPLES = 3
+
+DEFAULT_RULES = [
+    {"category": "out_of_memory", "pattern": r"OutOfMemory|MemoryError|OOMKilled|Cannot allocate memory",
+     "severity": "critical", "action": "restart_container"},
+    {"category": "infinite_loop", "pattern": r"Infinite loop", "severity": "critical", "action": "restart_container"},
+    # Reported only: like the original agent, restarts are kept to memory exhaustion and runaway loops
+    {"category": "crash", "pattern": r"Traceback \(most recent call last\)|Segmentation fault|Fatal Python error",
+     "severity": "error", "action": "none"},
+    {"category": "high_cpu", "pattern": r"High CPU usage", "severity": "warning", "action": "none"},
+    {"category": "dependency_unreachable",
+     "pattern": r"Connection refused|Temporary failure in name resolution|Read timed out",
+     "severity": "warning", "action": "none"},
+]
+
+ACTION_DESCRIPTIONS = {
+    "restart_container": "Restart the app container and investigate the application code",
+    "none": "No automated action"
+}
+
+
+@dataclass
+class Rule:
+    category: str
+    pattern: str
+    severity: str = "error"
+    action: str = "none"
+
+
+class RuleEngine:
+    """Classifies log lines with one combined regex.
+
+    All rule patterns are joined into a single group-free alternation, which
+    lets the regex engine skip ahead on the patterns' leading characters, so
+    a line is scanned once no matter how many rules exist. Only lines that
+    hit are re-checked at the hit position to find which rule matched; the
+    earliest match in the line wins, ties go to the earlier rule. Patterns
+    must not use backreferences.
+    """
+
+    def __init__(self, rules):
+        self.rules = [rule if isinstance(rule, Rule) else Rule(**rule) for rule in rules]
+        self.compiled = []
+        for rule in self.rules:
+            try:
+                self.compiled.append((re.compile(rule.pattern), rule))
+            except (re.error, TypeError) as e:
+                raise ValueError(f"rule '{rule.category}' has an invalid pattern {rule.pattern!r}: {e}") from e
+        try:
+            self.matcher = re.compile("|".join(rule.pattern for rule in self.rules))
+        except re.error as e:
+            # e.g. an inline flag such as (?i) anywhere but the start of the first pattern
+            raise ValueError(f"rule patterns cannot be combined into one matcher: {e}") from e
+
+    def _rule_at(self, line, position):
+        for pattern, rule in self.compiled:
+            if pattern.match(line, position):
+                return rule
+        return None
+
+    def classify_line(self, line):
+        match = self.matcher.search(line)
+        return self._rule_at(line, match.start()) if match else None
+
+    def classify(self, lines):
+        """Stream lines through the matcher and summarize the categories seen."""
+        counts = Counter()
+        examples = {}
+        total = 0
+        search = self.matcher.search
+        for line in lines:
+            total += 1
+            match = search(line)
+            if match is None:
+                continue
+            rule = self._rule_at(line, match.start())
+            if rule is None:
+                # The combined hit does not map back to a single rule at that
+                # position (e.g. a look-behind pattern); leave the line out
+                continue
+            counts[rule.category] += 1
+            bucket = examples.setdefault(rule.category, [])
+            if len(bucket) < MAX_EXAMPLES:
+                bucket.append(line.rstrip("\n"))
+        return self.summarize(counts, examples, total)
+
+    def summarize(self, counts, examples, total):
+        rules = {rule.category: rule for rule in self.rules}
+        categories = sorted(counts, key=lambda category: (SEVERITY_ORDER.get(rules[category].severity, 99), -counts[category]))
+        actions = []
+        for category in categories:
+            action = rules[category].action
+            if action != "none" and action not in actions:
+                actions.append(action)
+        return {
+            "lines": total,
+            "matched": sum(counts.values()),
+            "categories": [
+                {
+                    "category": category,
+                    "count": counts[category],
+                    "severity": rules[category].severity,
+                    "action": rules[category].action,
+                    "examples": examples[category]
+                }
+                for category in categories
+            ],
+            "actions": actions
+        }
+
+
+def load_rules(path=RULES_FILE):
+    if path:
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error("Could not load log rules from %s, using defaults: %s", path, e)
+    return DEFAULT_RULES
+
+
+def describe_classification(classification):
+    if not classification["categories"]:
+        return f"None of the {classification['lines']} recent log lines matched a known failure pattern."
+    found = ", ".join(f"{c['count']} {c['category'].replace('_', ' ')} ({c['severity']})" for c in classification["categories"])
+    return f"Log classification over {classification['lines']} recent lines: {found}."
+
+
+def describe_actions(classification):
+    if not classification["actions"]:
+        return "Suggested remediation: none required from the logs."
+    return "Suggested remediation: " + "; ".join(ACTION_DESCRIPTIONS.get(a, a) for a in classification["actions"]) + "."
+
+
+def build_engine(rules):
+    """RuleEngine for rules, or for DEFAULT_RULES if any rule is invalid."""
+    try:
+        return RuleEngine(rules)
+    except (TypeError, ValueError) as e:
+        logger.error("Invalid log rules, using defaults: %s", e)
+        return RuleEngine(DEFAULT_RULES)
+
+
+engine = build_engine(load_rules())
@@ -0,0 +1,90 @@
+import logging
+import os
+import random
+import threading
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Cycle timing for the agent's main loop. Deadlines are anchored to the
+# previous deadline on the monotonic clock, not to when the last cycle
+# ended, so the period does not drift by the cycle's own duration.
+INTERVAL = float(os.environ.get("OPSBOT_INTERVAL", "30"))
+FAST_INTERVAL = float(os.environ.get("OPSBOT_FAST_INTERVAL", "10"))
+MAX_INTERVAL = float(os.environ.get("OPSBOT_MAX_INTERVAL", "120"))
+JITTER = float(os.environ.get("OPSBOT_INTERVAL_JITTER", "0.1"))
+# Healthy cycles stretch the interval by this factor, up to MAX_INTERVAL
+BACKOFF = 1.25
+
+
+class CycleScheduler:
+    """Runs a cycle function on adaptive, drift-free deadlines.
+
+    The cycle returns True while an incident is open, which switches to
+    FAST_INTERVAL; every healthy cycle after that backs the interval off
+    from INTERVAL towards MAX_INTERVAL. Cycles run on the calling thread,
+    one after another. A cycle may still leave work behind that it stopped
+    waiting for; while busy() reports such work, ticks are skipped and
+    counted rather than starting a cycle on top of it.
+    """
+
+    def __init__(self, interval=INTERVAL, fast_interval=FAST_INTERVAL, max_interval=MAX_INTERVAL,
+                 backoff=BACKOFF, jitter=JITTER, clock=time.monotonic):
+        self.interval = interval
+        self.fast_interval = fast_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.clock = clock
+        self.healthy_streak = 0
+        self.stopped = threading.Event()
+
+    def next_interval(self, incident_open):
+        if incident_open:
+            self.healthy_streak = 0
+            interval = self.fast_interval
+        else:
+            interval = min(self.max_interval, self.interval * self.backoff ** self.healthy_streak)
+            self.healthy_streak += 1
+        # Jitter keeps several agents from polling the backends in lockstep
+        return interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def run(self, cycle, busy=None):
+        """Run cycle() until stop() is called, skipping ticks while busy()."""
+        deadline = self.clock()
+        interval = self.interval
+        while not self.stopped.is_set():
+            remaining = deadline - self.clock()
+            if remaining > 0 and self.stopped.wait(remaining):
+                break
+            if busy is not None and busy():
+                metrics.MISSED_TICKS.inc()
+                logger.warning("Skipping tick: work abandoned by an earlier cycle is still running")
+                deadline = max(deadline + interval, self.clock())
+                continue
+            metrics.SCHEDULE_LAG.observe(max(0.0, self.clock() - deadline))
+
+            try:
+                incident_open = cycle()
+            except Exception as e:
+                logger.exception("Cycle error: %s", e)
+                incident_open = False
+
+            interval = self.next_interval(incident_open)
+            metrics.CYCLE_INTERVAL.set(interval)
+            deadline += interval
+            now = self.clock()
+            if deadline < now:
+                # The cycle overran one or more ticks: count them and run
+                # the next cycle straight away instead of catching up.
+                missed = int((now - deadline) // interval) + 1
+                metrics.MISSED_TICKS.inc(missed)
+                logger.warning("Cycle overran its schedule by %.1fs, skipping %d tick(s)", now - deadline, missed)
+                deadline = now
+            else:
+                logger.debug("Next cycle in %.1fs", deadline - now)
+
+    def stop(self):
+        self.stopped.set()
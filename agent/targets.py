@@ -0,0 +1,90 @@
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+import requests
+
+from prometheus import list_targets
+
+logger = logging.getLogger(__name__)
+
+# Registry of monitored targets, discovered from Prometheus and/or configured.
+# OPSBOT_TARGETS maps an instance to the container remediation should act on,
+# e.g. OPSBOT_TARGETS='{"node-exporter:9100": {"container": "app"}}'
+DEFAULT_CONTAINER = os.environ.get("OPSBOT_DEFAULT_CONTAINER", "app")
+CONFIGURED_TARGETS = json.loads(os.environ.get("OPSBOT_TARGETS", "{}"))
+DISCOVERY_TTL = 60
+
+
+@dataclass
+class Target:
+    instance: str
+    job: str = "unknown"
+    container: str = DEFAULT_CONTAINER
+    health: str = "unknown"
+    anomalous: bool = False
+    anomaly_since: float = None
+    last_seen: float = None
+
+
+class TargetRegistry:
+    def __init__(self, configured=None, ttl=DISCOVERY_TTL):
+        self.configured = CONFIGURED_TARGETS if configured is None else configured
+        self.ttl = ttl
+        self.targets = {}
+        self.discovered_at = None
+        self.lock = threading.Lock()
+        for instance, options in self.configured.items():
+            self.targets[instance] = Target(instance=instance, **options)
+
+    def refresh(self, timeout=10):
+        """Merge active scrape targets from Prometheus into the registry."""
+        try:
+            discovered = list_targets(timeout=timeout)
+        except requests.exceptions.RequestException as e:
+            logger.warning("Target discovery failed: %s", e)
+            return
+        with self.lock:
+            for labels in discovered:
+                instance = labels.get("instance")
+                if not instance:
+                    continue
+                target = self._get_locked(instance)
+                target.job = labels.get("job", target.job)
+                target.health = labels.get("health", target.health)
+            self.discovered_at = time.monotonic()
+        logger.info("Target registry refreshed: %d targets", len(self.targets))
+
+    def refresh_if_stale(self, timeout=10):
+        if self.discovered_at is None or time.monotonic() - self.discovered_at >= self.ttl:
+            self.refresh(timeout)
+
+    def _get_locked(self, instance):
+        target = self.targets.get(instance)
+        if target is None:
+            options = self.configured.get(instance, {})
+            target = self.targets[instance] = Target(instance=instance, **options)
+        return target
+
+    def get(self, instance):
+        with self.lock:
+            return self._get_locked(instance)
+
+    def mark(self, instance, anomalous, timestamp):
+        """Record the latest per-target verdict and return the target."""
+        with self.lock:
+            target = self._get_locked(instance)
+            if anomalous and not target.anomalous:
+                target.anomaly_since = timestamp
+            elif not anomalous:
+                target.anomaly_since = None
+            target.anomalous = anomalous
+            target.last_seen = timestamp
+            return target
+
+    def all(self):
+        with self.lock:
+            return list(self.targets.values())
@@ -0,0 +1,136 @@
+import numpy as np
+
+# Vectorized trend analysis across every series of a Prometheus range result
+
+PERCENTILES = (50, 90, 99)
+LEAK_MIN_R_SQUARED = 0.6    # fit quality needed before calling a rise a leak
+SLOPE_MIN_TSTAT = 3.0       # slope must be this many standard errors from zero
+CHANGE_MIN_TSTAT = 4.0      # mean shift needed to report a change point
+MIN_SAMPLES = 8             # fewer samples than this get no trend ("none")
+CAPACITY = 100.0            # memory usage is a percentage
+
+
+def align(series):
+    """Stack (instance, timestamps, values) series onto one shared time grid.
+
+    Returns the instances, the sorted grid and a len(instances) x len(grid)
+    matrix with NaN wherever a series has no sample.
+    """
+    instances = [instance for instance, _, _ in series]
+    grid = np.unique(np.concatenate([np.asarray(ts, dtype=float) for _, ts, _ in series]))
+    matrix = np.full((len(series), grid.size), np.nan)
+    for row, (_, timestamps, values) in enumerate(series):
+        matrix[row, np.searchsorted(grid, np.asarray(timestamps, dtype=float))] = values
+    return instances, grid, matrix
+
+
+def fit_slopes(grid, matrix):
+    """Least-squares slope, its t-statistic and R^2 for each row, ignoring NaNs."""
+    mask = ~np.isnan(matrix)
+    n = mask.sum(axis=1)
+    t = np.where(mask, grid - grid[0], 0.0)
+    y = np.where(mask, matrix, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t_mean = t.sum(axis=1) / n
+        y_mean = y.sum(axis=1) / n
+        dt = np.where(mask, t - t_mean[:, None], 0.0)
+        dy = np.where(mask, y - y_mean[:, None], 0.0)
+        sxx = (dt * dt).sum(axis=1)
+        sxy = (dt * dy).sum(axis=1)
+        syy = (dy * dy).sum(axis=1)
+        slope = sxy / sxx
+        residual = np.maximum(syy - slope * sxy, 0.0)
+        r_squared = np.where(syy > 0, 1 - residual / syy, 0.0)
+        stderr = np.sqrt(residual / np.maximum(n - 2, 1) / sxx)
+        tstat = np.where(stderr > 0, slope / stderr, np.where(slope != 0, np.inf * np.sign(slope), 0.0))
+    return np.nan_to_num(slope), np.nan_to_num(tstat), np.nan_to_num(r_squared)
+
+
+def change_points(matrix, min_samples=MIN_SAMPLES):
+    """Best single mean-shift split per row via cumulative sums.
+
+    Each row is scored on its own samples only, since filling a short or
+    misaligned series out to the grid would invent a shift. Returns the
+    grid column the shift starts at (or -1 when none is significant or
+    the row has fewer than min_samples) and the shift's t-statistic.
+    """
+    rows = matrix.shape[0]
+    index = np.full(rows, -1)
+    scores = np.zeros(rows)
+    for row in range(rows):
+        columns = np.flatnonzero(~np.isnan(matrix[row]))
+        n = columns.size
+        if n < max(min_samples, 4):
+            continue
+        values = matrix[row, columns]
+        std = values.std()
+        if std == 0:
+            continue
+        k = np.arange(1, n)
+        csum = np.cumsum(values)[:-1]
+        left = csum / k
+        right = (values.sum() - csum) / (n - k)
+        score = np.abs(right - left) * np.sqrt(k * (n - k) / n) / std
+        best = score.argmax()
+        scores[row] = score[best]
+        if score[best] >= CHANGE_MIN_TSTAT:
+            index[row] = columns[best + 1]
+    return index, scores
+
+
+def analyze_series(series, capacity=CAPACITY):
+    """Analyze (instance, timestamps, values) series and return one report per instance."""
+    series = [s for s in series if len(s[1])]
+    if not series:
+        return []
+    instances, grid, matrix = align(series)
+    slope, tstat, r_squared = fit_slopes(grid, matrix)
+    percentiles = np.nanpercentile(matrix, PERCENTILES, axis=1)
+    means = np.nanmean(matrix, axis=1)
+    mask = ~np.isnan(matrix)
+    last_index = mask.shape[1] - 1 - mask[:, ::-1].argmax(axis=1)
+    current = matrix[np.arange(len(instances)), last_index]
+    change_index, change_score = change_points(matrix)
+
+    # A level shift that stays flat afterwards is a step, not a leak
+    columns = np.arange(matrix.shape[1])
+    after_change = np.where(columns[None, :] >= change_index[:, None], matrix, np.nan)
+    _, post_tstat, _ = fit_slopes(grid, after_change)
+    step = (change_index >= 0) & (np.abs(post_tstat) < SLOPE_MIN_TSTAT)
+
+    enough = mask.sum(axis=1) >= MIN_SAMPLES
+    step &= enough
+    rising = (slope > 0) & (tstat >= SLOPE_MIN_TSTAT) & ~step & enough
+    falling = (slope < 0) & (tstat <= -SLOPE_MIN_TSTAT) & ~step & enough
+    leak = rising & (r_squared >= LEAK_MIN_R_SQUARED)
+    with np.errstate(divide="ignore"):
+        exhaustion = np.where(rising, (capacity - current) / slope, np.inf)
+
+    reports = []
+    for i, instance in enumerate(instances):
+        if not enough[i]:
+            trend = "none"
+        elif leak[i]:
+            trend = "leak"
+        elif step[i]:
+            trend = "step"
+        elif rising[i]:
+            trend = "increasing"
+        elif falling[i]:
+            trend = "decreasing"
+        else:
+            trend = "stable"
+        reports.append({
+            "instance": instance,
+            "samples": int(mask[i].sum()),
+            "current": round(float(current[i]), 2),
+            "mean": round(float(means[i]), 2),
+            **{f"p{p}": round(float(percentiles[j, i]), 2) for j, p in enumerate(PERCENTILES)},
+            "slope_per_hour": round(float(slope[i]) * 3600, 3),
+            "r_squared": round(float(r_squared[i]), 3),
+            "trend": trend,
+            "change_point": int(grid[change_index[i]]) if change_index[i] >= 0 else None,
+            "change_score": round(float(change_score[i]), 2),
+            "exhaustion_seconds": int(max(exhaustion[i], 0)) if np.isfinite(exhaustion[i]) else None
+        })
+    return reports
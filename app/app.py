@@ -1,44 +1,65 @@
-from flask import Flask
+from flask import Flask, jsonify, request
 import logging
-import time
-import random
-import threading
 import os
 
+import loadgen
+import metrics
+
 app = Flask(__name__)
 
 # Log to a file for traceability
 logging.basicConfig(
-    filename='/var/log/app.log',
+    filename=loadgen.LOG_FILE,
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+metrics.init_app(app)
+
 @app.route('/')
 def home():
     logging.info("Received request to home endpoint")
     return "Hello from App"
 
-@app.route('/stress')
-def stress():
-    logging.warning("Simulating CPU spike")
+@app.route('/load', methods=['POST'])
+def start_load():
+    try:
+        job = loadgen.start_job(loadgen.parse_spec(request.get_json(silent=True) or {}))
+    except loadgen.LoadError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(job), 202, {"Location": f"/load/{job['id']}"}
 
-    def burn_cpu():
-        end = time.time() + 20  # Run for 20 seconds
-        while time.time() < end:
-            _ = [random.random() for _ in range(1000000)]
+@app.route('/load', methods=['GET'])
+def list_load():
+    return jsonify(loadgen.list_jobs())
 
-    threads = []
-    for _ in range(os.cpu_count()):  # One thread per CPU core
-        t = threading.Thread(target=burn_cpu)
-        t.start()
-        threads.append(t)
+@app.route('/load/<job_id>', methods=['GET'])
+def load_status(job_id):
+    job = loadgen.get_job(job_id)
+    if job is None:
+        return jsonify({"error": "unknown job"}), 404
+    return jsonify(job)
 
-    for t in threads:
-        t.join()
+@app.route('/load/<job_id>/cancel', methods=['POST'])
+def cancel_load(job_id):
+    job = loadgen.cancel_job(job_id)
+    if job is None:
+        return jsonify({"error": "unknown job"}), 404
+    return jsonify(job), 202
 
-    logging.error("High CPU usage detected in stress endpoint")
-    return "CPU stress test completed"
+@app.route('/stress')
+def stress():
+    # Kept for the demo: 20 s of CPU burn on every core, now as a background job
+    logging.warning("Simulating CPU spike")
+    try:
+        spec = loadgen.parse_spec({"kind": "cpu", "duration": 20, "intensity": os.cpu_count() or 1})
+        # Logged by the job once the CPU burn is actually running
+        spec["alert"] = "High CPU usage detected in stress endpoint"
+        job = loadgen.start_job(spec)
+    except loadgen.LoadError as e:
+        return jsonify({"error": str(e)}), 429
+    logging.info(f"Stress job {job['id']} started")
+    return jsonify(job), 202, {"Location": f"/load/{job['id']}"}
 
 if __name__ == "__main__":
-    app.run(host='0.0.0.0', port=8080)
+    app.run(host='0.0.0.0', port=8080, threaded=True)
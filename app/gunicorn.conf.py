@@ -0,0 +1,28 @@
+import multiprocessing
+import os
+
+# Production server for the sample app. Load jobs run in child processes,
+# so a few threads per worker are enough to keep the API responsive.
+bind = os.environ.get("APP_BIND", "0.0.0.0:8080")
+workers = int(os.environ.get("WEB_CONCURRENCY", str(min(multiprocessing.cpu_count() * 2 + 1, 8))))
+worker_class = "gthread"
+threads = int(os.environ.get("APP_THREADS", "4"))
+timeout = 30
+graceful_timeout = 10
+accesslog = None
+errorlog = "-"
+
+# Workers share request metrics through files in this directory; it must be
+# set before the app (and prometheus_client) is imported.
+metrics_dir = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/app-metrics")
+
+
+def on_starting(server):
+    os.makedirs(metrics_dir, exist_ok=True)
+    for name in os.listdir(metrics_dir):
+        os.remove(os.path.join(metrics_dir, name))
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,358 @@
+import json
+import logging
+import math
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+
+# Asynchronous load jobs for capacity-testing the agent. A job is driven by
+# a thread in the gunicorn worker that accepted it; the actual load runs in
+# spawned child processes so CPU burn is not bound by the GIL. Job state
+# lives in SQLite so status and cancel work from any worker.
+DB_PATH = os.environ.get("LOADGEN_DB", os.path.join(tempfile.gettempdir(), 'loadgen.db'))
+SCRATCH_DIR = os.environ.get("LOADGEN_SCRATCH_DIR", tempfile.gettempdir())
+LOG_FILE = os.environ.get("APP_LOG_FILE", '/var/log/app.log')
+MAX_SECONDS = int(os.environ.get("LOADGEN_MAX_SECONDS", "600"))
+MAX_MEMORY_MB = int(os.environ.get("LOADGEN_MAX_MEMORY_MB", "2048"))
+MAX_JOBS = int(os.environ.get("LOADGEN_MAX_JOBS", "8"))
+MAX_CORES = (os.cpu_count() or 1) * 2
+
+TICK = 0.25          # how often a job re-evaluates its shape
+DUTY_PERIOD = 0.1    # CPU burners alternate busy/idle within this period
+SCRATCH_LIMIT_MB = 256
+
+# Intensity units: cpu in cores, memory in MB held, io in MB/s written and
+# fsynced, logs in lines/s appended to the app log.
+KINDS = {
+    "cpu": {"default": os.cpu_count() or 1, "max": MAX_CORES},
+    "memory": {"default": 512, "max": MAX_MEMORY_MB},
+    "io": {"default": 20, "max": 500},
+    "logs": {"default": 200, "max": 20000}
+}
+SHAPES = ("step", "ramp", "burst")
+ACTIVE = ("pending", "running", "cancelling")
+
+_mp = multiprocessing.get_context("spawn")
+
+
+class LoadError(ValueError):
+    pass
+
+
+# Shapes map elapsed time to a fraction of the job's intensity
+
+def shape_level(spec, elapsed):
+    shape, duration = spec["shape"], spec["duration"]
+    if elapsed >= duration:
+        return 0.0
+    if shape == "ramp":
+        return min(1.0, elapsed / max(spec["ramp_seconds"], TICK))
+    if shape == "burst":
+        period = spec["burst_seconds"] + spec["idle_seconds"]
+        return 1.0 if elapsed % period < spec["burst_seconds"] else 0.0
+    return 1.0
+
+
+def parse_spec(data):
+    """Validate a job request; returns a normalized spec or raises LoadError."""
+    kind = data.get("kind", "cpu")
+    if kind not in KINDS:
+        raise LoadError(f"kind must be one of {', '.join(KINDS)}")
+    shape = data.get("shape", "step")
+    if shape not in SHAPES:
+        raise LoadError(f"shape must be one of {', '.join(SHAPES)}")
+    try:
+        duration = float(data.get("duration", 60))
+        intensity = float(data.get("intensity", KINDS[kind]["default"]))
+        spec = {"kind": kind, "shape": shape, "duration": duration, "intensity": intensity}
+        if shape == "ramp":
+            spec["ramp_seconds"] = float(data.get("ramp_seconds", duration))
+        elif shape == "burst":
+            spec["burst_seconds"] = float(data.get("burst_seconds", 10))
+            spec["idle_seconds"] = float(data.get("idle_seconds", 20))
+    except (TypeError, ValueError):
+        raise LoadError("duration, intensity and shape timings must be numbers")
+    if kind == "logs":
+        spec["message"] = str(data.get("message", "OutOfMemory in app"))
+        spec["log_level"] = str(data.get("log_level", "ERROR")).upper()
+        if spec["log_level"] not in ("INFO", "WARNING", "ERROR", "CRITICAL"):
+            raise LoadError("log_level must be INFO, WARNING, ERROR or CRITICAL")
+    if not 0 < duration <= MAX_SECONDS:
+        raise LoadError(f"duration must be between 0 and {MAX_SECONDS} seconds")
+    if not 0 < intensity <= KINDS[kind]["max"]:
+        raise LoadError(f"{kind} intensity must be between 0 and {KINDS[kind]['max']}")
+    if any(spec[key] < 0 for key in ("ramp_seconds", "burst_seconds", "idle_seconds") if key in spec):
+        raise LoadError("shape timings must not be negative")
+    if shape == "burst" and spec["burst_seconds"] + spec["idle_seconds"] <= 0:
+        raise LoadError("burst_seconds and idle_seconds cannot both be zero")
+    return spec
+
+
+# Child processes. Each follows a shared target level and exits when the
+# job stops or the worker that started it disappears.
+
+def _orphaned(parent):
+    return os.getppid() != parent
+
+
+def burn_cpu(duty, stop, parent):
+    while not stop.is_set() and not _orphaned(parent):
+        busy = DUTY_PERIOD * duty.value
+        end = time.perf_counter() + busy
+        while time.perf_counter() < end:
+            math.factorial(500)
+        if busy < DUTY_PERIOD:
+            stop.wait(DUTY_PERIOD - busy)
+
+
+def hold_memory(target_mb, stop, parent):
+    # Touch every page so the allocation shows up as resident memory
+    blocks = []
+    while not stop.is_set() and not _orphaned(parent):
+        target = int(target_mb.value)
+        while len(blocks) < target:
+            blocks.append(bytearray(b"\x01" * (1024 * 1024)))
+        del blocks[target:]
+        stop.wait(TICK)
+
+
+def write_disk(rate_mb, stop, parent):
+    path = os.path.join(SCRATCH_DIR, f"loadgen-{os.getpid()}.bin")
+    block = os.urandom(1024 * 1024)
+    written = 0
+    try:
+        with open(path, "wb") as scratch:
+            while not stop.is_set() and not _orphaned(parent):
+                started = time.monotonic()
+                for _ in range(int(round(rate_mb.value * TICK))):
+                    scratch.write(block)
+                    written += 1
+                    if written >= SCRATCH_LIMIT_MB:
+                        scratch.seek(0)
+                        written = 0
+                scratch.flush()
+                os.fsync(scratch.fileno())
+                stop.wait(max(0.0, TICK - (time.monotonic() - started)))
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def write_logs(rate, stop, parent, log_file, message, level):
+    logging.basicConfig(
+        filename=log_file,
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    level = logging.getLevelName(level)
+    carry = 0.0
+    while not stop.is_set() and not _orphaned(parent):
+        started = time.monotonic()
+        carry += rate.value * TICK
+        for _ in range(int(carry)):
+            logging.log(level, message)
+        carry -= int(carry)
+        stop.wait(max(0.0, TICK - (time.monotonic() - started)))
+
+
+# Job store
+
+def _connect():
+    conn = sqlite3.connect(DB_PATH, timeout=10)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            spec TEXT NOT NULL,
+            status TEXT NOT NULL,
+            owner_pid INTEGER,
+            level REAL NOT NULL DEFAULT 0,
+            cancel INTEGER NOT NULL DEFAULT 0,
+            created REAL NOT NULL,
+            finished REAL,
+            error TEXT
+        )
+    """)
+    return conn
+
+
+def _update(job_id, **fields):
+    conn = _connect()
+    try:
+        with conn:
+            assignments = ", ".join(f"{name} = ?" for name in fields)
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+    finally:
+        conn.close()
+
+
+def _cancel_requested(job_id):
+    conn = _connect()
+    try:
+        return bool(conn.execute("SELECT cancel FROM jobs WHERE id = ?", (job_id,)).fetchone()["cancel"])
+    finally:
+        conn.close()
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _row_to_job(row):
+    spec = json.loads(row["spec"])
+    status = row["status"]
+    if status in ACTIVE and not _pid_alive(row["owner_pid"]):
+        status = "lost"
+    elapsed = (row["finished"] or time.time()) - row["created"]
+    return {
+        "id": row["id"],
+        **spec,
+        "status": status,
+        "level": round(row["level"], 3),
+        "elapsed": round(elapsed, 1),
+        "created": row["created"],
+        "finished": row["finished"],
+        "error": row["error"]
+    }
+
+
+def get_job(job_id):
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    finally:
+        conn.close()
+    return _row_to_job(row) if row else None
+
+
+def list_jobs(limit=50):
+    conn = _connect()
+    try:
+        rows = conn.execute("SELECT * FROM jobs ORDER BY created DESC LIMIT ?", (limit,)).fetchall()
+    finally:
+        conn.close()
+    return [_row_to_job(row) for row in rows]
+
+
+def cancel_job(job_id):
+    conn = _connect()
+    try:
+        with conn:
+            conn.execute(
+                "UPDATE jobs SET cancel = 1, status = 'cancelling' WHERE id = ? AND status IN ('pending', 'running')",
+                (job_id,)
+            )
+    finally:
+        conn.close()
+    return get_job(job_id)
+
+
+def start_job(spec):
+    """Record the job and start driving it from this worker; returns the job."""
+    job_id = uuid.uuid4().hex[:12]
+    conn = _connect()
+    try:
+        conn.isolation_level = None
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            active = [row for row in conn.execute(
+                "SELECT owner_pid FROM jobs WHERE status IN ('pending', 'running', 'cancelling')"
+            ) if _pid_alive(row["owner_pid"])]
+            if len(active) >= MAX_JOBS:
+                raise LoadError(f"{len(active)} load jobs already running (limit {MAX_JOBS})")
+            conn.execute(
+                "INSERT INTO jobs (id, spec, status, owner_pid, created) VALUES (?, ?, 'pending', ?, ?)",
+                (job_id, json.dumps(spec), os.getpid(), time.time())
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+    threading.Thread(target=run_job, args=(job_id, spec), name=f"load-{job_id}", daemon=True).start()
+    return get_job(job_id)
+
+
+def _spawn(spec, stop):
+    """Start the child processes for a job; returns (processes, setter)."""
+    parent = os.getpid()
+    kind, intensity = spec["kind"], spec["intensity"]
+    if kind == "cpu":
+        # One burner per core, each running at a duty cycle, so fractional
+        # and ramped core counts are spread evenly.
+        count = max(1, math.ceil(intensity))
+        duties = [_mp.Value("d", 0.0, lock=False) for _ in range(count)]
+        processes = [_mp.Process(target=burn_cpu, args=(duty, stop, parent), daemon=True) for duty in duties]
+
+        def set_level(level):
+            for duty in duties:
+                duty.value = min(1.0, intensity * level / count)
+    else:
+        target = _mp.Value("d", 0.0, lock=False)
+        if kind == "memory":
+            process = _mp.Process(target=hold_memory, args=(target, stop, parent), daemon=True)
+        elif kind == "io":
+            process = _mp.Process(target=write_disk, args=(target, stop, parent), daemon=True)
+        else:
+            process = _mp.Process(target=write_logs, args=(target, stop, parent, LOG_FILE, spec["message"], spec["log_level"]), daemon=True)
+        processes = [process]
+
+        def set_level(level):
+            target.value = intensity * level
+    for process in processes:
+        process.start()
+    return processes, set_level
+
+
+def run_job(job_id, spec):
+    stop = _mp.Event()
+    processes = []
+    status, error = "completed", None
+    try:
+        processes, set_level = _spawn(spec, stop)
+        _update(job_id, status="running")
+        logging.warning(f"Load job {job_id} started: {spec['kind']} {spec['shape']} x{spec['intensity']} for {spec['duration']}s")
+        started = time.monotonic()
+        alerted = False
+        while True:
+            elapsed = time.monotonic() - started
+            if elapsed >= spec["duration"]:
+                break
+            level = shape_level(spec, elapsed)
+            set_level(level)
+            if spec.get("alert") and level > 0 and not alerted:
+                # Only report the load once the shape is actually applying it
+                logging.error(spec["alert"])
+                alerted = True
+            if _cancel_requested(job_id):
+                status = "cancelled"
+                break
+            if not all(process.is_alive() for process in processes):
+                raise RuntimeError("load process exited unexpectedly")
+            _update(job_id, level=level)
+            time.sleep(TICK)
+    except Exception as e:
+        logging.error(f"Load job {job_id} failed: {str(e)}", exc_info=True)
+        status, error = "failed", str(e)
+    finally:
+        stop.set()
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        _update(job_id, status=status, level=0, finished=time.time(), error=error)
+        logging.warning(f"Load job {job_id} {status}")
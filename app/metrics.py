@@ -0,0 +1,206 @@
+import gc
+import os
+import time
+
+from flask import Response, g, request
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge,
+                               Histogram, generate_latest, multiprocess)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# Prometheus metrics for the sample app. Under gunicorn every worker writes
+# its request and GC samples to PROMETHEUS_MULTIPROC_DIR (set in
+# gunicorn.conf.py) and whichever worker serves /metrics merges them.
+# Container-wide CPU and memory come from the cgroup, so load job children
+# and exited processes are counted too, and per-process figures from /proc
+# let a spike be pinned on one process.
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+CGROUP_ROOT = "/sys/fs/cgroup"
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+REQUEST_SECONDS = Histogram(
+    "app_http_request_duration_seconds", "Request latency by route.", ["method", "route", "status"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+IN_FLIGHT = Gauge("app_http_requests_in_flight", "Requests currently being handled.", ["route"], multiprocess_mode="livesum")
+GC_PAUSE_SECONDS = Histogram(
+    "app_gc_pause_seconds", "Garbage collector pauses by generation.", ["generation"],
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+)
+GC_COLLECTIONS = Counter("app_gc_collections_total", "Garbage collections by generation.", ["generation"])
+
+_gc_started = [0.0]
+
+
+def _gc_callback(phase, info):
+    if phase == "start":
+        _gc_started[0] = time.perf_counter()
+    else:
+        generation = str(info["generation"])
+        GC_PAUSE_SECONDS.labels(generation).observe(time.perf_counter() - _gc_started[0])
+        GC_COLLECTIONS.labels(generation).inc()
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _cgroup_usage():
+    """Container CPU seconds, memory bytes and memory limit (cgroup v2, then v1)."""
+    stat = _read(os.path.join(CGROUP_ROOT, "cpu.stat"))
+    if stat is not None:
+        fields = dict(line.split() for line in stat.splitlines())
+        cpu = int(fields.get("usage_usec", 0)) / 1e6
+        memory = _read(os.path.join(CGROUP_ROOT, "memory.current"))
+        limit = _read(os.path.join(CGROUP_ROOT, "memory.max"))
+    else:
+        usage = _read(os.path.join(CGROUP_ROOT, "cpuacct", "cpuacct.usage"))
+        cpu = int(usage) / 1e9 if usage else None
+        memory = _read(os.path.join(CGROUP_ROOT, "memory", "memory.usage_in_bytes"))
+        limit = _read(os.path.join(CGROUP_ROOT, "memory", "memory.limit_in_bytes"))
+    # No limit (or v1's "unlimited" sentinel) means the host's memory
+    host_memory = _host_memory()
+    if not limit or limit == "max" or int(limit) > host_memory:
+        limit = host_memory
+    return cpu, int(memory) if memory else None, int(limit)
+
+
+def _host_memory():
+    for line in (_read("/proc/meminfo") or "").splitlines():
+        if line.startswith("MemTotal:"):
+            return int(line.split()[1]) * 1024
+    return 0
+
+
+def _cpu_count():
+    """Cores the container may use: its CPU quota, else the visible cores."""
+    quota = _read(os.path.join(CGROUP_ROOT, "cpu.max"))
+    if quota is not None:
+        limit, period = quota.split()
+        if limit != "max":
+            return int(limit) / int(period)
+    else:
+        limit = _read(os.path.join(CGROUP_ROOT, "cpu", "cpu.cfs_quota_us"))
+        period = _read(os.path.join(CGROUP_ROOT, "cpu", "cpu.cfs_period_us"))
+        if limit and period and int(limit) > 0:
+            return int(limit) / int(period)
+    return float(len(os.sched_getaffinity(0)))
+
+
+def _process_role(pid, cmdline):
+    if "spawn_main" in cmdline:
+        return "load"
+    if "multiprocessing" in cmdline:
+        return "other"
+    if pid == _master_pid():
+        return "master"
+    return "worker" if "gunicorn" in cmdline or "app.py" in cmdline else "other"
+
+
+def _master_pid():
+    return os.getppid() if MULTIPROC_DIR else os.getpid()
+
+
+def _processes():
+    """(pid, role, cpu seconds, rss bytes, threads) for every visible process in the app."""
+    master = _master_pid()
+    processes = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        pid = int(entry)
+        stat = _read(f"/proc/{pid}/stat")
+        cmdline = (_read(f"/proc/{pid}/cmdline") or "").replace("\0", " ")
+        if stat is None:
+            continue
+        # The command name may contain spaces; fields resume after ")"
+        fields = stat[stat.rindex(")") + 2:].split()
+        ppid, utime, stime, threads, rss = int(fields[1]), int(fields[11]), int(fields[12]), int(fields[17]), int(fields[21])
+        if pid != master and ppid != master and not _descends_from(ppid, master):
+            continue
+        processes.append((pid, _process_role(pid, cmdline), (utime + stime) / CLOCK_TICKS, rss * PAGE_SIZE, threads))
+    return processes
+
+
+def _descends_from(pid, ancestor, depth=4):
+    for _ in range(depth):
+        if pid in (0, 1):
+            return False
+        stat = _read(f"/proc/{pid}/stat")
+        if stat is None:
+            return False
+        pid = int(stat[stat.rindex(")") + 2:].split()[1])
+        if pid == ancestor:
+            return True
+    return False
+
+
+class ProcessCollector:
+    """Reads container and per-process usage at scrape time."""
+
+    def collect(self):
+        cpu, memory, limit = _cgroup_usage()
+        processes = _processes()
+        if cpu is None:
+            cpu = sum(process[2] for process in processes)
+        if memory is None:
+            memory = sum(process[3] for process in processes)
+
+        yield CounterMetricFamily("app_container_cpu_seconds", "CPU time used by the whole app container.", value=cpu)
+        yield GaugeMetricFamily("app_container_memory_bytes", "Memory used by the whole app container.", value=memory)
+        yield GaugeMetricFamily("app_container_memory_limit_bytes", "Memory limit of the app container.", value=limit)
+        yield GaugeMetricFamily("app_cpu_count", "Cores available to the app container.", value=_cpu_count())
+
+        cpu_family = CounterMetricFamily("app_process_cpu_seconds", "CPU time per app process.", labels=["pid", "role"])
+        rss_family = GaugeMetricFamily("app_process_resident_memory_bytes", "Resident memory per app process.", labels=["pid", "role"])
+        threads_family = GaugeMetricFamily("app_process_threads", "Threads per app process.", labels=["pid", "role"])
+        for pid, role, cpu_seconds, rss, threads in processes:
+            cpu_family.add_metric([str(pid), role], cpu_seconds)
+            rss_family.add_metric([str(pid), role], rss)
+            threads_family.add_metric([str(pid), role], threads)
+        yield cpu_family
+        yield rss_family
+        yield threads_family
+
+
+def _registry():
+    if not MULTIPROC_DIR:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def init_app(app):
+    """Instrument every route and serve /metrics."""
+    registry = _registry()
+    registry.register(ProcessCollector())
+    gc.callbacks.append(_gc_callback)
+
+    @app.before_request
+    def start_timer():
+        g.metrics_route = request.url_rule.rule if request.url_rule else "unmatched"
+        g.metrics_started = time.perf_counter()
+        IN_FLIGHT.labels(g.metrics_route).inc()
+
+    @app.after_request
+    def record_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def observe(error=None):
+        route = g.pop("metrics_route", None)
+        if route is None:
+            return
+        IN_FLIGHT.labels(route).dec()
+        status = str(g.pop("metrics_status", 500))
+        REQUEST_SECONDS.labels(request.method, route, status).observe(time.perf_counter() - g.metrics_started)
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
@@ -1,104 +1,362 @@
-from flask import Flask, render_template, request, jsonify
-import requests
+from flask import Flask, Response, render_template, request, jsonify
 import json
 import os
 import time
-import subprocess
+import sys
+import threading
 import logging
+from collections import OrderedDict
+from concurrent.futures import TimeoutError as FutureTimeout
+
+# Share the agent's client modules (mounted at ../agent in the container)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'agent'))
+from prometheus import SAMPLE_QUERY, query, query_range, parse_sample, parse_series, parse_range_series
+import history
+import loki
+from remediate import restart_async
+from log_config import configure_logging
 
 app = Flask(__name__)
 
-# Setup logging
+# Same queued JSON logging as the agent, in a file of its own
 log_dir = os.path.join(os.path.dirname(__file__), '..', 'logs')
-os.makedirs(log_dir, exist_ok=True)
-logging.basicConfig(
-    filename=os.path.join(log_dir, 'opsbot.log'),
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    force=True
-)
-console = logging.StreamHandler()
-console.setLevel(logging.INFO)
-console.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-logging.getLogger().addHandler(console)
+configure_logging(log_file=os.path.join(log_dir, 'dashboard.log'))
+logger = logging.getLogger("dashboard")
 
 def fetch_metrics():
     try:
-        cpu_query = "100 - (avg by(instance) (rate(node_cpu_seconds_total{mode=\"idle\"}[1m])) * 100)"
-        memory_query = "100 * (1 - (node_memory_MemAvailable_bytes / node_memory_MemTotal_bytes))"
-        prometheus_url = "http://localhost:9090/api/v1/query"
-
-        cpu_response = requests.get(prometheus_url, params={"query": cpu_query}, timeout=10)
-        cpu_response.raise_for_status()
-        cpu_data = cpu_response.json()
-        cpu_usage = float(cpu_data['data']['result'][0]['value'][1]) if cpu_data['data']['result'] else 0
-
-        memory_response = requests.get(prometheus_url, params={"query": memory_query}, timeout=10)
-        memory_response.raise_for_status()
-        memory_data = memory_response.json()
-        memory_usage = float(memory_data['data']['result'][0]['value'][1]) if memory_data['data']['result'] else 0
-
+        result = query(SAMPLE_QUERY)
+        sample = parse_sample(result)
+        targets = {}
+        for metric, instance, _, value in parse_series(result):
+            targets.setdefault(instance, {"instance": instance})[f"{metric}_usage"] = round(value, 2)
         return {
-            "cpu_usage": round(cpu_usage, 2),
-            "memory_usage": round(memory_usage, 2),
-            "timestamp": int(time.time())
+            "cpu_usage": round(sample.cpu_usage, 2),
+            "memory_usage": round(sample.memory_usage, 2),
+            "timestamp": int(time.time()),
+            "targets": list(targets.values())
         }
     except Exception as e:
-        logging.error(f"Fetch metrics error: {str(e)}", exc_info=True)
+        logger.exception("Fetch metrics error: %s", e)
         return {"cpu_usage": 0, "memory_usage": 0, "timestamp": int(time.time())}
 
 def fetch_logs():
     try:
-        loki_url = "http://localhost:3100/loki/api/v1/query_range"
-        query = '{job="varlogs"} |= "ERROR"'
-        params = {
-            "query": query,
-            "start": str(int(time.time()) - 900),
-            "end": str(int(time.time())),
-            "limit": 10
-        }
-        response = requests.get(loki_url, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        logs = [entry[1] for stream in data['data']['result'] for entry in stream['values']]
+        now_ns = time.time_ns()
+        streams = loki.query_range(loki.ERROR_QUERY, now_ns - 900 * loki.NS, now_ns, limit=10)
+        logs = [entry[1] for stream in streams for entry in stream['values']]
         return logs
     except Exception as e:
-        logging.error(f"Fetch logs error: {str(e)}", exc_info=True)
+        logger.exception("Fetch logs error: %s", e)
         return ["No logs available"]
 
+MANUAL_REMEDIATION_WAIT = 30
+
 def manual_remediation(action):
     try:
         if action == "restart_app":
-            result = subprocess.run(["docker", "restart", "app"], capture_output=True, text=True)
-            if result.returncode == 0:
-                logging.info("Manual remediation: Restarted app container")
-                return "Restarted app container"
-            else:
-                logging.error(f"Manual remediation failed: {result.stderr}")
-                return f"Failed to restart app container: {result.stderr}"
+            future = restart_async("app")
+            try:
+                result = future.result(timeout=MANUAL_REMEDIATION_WAIT)
+            except FutureTimeout:
+                logger.info("Manual remediation: app restart still in progress")
+                return "Restart of app container in progress"
+            logger.info("Manual remediation: %s", result['action'])
+            if result["stable"]:
+                return f"{result['action']} (healthy after {result['recovery_seconds']}s)"
+            return result["action"]
         else:
             return "No action taken"
     except Exception as e:
-        logging.error(f"Manual remediation error: {str(e)}", exc_info=True)
+        logger.exception("Manual remediation error: %s", e)
         return f"Remediation failed: {str(e)}"
 
-def fetch_notification_history():
+def fetch_notification_history(limit=100, start=None, end=None):
     try:
-        history_file = os.path.join(log_dir, 'notification_history.json')
-        if os.path.exists(history_file):
-            with open(history_file, 'r') as f:
-                return json.load(f)
-        return []
+        return history.query_entries(start=start, end=end, limit=limit)
     except Exception as e:
-        logging.error(f"Fetch notification history error: {str(e)}", exc_info=True)
+        logger.exception("Fetch notification history error: %s", e)
         return []
 
+# Shared server-side cache: one background refresher queries the backends
+# and every page load, API call and SSE client reads from here.
+CACHE_TTLS = {"metrics": 5, "logs": 15, "history": 10}
+CACHE_FETCHERS = {
+    "metrics": fetch_metrics,
+    "logs": fetch_logs,
+    "history": fetch_notification_history
+}
+SSE_KEEPALIVE = 15
+
+_cache = {}
+_cache_version = 0
+_cache_cond = threading.Condition()
+_refresher = None
+_refresher_lock = threading.Lock()
+
+def refresh_cache_forever():
+    global _cache_version
+    while True:
+        for key, ttl in CACHE_TTLS.items():
+            entry = _cache.get(key)
+            if entry is not None and time.monotonic() - entry["fetched_at"] < ttl:
+                continue
+            try:
+                data = CACHE_FETCHERS[key]()
+            except Exception as e:
+                logger.exception("Cache refresh error for %s: %s", key, e)
+                data = entry["data"] if entry else None
+            with _cache_cond:
+                if entry is None or entry["data"] != data:
+                    _cache_version += 1
+                    version = _cache_version
+                    _cache_cond.notify_all()
+                else:
+                    version = entry["version"]
+                _cache[key] = {"data": data, "fetched_at": time.monotonic(), "version": version}
+        next_expiry = min(entry["fetched_at"] + CACHE_TTLS[key] for key, entry in _cache.items())
+        time.sleep(max(0.1, next_expiry - time.monotonic()))
+
+def ensure_refresher():
+    global _refresher
+    if _refresher is None:
+        with _refresher_lock:
+            if _refresher is None:
+                _refresher = threading.Thread(target=refresh_cache_forever, name="cache-refresher", daemon=True)
+                _refresher.start()
+
+def get_cached(key, timeout=15):
+    ensure_refresher()
+    with _cache_cond:
+        _cache_cond.wait_for(lambda: key in _cache, timeout=timeout)
+        entry = _cache.get(key)
+    return entry["data"] if entry else None
+
+def history_delta(previous, current):
+    """History rows that are new or changed since previous, plus the row count.
+
+    Rows are upserted by id on the client (a summary may be attached to a
+    row after it was sent), then the table is cut to `limit` rows."""
+    if previous is None:
+        return {"reset": True, "rows": current, "limit": len(current)}
+    sent = {row["id"]: row for row in previous}
+    return {"rows": [row for row in current if sent.get(row["id"]) != row], "limit": len(current)}
+
+def logs_delta(previous, current):
+    """Log lines new since previous: the client prepends `lines` to the first
+    `keep` lines it already shows (none, if the window did not just slide)."""
+    if previous is not None:
+        for new in range(len(current) + 1):
+            keep = len(current) - new
+            if current[new:] == previous[:keep]:
+                return {"lines": current[:new], "keep": keep}
+    return {"reset": True, "lines": current, "keep": 0}
+
+STREAM_DELTAS = {"history": history_delta, "logs": logs_delta}
+
+def stream_updates():
+    ensure_refresher()
+    last_seen = 0
+    sent = {}
+    while True:
+        with _cache_cond:
+            _cache_cond.wait_for(lambda: _cache_version > last_seen, timeout=SSE_KEEPALIVE)
+            updates = {key: entry["data"] for key, entry in _cache.items() if entry["version"] > last_seen}
+            last_seen = _cache_version
+        if not updates:
+            yield ": keepalive\n\n"
+            continue
+        for key, data in updates.items():
+            # History and logs go out as deltas against what this client was sent
+            if key in STREAM_DELTAS:
+                data = data or []
+                data, sent[key] = STREAM_DELTAS[key](sent.get(key), data), data
+            yield f"event: {key}\ndata: {json.dumps(data)}\n\n"
+
+# Historical series for the charts. Ranges are fetched from Prometheus in
+# chunks aligned to multiples of the step, so panning and refreshing reuse
+# the chunks already fetched; only the chunk still receiving samples is
+# re-queried, once it expires. Series are then downsampled here to a fixed
+# number of points before being sent to the browser.
+SERIES_RANGES = {"15m": 900, "1h": 3600, "6h": 21600, "24h": 86400, "7d": 604800}
+SERIES_STEPS = (15, 30, 60, 120, 300, 600, 900, 1800, 3600, 7200, 21600, 86400)
+SERIES_MAX_POINTS = 2000
+SERIES_DEFAULT_POINTS = 300
+CHUNK_POINTS = 240          # samples per cached chunk
+CHUNK_CACHE_SIZE = 512      # chunks kept across all steps
+CHUNK_SETTLE = 60           # seconds before a chunk counts as complete
+MARKER_LIMIT = 500
+
+_chunks = OrderedDict()
+_chunks_lock = threading.Lock()
+_chunk_fetch_locks = {}
+_chunk_stats = {"hits": 0, "misses": 0}
+
+def choose_step(seconds, points):
+    """Smallest standard step giving at most ~2 raw samples per output point."""
+    wanted = seconds / (2 * points)
+    return next((step for step in SERIES_STEPS if step >= wanted), SERIES_STEPS[-1])
+
+def _fetch_chunk(chunk_start, step, now):
+    span = step * CHUNK_POINTS
+    key = (step, chunk_start)
+    with _chunks_lock:
+        entry = _chunks.get(key)
+        if entry is not None and (entry["expires"] is None or entry["expires"] > now):
+            _chunks.move_to_end(key)
+            _chunk_stats["hits"] += 1
+            return entry["series"]
+        fetch_lock = _chunk_fetch_locks.setdefault(key, threading.Lock())
+
+    # One request per chunk, however many clients ask for it at once
+    with fetch_lock:
+        with _chunks_lock:
+            entry = _chunks.get(key)
+            if entry is not None and (entry["expires"] is None or entry["expires"] > now):
+                _chunk_stats["hits"] += 1
+                return entry["series"]
+            _chunk_stats["misses"] += 1
+        chunk_end = min(chunk_start + span - step, now - now % step)
+        series = {}
+        for metric, instance, timestamps, values in parse_range_series(
+                query_range(SAMPLE_QUERY, chunk_start, chunk_end, step=f"{step}s")):
+            series[(metric, instance)] = (timestamps, values)
+        # Complete chunks never change; the live one expires after a step
+        complete = chunk_start + span + CHUNK_SETTLE <= now
+        with _chunks_lock:
+            _chunks[key] = {"series": series, "expires": None if complete else now + min(step, 60)}
+            _chunks.move_to_end(key)
+            while len(_chunks) > CHUNK_CACHE_SIZE:
+                _chunks.popitem(last=False)
+            _chunk_fetch_locks.pop(key, None)
+    return series
+
+def fetch_range(start, end, step):
+    """Merge the cached chunks covering [start, end] into per-series lists."""
+    now = time.time()
+    span = step * CHUNK_POINTS
+    merged = {}
+    chunk_start = start - start % span
+    while chunk_start <= end and chunk_start <= now:
+        for key, (timestamps, values) in _fetch_chunk(chunk_start, step, now).items():
+            series = merged.setdefault(key, ([], []))
+            for timestamp, value in zip(timestamps, values):
+                if start <= timestamp <= end:
+                    series[0].append(timestamp)
+                    series[1].append(value)
+        chunk_start += span
+    return merged
+
+def lttb(timestamps, values, points):
+    """Largest-Triangle-Three-Buckets: keeps the points that shape the line."""
+    count = len(timestamps)
+    if points >= count or points < 3:
+        return timestamps, values
+    sampled_t, sampled_v = [timestamps[0]], [values[0]]
+    bucket = (count - 2) / (points - 2)
+    selected = 0
+    for i in range(points - 2):
+        low, high = int(i * bucket) + 1, int((i + 1) * bucket) + 1
+        # Average of the next bucket is the third corner of the triangle
+        next_low, next_high = high, min(int((i + 2) * bucket) + 1, count)
+        avg_t = sum(timestamps[next_low:next_high]) / (next_high - next_low)
+        avg_v = sum(values[next_low:next_high]) / (next_high - next_low)
+        at, av = timestamps[selected], values[selected]
+        best, best_area = low, -1.0
+        for j in range(low, high):
+            area = abs((at - avg_t) * (values[j] - av) - (at - timestamps[j]) * (avg_v - av))
+            if area > best_area:
+                best, best_area = j, area
+        sampled_t.append(timestamps[best])
+        sampled_v.append(values[best])
+        selected = best
+    sampled_t.append(timestamps[-1])
+    sampled_v.append(values[-1])
+    return sampled_t, sampled_v
+
+def min_max(timestamps, values, points):
+    """Keep each bucket's minimum and maximum, so no spike is lost."""
+    count = len(timestamps)
+    buckets = points // 2
+    if points >= count or buckets < 1:
+        return timestamps, values
+    sampled_t, sampled_v = [], []
+    for i in range(buckets):
+        low, high = i * count // buckets, (i + 1) * count // buckets
+        if low == high:
+            continue
+        window = range(low, high)
+        lowest = min(window, key=values.__getitem__)
+        highest = max(window, key=values.__getitem__)
+        for j in sorted({lowest, highest}):
+            sampled_t.append(timestamps[j])
+            sampled_v.append(values[j])
+    return sampled_t, sampled_v
+
+DOWNSAMPLERS = {"lttb": lttb, "minmax": min_max}
+
+def fetch_series(start, end, points, method="lttb"):
+    step = choose_step(end - start, points)
+    merged = fetch_range(start, end, step)
+    downsample = DOWNSAMPLERS[method]
+    series = []
+    for (metric, instance), (timestamps, values) in sorted(merged.items(), key=lambda item: str(item[0])):
+        timestamps, values = downsample(timestamps, values, points)
+        series.append({"metric": metric, "instance": instance, "timestamps": timestamps,
+                       "values": [round(value, 2) for value in values]})
+    markers = [
+        {key: entry.get(key) for key in ("timestamp", "instance", "severity", "cpu_usage", "remediation")}
+        for entry in fetch_notification_history(MARKER_LIMIT, start, end)
+    ]
+    return {"start": start, "end": end, "step": step, "points": points, "method": method,
+            "series": series, "incidents": markers, "cache": dict(_chunk_stats)}
+
 @app.route('/')
 def dashboard():
-    metrics = fetch_metrics()
-    logs = fetch_logs()
-    history = fetch_notification_history()
-    return render_template('index.html', metrics=metrics, logs=logs, history=history)
+    metrics = get_cached("metrics") or {"cpu_usage": 0, "memory_usage": 0, "timestamp": int(time.time())}
+    logs = get_cached("logs") or []
+    history = get_cached("history") or []
+    return render_template('index.html', metrics=metrics, logs=logs, history=history, ranges=SERIES_RANGES)
+
+@app.route('/api/metrics')
+def api_metrics():
+    return jsonify(get_cached("metrics"))
+
+@app.route('/api/logs')
+def api_logs():
+    return jsonify(get_cached("logs"))
+
+@app.route('/api/history')
+def api_history():
+    return jsonify(get_cached("history"))
+
+@app.route('/api/series')
+def api_series():
+    now = int(time.time())
+    try:
+        seconds = SERIES_RANGES.get(request.args.get("range", "1h")) or int(request.args["range"])
+        end = int(request.args.get("end", now))
+        start = int(request.args.get("start", end - seconds))
+        points = min(int(request.args.get("points", SERIES_DEFAULT_POINTS)), SERIES_MAX_POINTS)
+    except ValueError:
+        return jsonify({"error": "start, end, range and points must be integers (range may also be one of "
+                                 f"{', '.join(SERIES_RANGES)})"}), 400
+    method = request.args.get("method", "lttb")
+    if method not in DOWNSAMPLERS:
+        return jsonify({"error": f"method must be one of {', '.join(DOWNSAMPLERS)}"}), 400
+    end = min(end, now)
+    if start >= end or points < 3:
+        return jsonify({"error": "start must be before end (and not in the future), points at least 3"}), 400
+    try:
+        return jsonify(fetch_series(start, end, points, method))
+    except Exception as e:
+        logger.exception("Fetch series error: %s", e)
+        return jsonify({"error": f"Prometheus query failed: {e}"}), 502
+
+@app.route('/api/stream')
+def api_stream():
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_updates(), mimetype="text/event-stream", headers=headers)
 
 @app.route('/remediate', methods=['POST'])
 def remediate():
@@ -107,7 +365,5 @@ def remediate():
     return jsonify({"result": result})
 
 if __name__ == "__main__":
-    if not os.path.exists(os.path.join(log_dir, 'notification_history.json')):
-        with open(os.path.join(log_dir, 'notification_history.json'), 'w') as f:
-            json.dump([], f)
-    app.run(host='0.0.0.0', port=5000)
+    history.init_store()
+    app.run(host='0.0.0.0', port=5000, threaded=True)
@@ -0,0 +1,347 @@
+import argparse
+import functools
+import importlib.util
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from fake_services import FakeApp, FakeDocker, FakeLoki, FakeOllama, FakePrometheus, FakeSlack, load_fixture
+
+# End-to-end benchmark: runs agent cycles and dashboard requests against the
+# fake backends in fake_services.py and reports latency percentiles,
+# throughput, peak RSS and allocations.
+#
+#   python3 tests/bench_agent.py --cycles 20 --instances 8 --hot 2
+#   python3 tests/bench_agent.py --latency prometheus=0.05 --fail slack=0.2 --output bench.json
+#   python3 tests/bench_agent.py --baseline bench.json   # exits 1 on regression
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+AGENT_DIR = os.path.join(ROOT, 'agent')
+SERVICES = ("prometheus", "loki", "slack", "ollama", "app", "docker")
+DASHBOARD_ROUTES = ["/api/metrics", "/api/logs", "/api/history", "/api/series?range=24h", "/"]
+DRAIN_TIMEOUT = 60
+
+
+class Recorder:
+    """Collects wall-clock durations per named stage."""
+
+    def __init__(self):
+        self.samples = {}
+        self.lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self.lock:
+            self.samples.setdefault(name, []).append(seconds)
+
+    def timed(self, name, fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.add(name, time.perf_counter() - started)
+        return wrapper
+
+    def summary(self, percentile):
+        report = {}
+        for name, samples in self.samples.items():
+            ms = sorted(sample * 1000 for sample in samples)
+            report[name] = {
+                "count": len(ms),
+                "p50_ms": percentile(ms, 0.5),
+                "p95_ms": percentile(ms, 0.95),
+                "p99_ms": percentile(ms, 0.99),
+                "max_ms": round(ms[-1], 3)
+            }
+        return report
+
+
+def parse_overrides(values, cast=float):
+    """Turn ["loki=0.05", "all=0.01"] into {"loki": 0.05, ...} per service."""
+    overrides = {}
+    for value in values or []:
+        name, _, amount = value.partition("=")
+        names = SERVICES if name == "all" else [name]
+        for service in names:
+            if service not in SERVICES:
+                raise SystemExit(f"Unknown service '{service}', expected one of {', '.join(SERVICES)} or all")
+            overrides[service] = cast(amount)
+    return overrides
+
+
+def start_fakes(args, workdir):
+    latency = parse_overrides(args.latency)
+    failures = parse_overrides(args.fail)
+
+    def options(name):
+        return {"latency": latency.get(name, 0.0), "failure_rate": failures.get(name, 0.0), "seed": args.seed}
+
+    return {
+        "prometheus": FakePrometheus(instances=args.instances, hot=args.hot, **options("prometheus")).start(),
+        "loki": FakeLoki(**options("loki")).start(),
+        "slack": FakeSlack(failure_status=args.slack_failure_status, **options("slack")).start(),
+        "ollama": FakeOllama(token_delay=args.token_delay, **options("ollama")).start(),
+        "app": FakeApp(**options("app")).start(),
+        "docker": FakeDocker(os.path.join(workdir, 'docker.sock'), **options("docker")).start()
+    }
+
+
+def configure_environment(fakes, workdir):
+    # Must run before any agent module is imported: they read these at import
+    instances = fakes["prometheus"].instance_names
+    containers = {instance: f"app-{i}" for i, instance in enumerate(instances)}
+    os.environ.update({
+        "PROMETHEUS_URL": fakes["prometheus"].url,
+        "LOKI_URL": fakes["loki"].url,
+        "SLACK_WEBHOOK_URL": f"{fakes['slack'].url}/services/T000/B000/bench",
+        "DOCKER_SOCKET": fakes["docker"].socket_path,
+        "OPSBOT_PROBE_URLS": json.dumps({container: f"{fakes['app'].url}/" for container in containers.values()}),
+        "OPSBOT_TARGETS": json.dumps({instance: {"container": container} for instance, container in containers.items()}),
+        "OPSBOT_HISTORY_DB": os.path.join(workdir, 'incidents.db'),
+        "OPSBOT_QUEUE_DB": os.path.join(workdir, 'notify_queue.db')
+    })
+
+
+def redirect_logging(workdir):
+    # Must run before the agent modules are imported: the first
+    # configure_logging call wins, so the later ones in orchestrate and the
+    # dashboard leave benchmark logs in the work directory.
+    import log_config
+    log_config.configure_logging(log_file=os.path.join(workdir, 'opsbot.log'), console=False)
+
+
+def write_local_log(workdir, minutes=30):
+    """App log for the local fallback: the recorded error lines among request noise."""
+    recorded = load_fixture("loki_query_range.json")["data"]["result"][0]["values"]
+    # Keep "LEVEL - message" and restamp it
+    lines = [line.split(" - ", 1)[1] for _, line in recorded]
+    path = os.path.join(workdir, 'app.log')
+    now = time.time()
+    with open(path, 'w') as f:
+        for tick, second in enumerate(range(int(now) - minutes * 60, int(now), 5)):
+            stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(second))
+            f.write(f"{stamp},000 - INFO - 172.18.0.6 - - \"GET /metrics HTTP/1.1\" 200 -\n")
+            if tick % 12 == 0:
+                f.write(f"{stamp},500 - {lines[tick // 12 % len(lines)]}\n")
+    return path
+
+
+def load_agent(fakes, workdir, args, recorder):
+    sys.path.insert(0, AGENT_DIR)
+    redirect_logging(workdir)
+    started = time.perf_counter()
+    import orchestrate
+    recorder.add("import", time.perf_counter() - started)
+    import analyze
+    import loki
+    import local_logs
+    from llm import LLMGateway, ollama_factory
+
+    analyze.log_tail = loki.LokiTail(cursor_file=os.path.join(workdir, 'loki_cursor.json'))
+    analyze.local_logs = local_logs.LocalLogSource(write_local_log(workdir), index_file=os.path.join(workdir, 'local_log_index.json'))
+    orchestrate.llm = LLMGateway(
+        ollama_factory(model=fakes["ollama"].model, base_url=fakes["ollama"].url,
+                       timeout=orchestrate.STAGE_TIMEOUTS["llm"]),
+        model=fakes["ollama"].model,
+        timeout=orchestrate.STAGE_TIMEOUTS["llm"],
+        ttl=0 if args.no_llm_cache else 3600,
+        cache_file=os.path.join(workdir, 'llm_cache.json')
+    )
+    # run_agent looks the stages up as module globals, so wrapping them
+    # there times every call without touching the agent code.
+    for stage, name in [("monitor", "monitor_metrics"), ("analyze", "analyze_logs"),
+                        ("remediate", "remediate_service"), ("notify", "send_notification"),
+                        ("llm", "summarize_incident"), ("incident", "handle_incident")]:
+        setattr(orchestrate, name, recorder.timed(stage, getattr(orchestrate, name)))
+    return orchestrate
+
+
+def load_dashboard():
+    spec = importlib.util.spec_from_file_location("dashboard_server", os.path.join(ROOT, 'dashboard', 'server.py'))
+    server = importlib.util.module_from_spec(spec)
+    # Flask finds templates relative to the module registered under its name
+    sys.modules[spec.name] = server
+    spec.loader.exec_module(server)
+    return server
+
+
+def wait_for_background_work(orchestrate):
+    """Let queued LLM summaries and Slack deliveries finish before reporting."""
+    import notify
+    deadline = time.monotonic() + DRAIN_TIMEOUT
+    for future in list(orchestrate._llm_pending):
+        try:
+            future.result(timeout=max(0, deadline - time.monotonic()))
+        except Exception:
+            pass
+    dispatcher = notify._dispatcher
+    if dispatcher is None:
+        return {}
+    while time.monotonic() < deadline and dispatcher.stats()["queue"].get("pending", 0):
+        time.sleep(0.1)
+    return dispatcher.stats()
+
+
+def top_allocations(before, after, limit=10):
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap*>")]
+    stats = after.filter_traces(filters).compare_to(before.filter_traces(filters), "lineno")
+    return [
+        {"location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+         "size_kb": round(stat.size_diff / 1024, 1), "blocks": stat.count_diff}
+        for stat in stats[:limit]
+    ]
+
+
+def run_benchmark(args):
+    workdir = args.workdir or tempfile.mkdtemp(prefix="opsbot-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    fakes = start_fakes(args, workdir)
+    configure_environment(fakes, workdir)
+
+    recorder = Recorder()
+    load_started = time.perf_counter()
+    orchestrate = load_agent(fakes, workdir, args, recorder)
+    from dispatch import percentile
+
+    # As in the agent's entry point, the model loads while the cycles run
+    def warm_up():
+        seconds = orchestrate.llm.warm_up(base_url=fakes["ollama"].url)
+        if seconds is not None:
+            recorder.add("llm_warmup", seconds)
+    warm_up_thread = threading.Thread(target=warm_up, daemon=True)
+    warm_up_thread.start()
+
+    if args.trace_allocations:
+        tracemalloc.start(args.trace_frames)
+        before = tracemalloc.take_snapshot()
+
+    started = time.perf_counter()
+    errors = 0
+    for _ in range(args.cycles):
+        cycle_started = time.perf_counter()
+        result = orchestrate.run_agent()
+        recorder.add("cycle", time.perf_counter() - cycle_started)
+        if "startup" not in recorder.samples:
+            recorder.add("startup", time.perf_counter() - load_started)
+        errors += "error" in result
+    elapsed = time.perf_counter() - started
+    delivery = wait_for_background_work(orchestrate)
+    warm_up_thread.join(DRAIN_TIMEOUT)
+
+    dashboard = Recorder()
+    if args.dashboard_requests:
+        client = load_dashboard().app.test_client()
+        for route in DASHBOARD_ROUTES:
+            for _ in range(args.dashboard_requests):
+                request_started = time.perf_counter()
+                response = client.get(route)
+                dashboard.add(route, time.perf_counter() - request_started)
+                errors += response.status_code >= 400
+
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "cycles": args.cycles,
+        "cycle_errors": errors,
+        "cycles_per_second": round(args.cycles / elapsed, 3),
+        "stages": recorder.summary(percentile),
+        "dashboard": dashboard.summary(percentile),
+        "notifications": delivery,
+        "services": {name: fake.stats() for name, fake in fakes.items()},
+        # ru_maxrss is reported in kilobytes on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    }
+    if args.trace_allocations:
+        after = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        report["allocations"] = {
+            "traced_peak_mb": round(peak / 1024 / 1024, 2),
+            "traced_current_mb": round(current / 1024 / 1024, 2),
+            "top_growth": top_allocations(before, after)
+        }
+
+    for fake in fakes.values():
+        fake.stop()
+    if not args.workdir and not args.keep:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+def print_report(report):
+    print(f"cycles: {report['cycles']}  errors: {report['cycle_errors']}  "
+          f"cycles/s: {report['cycles_per_second']}  peak RSS: {report['peak_rss_mb']} MB")
+    for title, rows in (("stage", report["stages"]), ("dashboard route", report["dashboard"])):
+        if not rows:
+            continue
+        print(f"\n{title:<22} {'count':>6} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'max ms':>10}")
+        for name, row in rows.items():
+            print(f"{name:<22} {row['count']:>6} {row['p50_ms']:>10} {row['p95_ms']:>10} {row['p99_ms']:>10} {row['max_ms']:>10}")
+    print(f"\nnotifications: {report['notifications']}")
+    print("services: " + ", ".join(f"{name} {stats}" for name, stats in report["services"].items()))
+    if "allocations" in report:
+        allocations = report["allocations"]
+        print(f"\ntraced peak: {allocations['traced_peak_mb']} MB  retained: {allocations['traced_current_mb']} MB")
+        for site in allocations["top_growth"]:
+            print(f"  {site['size_kb']:>10} KB {site['blocks']:>8} blocks  {site['location']}")
+
+
+def compare_to_baseline(report, baseline, tolerance):
+    """Return a list of regressions beyond the tolerance (0.25 = 25%)."""
+    regressions = []
+    for section in ("stages", "dashboard"):
+        for name, row in baseline.get(section, {}).items():
+            current = report[section].get(name)
+            if current and row["p95_ms"] and current["p95_ms"] > row["p95_ms"] * (1 + tolerance):
+                regressions.append(f"{section} {name} p95 {row['p95_ms']} -> {current['p95_ms']} ms")
+    if report["cycles_per_second"] < baseline["cycles_per_second"] * (1 - tolerance):
+        regressions.append(f"cycles/s {baseline['cycles_per_second']} -> {report['cycles_per_second']}")
+    if report["peak_rss_mb"] > baseline["peak_rss_mb"] * (1 + tolerance):
+        regressions.append(f"peak RSS {baseline['peak_rss_mb']} -> {report['peak_rss_mb']} MB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the agent and dashboard against fake backends")
+    parser.add_argument("--cycles", type=int, default=10, help="agent cycles to run back to back")
+    parser.add_argument("--instances", type=int, default=4, help="instances served by the fake Prometheus")
+    parser.add_argument("--hot", type=int, default=1, help="how many of them report anomalous CPU")
+    parser.add_argument("--latency", action="append", metavar="SERVICE=SECONDS", help="added latency per request (repeatable, SERVICE may be all)")
+    parser.add_argument("--fail", action="append", metavar="SERVICE=RATE", help="fraction of requests that fail (repeatable)")
+    parser.add_argument("--slack-failure-status", type=int, default=500, help="status for injected Slack failures, e.g. 429")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="seconds per streamed Ollama token")
+    parser.add_argument("--no-llm-cache", action="store_true", help="send every summary to the fake Ollama")
+    parser.add_argument("--dashboard-requests", type=int, default=50, help="requests per dashboard route, 0 to skip")
+    parser.add_argument("--trace-allocations", action="store_true", help="track allocations with tracemalloc (slows the run)")
+    parser.add_argument("--trace-frames", type=int, default=1, help="traceback depth kept by tracemalloc")
+    parser.add_argument("--seed", type=int, default=0, help="seed for injected latency and failures")
+    parser.add_argument("--workdir", help="directory for databases, cursors and logs (kept)")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary work directory")
+    parser.add_argument("--output", help="write the report as JSON")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed regression against the baseline")
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            regressions = compare_to_baseline(report, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\nNo regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
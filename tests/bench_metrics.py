@@ -0,0 +1,46 @@
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'agent'))
+import metrics
+
+ITERATIONS = 1_000_000
+BUDGET_NS = 1000  # per instrumented stage while nothing scrapes
+
+def per_call_ns(fn, number=ITERATIONS):
+    baseline = timeit.timeit(lambda: None, number=number)
+    return (timeit.timeit(fn, number=number) - baseline) / number * 1e9
+
+def run_benchmark():
+    registry = []
+    stage_seconds = metrics.Histogram("bench_stage_duration_seconds", "bench", ["stage"], registry=registry)
+    retries = metrics.Counter("bench_query_retries_total", "bench", ["backend"], registry=registry)
+    child = stage_seconds.labels("monitor")
+    counter = retries.labels("prometheus")
+
+    def instrumented_stage():
+        # What run_stage adds around a stage
+        started = time.perf_counter()
+        child.observe(time.perf_counter() - started)
+
+    results = [
+        ("stage timing (bound child)", per_call_ns(instrumented_stage)),
+        ("histogram observe", per_call_ns(lambda: child.observe(0.042))),
+        ("counter inc", per_call_ns(counter.inc)),
+        ("labels() lookup + inc", per_call_ns(lambda: retries.labels("prometheus").inc()))
+    ]
+    started = time.perf_counter()
+    text = metrics.render(registry)
+    render_ms = (time.perf_counter() - started) * 1000
+
+    for name, ns in results:
+        print(f"{name:<28} {ns:>8.0f} ns")
+    print(f"{'scrape (fold + render)':<28} {render_ms:>8.2f} ms ({len(text)} bytes)")
+    stage_ns = results[0][1]
+    print(f"\nstage instrumentation {'within' if stage_ns < BUDGET_NS else 'OVER'} the {BUDGET_NS} ns budget")
+    return stage_ns < BUDGET_NS
+
+if __name__ == "__main__":
+    sys.exit(0 if run_benchmark() else 1)
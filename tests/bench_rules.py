@@ -0,0 +1,55 @@
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'agent'))
+from rules import DEFAULT_RULES, RuleEngine
+
+SAMPLE_LOG = os.path.join(os.path.dirname(__file__), '..', 'logs', 'app.log')
+SIZES = [1_375, 100_000, 1_000_000]  # app.log scale, then much larger
+
+def build_log(path, lines, template):
+    with open(path, 'w') as f:
+        written = 0
+        while written < lines:
+            chunk = template[:lines - written]
+            f.writelines(chunk)
+            written += len(chunk)
+
+def naive_classify(path):
+    # Baseline: one regex per rule, tried in turn on every line
+    patterns = [(rule["category"], re.compile(rule["pattern"])) for rule in DEFAULT_RULES]
+    counts = {}
+    with open(path, 'r', errors='replace') as f:
+        for line in f:
+            for category, pattern in patterns:
+                if pattern.search(line):
+                    counts[category] = counts.get(category, 0) + 1
+                    break
+    return counts
+
+def run_benchmark():
+    engine = RuleEngine(DEFAULT_RULES)
+    with open(SAMPLE_LOG, 'r', errors='replace') as f:
+        template = f.readlines()
+    print(f"{'lines':>10} {'combined lines/s':>18} {'per-rule lines/s':>18} {'matched':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in SIZES:
+            path = os.path.join(tmp, f"app_{size}.log")
+            build_log(path, size, template)
+
+            start = time.perf_counter()
+            with open(path, 'r', errors='replace') as f:
+                result = engine.classify(f)
+            combined = size / (time.perf_counter() - start)
+
+            start = time.perf_counter()
+            naive_classify(path)
+            naive = size / (time.perf_counter() - start)
+
+            print(f"{size:>10} {combined:>18,.0f} {naive:>18,.0f} {result['matched']:>8}")
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,9 @@
+import os
+import tempfile
+
+# Agent modules open their databases and log file under logs/ at import;
+# point them at a scratch directory so test runs never touch real state.
+_scratch = tempfile.mkdtemp(prefix="opsbot-tests-")
+for _name, _file in (("OPSBOT_HISTORY_DB", "incidents.db"), ("OPSBOT_INCIDENT_DB", "incidents.db"),
+                     ("OPSBOT_QUEUE_DB", "notify_queue.db"), ("OPSBOT_LOG_FILE", "opsbot.log")):
+    os.environ.setdefault(_name, os.path.join(_scratch, _file))
@@ -0,0 +1,423 @@
+import json
+import os
+import random
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# In-process stand-ins for Prometheus, Loki, Slack, Ollama, the app's HTTP
+# endpoint and the Docker daemon. Responses are replayed from the recordings
+# in tests/fixtures, re-stamped to the current time and fanned out to the
+# requested number of instances.
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+NS = 1_000_000_000
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES, name), 'r') as f:
+        return json.load(f)
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, obj, status=200, headers=None):
+        self.send_body(json.dumps(obj).encode(), status, "application/json", headers)
+
+    def send_body(self, body, status=200, content_type="text/plain", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length) if length else b""
+
+    def handle_one_request(self):
+        # Count, delay and optionally fail every request before routing it
+        self.raw_requestline = self.rfile.readline(65537)
+        if not self.raw_requestline:
+            self.close_connection = True
+            return
+        if not self.parse_request():
+            return
+        service = self.server.service
+        if service.begin_request():
+            self.read_body()
+            status = service.failure_status
+            headers = {"Retry-After": str(service.retry_after)} if status == 429 else None
+            self.send_json({"error": "injected failure", "message": "injected failure"}, status, headers)
+            return
+        method = getattr(self, f"do_{self.command}", None)
+        if method is None:
+            self.send_error(501)
+            return
+        method()
+        self.wfile.flush()
+
+
+class FakeService:
+    """One fake backend on an ephemeral localhost port.
+
+    Every request waits `latency` seconds (plus up to `jitter`) and fails
+    with `failure_status` with probability `failure_rate`.
+    """
+
+    handler = FakeHandler
+
+    def __init__(self, latency=0.0, jitter=0.0, failure_rate=0.0, failure_status=500, retry_after=1, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.failures = 0
+        self.lock = threading.Lock()
+        self.server = None
+
+    def begin_request(self):
+        """Apply the configured latency; returns True if this request should fail."""
+        with self.lock:
+            self.requests += 1
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            fail = self.random.random() < self.failure_rate
+            if fail:
+                self.failures += 1
+        if delay > 0:
+            time.sleep(delay)
+        return fail
+
+    def make_server(self):
+        return ThreadingHTTPServer(("127.0.0.1", 0), self.handler)
+
+    def start(self):
+        self.server = self.make_server()
+        self.server.daemon_threads = True
+        self.server.service = self
+        threading.Thread(target=self.server.serve_forever, name=type(self).__name__, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stats(self):
+        return {"requests": self.requests, "failures": self.failures}
+
+
+class PrometheusHandler(FakeHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        service = self.server.service
+        if url.path == "/api/v1/query":
+            self.send_json(service.instant(params.get("query", ""), float(params.get("time", time.time()))))
+        elif url.path == "/api/v1/query_range":
+            self.send_json(service.range(params.get("query", ""), float(params["start"]), float(params["end"]), params.get("step", "15s")))
+        elif url.path == "/api/v1/targets":
+            self.send_json(service.targets())
+        else:
+            self.send_json({"status": "error", "error": f"unknown path {url.path}"}, 404)
+
+
+class FakePrometheus(FakeService):
+    """Serves `instances` copies of the recorded node-exporter series.
+
+    The first `hot` instances keep the recorded (anomalous) CPU level and a
+    slowly rising memory curve; the rest report a fraction of it.
+    """
+
+    handler = PrometheusHandler
+
+    def __init__(self, instances=1, hot=1, **kwargs):
+        super().__init__(**kwargs)
+        self.recorded = {
+            series["metric"]["metric"]: float(series["value"][1])
+            for series in load_fixture("prometheus_query.json")["data"]["result"]
+        }
+        recorded_target = load_fixture("prometheus_targets.json")["data"]["activeTargets"][0]
+        self.target_template = recorded_target
+        self.instance_names = [
+            recorded_target["labels"]["instance"] if i == 0 else f"node-exporter-{i}:9100"
+            for i in range(instances)
+        ]
+        self.hot = set(self.instance_names[:hot])
+
+    def value(self, metric, instance, timestamp):
+        recorded = self.recorded[metric]
+        if instance not in self.hot:
+            return recorded * 0.3
+        if metric == "memory":
+            # About 2% per hour of growth so trend analysis has a leak to find
+            return min(99.0, recorded + (timestamp % 86400) / 3600 * 2)
+        return recorded
+
+    def metrics_for(self, promql):
+        # The combined sample query carries a "metric" label per half; the
+        # memory trend query is a bare memory series.
+        return ["cpu", "memory"] if "label_replace" in promql else [None]
+
+    def processes(self, timestamp):
+        # The sample app's per-process series: idle workers and one busy load job
+        result = []
+        for pid, role, cpu, rss in [(1, "master", 0.01, 27e6), (7, "worker", 0.02, 36e6),
+                                    (8, "worker", 0.02, 34e6), (12, "load", 0.97, 26e6)]:
+            for metric, value in (("cpu", cpu), ("rss", rss)):
+                labels = {"instance": "app:8080", "job": "app", "pid": str(pid), "role": role, "metric": metric}
+                result.append({"metric": labels, "value": [timestamp, str(value)]})
+        return result
+
+    def instant(self, promql, timestamp):
+        if "app_process_" in promql:
+            return {"status": "success", "data": {"resultType": "vector", "result": self.processes(timestamp)}}
+        result = []
+        for instance in self.instance_names:
+            for metric in self.metrics_for(promql):
+                labels = {"instance": instance, **({"metric": metric} if metric else {})}
+                value = self.value(metric or "memory", instance, timestamp)
+                result.append({"metric": labels, "value": [timestamp, str(value)]})
+        return {"status": "success", "data": {"resultType": "vector", "result": result}}
+
+    def range(self, promql, start, end, step):
+        step_seconds = float(step.rstrip("s"))
+        timestamps = []
+        ts = start
+        while ts <= end and len(timestamps) < 11000:
+            timestamps.append(ts)
+            ts += step_seconds
+        result = []
+        for instance in self.instance_names:
+            for metric in self.metrics_for(promql):
+                labels = {"instance": instance, **({"metric": metric} if metric else {})}
+                values = [[t, str(self.value(metric or "memory", instance, t))] for t in timestamps]
+                result.append({"metric": labels, "values": values})
+        return {"status": "success", "data": {"resultType": "matrix", "result": result}}
+
+    def targets(self):
+        active = []
+        for instance in self.instance_names:
+            target = json.loads(json.dumps(self.target_template))
+            target["labels"]["instance"] = instance
+            target["discoveredLabels"]["__address__"] = instance
+            target["scrapeUrl"] = f"http://{instance}/metrics"
+            active.append(target)
+        return {"status": "success", "data": {"activeTargets": active, "droppedTargets": []}}
+
+
+class LokiHandler(FakeHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if url.path != "/loki/api/v1/query_range":
+            self.send_json({"status": "error", "error": f"unknown path {url.path}"}, 404)
+            return
+        self.send_json(self.server.service.query_range(
+            int(params["start"]), int(params["end"]), int(params.get("limit", 100)), params.get("direction", "backward")
+        ))
+
+
+class FakeLoki(FakeService):
+    """Replays the recorded error lines as one entry every `interval` seconds."""
+
+    handler = LokiHandler
+
+    def __init__(self, interval=5.0, **kwargs):
+        super().__init__(**kwargs)
+        recorded = load_fixture("loki_query_range.json")["data"]["result"][0]
+        self.labels = recorded["stream"]
+        self.lines = [line for _, line in recorded["values"]]
+        self.interval_ns = int(interval * NS)
+
+    def query_range(self, start_ns, end_ns, limit, direction):
+        first = -(-start_ns // self.interval_ns)
+        last = end_ns // self.interval_ns
+        slots = range(first, last + 1) if direction == "forward" else range(last, first - 1, -1)
+        values = [
+            [str(slot * self.interval_ns), self.lines[slot % len(self.lines)]]
+            for slot in slots[:limit]
+        ]
+        result = [{"stream": self.labels, "values": values}] if values else []
+        return {"status": "success", "data": {"resultType": "streams", "result": result, "stats": {}}}
+
+
+class SlackHandler(FakeHandler):
+    def do_POST(self):
+        self.server.service.received.append(json.loads(self.read_body() or b"{}"))
+        self.send_body(b"ok")
+
+
+class FakeSlack(FakeService):
+    handler = SlackHandler
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.received = []
+
+    def stats(self):
+        return {**super().stats(), "delivered": len(self.received)}
+
+
+class OllamaHandler(FakeHandler):
+    def do_GET(self):
+        service = self.server.service
+        if urlparse(self.path).path == "/api/tags":
+            self.send_json({"models": [{"name": service.model, "model": service.model}]})
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        service = self.server.service
+        request = json.loads(self.read_body() or b"{}")
+        if urlparse(self.path).path == "/api/generate" and not request.get("prompt"):
+            # A prompt-less generate only loads the model
+            time.sleep(service.load_time)
+            self.send_json({"model": request.get("model", service.model), "response": "", "done": True, "done_reason": "load"})
+            return
+        if urlparse(self.path).path != "/api/chat":
+            self.send_json({"error": "not found"}, 404)
+            return
+        model = request.get("model", service.model)
+        if not request.get("stream", True):
+            time.sleep(service.token_delay * len(service.chunks))
+            self.send_json(service.message(model, "".join(service.chunks), done=True))
+            return
+        # Stream newline-delimited JSON, one recorded token at a time
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for chunk in service.chunks:
+            time.sleep(service.token_delay)
+            self.write_chunk(json.dumps(service.message(model, chunk)).encode() + b"\n")
+        self.write_chunk(json.dumps(service.message(model, "", done=True)).encode() + b"\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+class FakeOllama(FakeService):
+    """Streams the recorded chat reply with `token_delay` seconds per token.
+
+    Loading the model (a prompt-less /api/generate) takes `load_time` seconds.
+    """
+
+    handler = OllamaHandler
+
+    def __init__(self, token_delay=0.01, load_time=0.5, **kwargs):
+        super().__init__(**kwargs)
+        self.load_time = load_time
+        recorded = load_fixture("ollama_chat.json")
+        self.model = recorded["model"]
+        self.chunks = recorded["chunks"]
+        self.token_delay = token_delay
+
+    def message(self, model, content, done=False):
+        message = {
+            "model": model,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "message": {"role": "assistant", "content": content},
+            "done": done
+        }
+        if done:
+            message.update({"done_reason": "stop", "eval_count": len(self.chunks), "prompt_eval_count": 0})
+        return message
+
+
+class AppHandler(FakeHandler):
+    def do_GET(self):
+        self.send_body(b"ok")
+
+
+class FakeApp(FakeService):
+    """The app's HTTP endpoint used as the post-restart health probe."""
+
+    handler = AppHandler
+
+
+class DockerHandler(FakeHandler):
+    def do_POST(self):
+        path = urlparse(self.path).path
+        if path.endswith("/restart"):
+            self.server.service.restart(path.split("/")[2])
+            self.send_body(b"", 204)
+        else:
+            self.send_json({"message": f"page not found: {path}"}, 404)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path.startswith("/containers/") and path.endswith("/json"):
+            self.send_json(self.server.service.inspect(path.split("/")[2]))
+        else:
+            self.send_json({"message": f"page not found: {path}"}, 404)
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ("localhost", 0)
+
+
+class FakeDocker(FakeService):
+    """Docker Engine API on a unix socket; restarts take `restart_time` seconds."""
+
+    handler = DockerHandler
+
+    def __init__(self, socket_path, restart_time=0.2, boot_time=0.3, **kwargs):
+        super().__init__(**kwargs)
+        self.socket_path = socket_path
+        self.restart_time = restart_time
+        self.boot_time = boot_time
+        self.restarted_at = {}
+        self.restarts = 0
+
+    def make_server(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        return UnixHTTPServer(self.socket_path, self.handler)
+
+    @property
+    def url(self):
+        return f"unix://{self.socket_path}"
+
+    def restart(self, container):
+        time.sleep(self.restart_time)
+        with self.lock:
+            self.restarts += 1
+            self.restarted_at[container] = time.monotonic()
+
+    def inspect(self, container):
+        booted = time.monotonic() - self.restarted_at.get(container, 0) >= self.boot_time
+        status = "running" if booted else "restarting"
+        return {
+            "Name": f"/{container}",
+            "State": {
+                "Status": status,
+                "Running": booted,
+                "Restarting": not booted,
+                "Health": {"Status": "healthy" if booted else "starting"}
+            }
+        }
+
+    def stats(self):
+        return {**super().stats(), "restarts": self.restarts}
@@ -0,0 +1,41 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'agent'))
+
+from detect import DetectorConfig, SeriesState
+
+
+def seeded_state(level, jitter=0.3, samples=60):
+    state = SeriesState(DetectorConfig())
+    values = [level + (jitter if i % 2 else -jitter) for i in range(samples)]
+    state.seed([float(i) for i in range(samples)], values)
+    return state
+
+
+def test_quiet_series_jitter_is_not_a_spike():
+    verdict = seeded_state(3.0).evaluate(60.0, 7.0)
+    assert "spike" not in verdict["rules"]
+    # The std floor keeps a flat baseline from inflating the z-score
+    assert verdict["zscore"] <= 4.0
+
+
+def test_spike_above_floor_fires():
+    verdict = seeded_state(30.0).evaluate(60.0, 75.0)
+    assert "spike" in verdict["rules"]
+
+
+def test_spike_alone_does_not_make_target_anomalous():
+    from detect import AnomalyDetector
+    from monitor import evaluate_targets
+
+    detector = AnomalyDetector()
+    detector.seed("cpu", "app:8080", [float(i) for i in range(60)],
+                  [30.0 + (0.3 if i % 2 else -0.3) for i in range(60)])
+    series = [("cpu", "app:8080", 60.0, 45.0)]
+    detections = detector.evaluate(series)
+    assert detections and detections[0]["rules"] == ["spike"]
+    # Far below the threshold, a spike is reported but nothing is remediated
+    target = evaluate_targets(series, detections)["app:8080"]
+    assert not target["anomaly_detected"]
+    assert target["detections"] == detections
@@ -0,0 +1,124 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'agent'))
+
+import dispatch
+import notify
+from dispatch import Dispatcher, SlackSink
+from fake_services import FakeSlack
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return predicate()
+
+
+def outbox(dispatcher):
+    with dispatcher.cond:
+        return dispatcher.conn.execute("SELECT status, attempts, last_error FROM outbox").fetchall()
+
+
+@pytest.fixture
+def slack():
+    service = FakeSlack().start()
+    yield service
+    service.stop()
+
+
+@pytest.fixture
+def make_dispatcher(tmp_path, slack):
+    def make(**kwargs):
+        dispatcher = Dispatcher(db_path=str(tmp_path / "queue.db"), **kwargs)
+        dispatcher.register_sink("slack", SlackSink(slack.url))
+        return dispatcher
+    return make
+
+
+def test_failed_posts_are_retried_with_backoff(monkeypatch, slack, make_dispatcher):
+    monkeypatch.setattr(dispatch, "BACKOFF_BASE", 0.05)
+    slack.failure_rate = 1.0
+    dispatcher = make_dispatcher()
+    dispatcher.enqueue("slack", {"text": "cpu high"})
+    assert wait_for(lambda: slack.requests >= 3)
+    slack.failure_rate = 0.0
+    assert wait_for(lambda: slack.received)
+    assert slack.received == [{"text": "cpu high"}]
+    status, attempts, _ = outbox(dispatcher)[0]
+    assert status == "delivered" and attempts >= 4
+
+
+def test_retries_stop_after_max_attempts(monkeypatch, slack, make_dispatcher):
+    monkeypatch.setattr(dispatch, "BACKOFF_BASE", 0.01)
+    slack.failure_rate = 1.0
+    dispatcher = make_dispatcher(max_attempts=3)
+    dispatcher.enqueue("slack", {"text": "cpu high"})
+    assert wait_for(lambda: outbox(dispatcher)[0][0] == "failed")
+    assert slack.requests == 3
+
+
+def test_client_errors_are_not_retried(slack, make_dispatcher):
+    slack.failure_rate, slack.failure_status = 1.0, 400
+    dispatcher = make_dispatcher()
+    dispatcher.enqueue("slack", {"text": "cpu high"})
+    assert wait_for(lambda: outbox(dispatcher)[0][0] == "failed")
+    assert slack.requests == 1
+
+
+def test_rate_limit_waits_for_retry_after(slack, make_dispatcher):
+    slack.failure_rate, slack.failure_status, slack.retry_after = 1.0, 429, 0.5
+    dispatcher = make_dispatcher()
+    started = time.monotonic()
+    dispatcher.enqueue("slack", {"text": "cpu high"})
+    assert wait_for(lambda: slack.requests == 1)
+    slack.failure_rate = 0.0
+    assert wait_for(lambda: slack.received)
+    assert time.monotonic() - started >= 0.5
+    # Rate-limited attempts do not use up the retry budget
+    status, attempts, _ = outbox(dispatcher)[0]
+    assert status == "delivered" and attempts == 1
+
+
+def test_queued_notifications_survive_a_restart(monkeypatch, slack, make_dispatcher):
+    delivered = []
+    stopped = make_dispatcher()
+    # No worker: the agent stopped before it could deliver
+    monkeypatch.setattr(stopped, "start", lambda: None)
+    stopped.enqueue("slack", {"text": "cpu high"}, record={"instance": "app:8080"})
+    stopped.conn.close()
+    assert slack.requests == 0
+
+    restarted = make_dispatcher(on_delivered=lambda sink, record: delivered.append((sink, record)))
+    restarted.start()
+    assert wait_for(lambda: delivered)
+    assert slack.received == [{"text": "cpu high"}]
+    assert delivered == [("slack", {"instance": "app:8080"})]
+
+
+def test_delivered_notifications_are_not_sent_again(slack, make_dispatcher):
+    dispatcher = make_dispatcher()
+    dispatcher.enqueue("slack", {"text": "cpu high"})
+    assert wait_for(lambda: slack.received)
+    # Another run over the same queue only picks up pending rows
+    make_dispatcher().start()
+    time.sleep(0.3)
+    assert slack.received == [{"text": "cpu high"}]
+
+
+def test_parallel_notifiers_share_one_dispatcher(monkeypatch, slack):
+    monkeypatch.setattr(notify, "_dispatcher", None)
+    dispatchers = []
+    threads = [threading.Thread(target=lambda: dispatchers.append(notify.get_dispatcher(slack.url))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(map(id, dispatchers))) == 1
@@ -0,0 +1,55 @@
+import os
+import shutil
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'agent'))
+
+import history
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'notification_history.json')
+
+
+def reopen():
+    """Forget the open store, as a new agent or dashboard process would."""
+    history._initialized = False
+    history._local = threading.local()
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    legacy = tmp_path / "notification_history.json"
+    shutil.copy(FIXTURE, legacy)
+    monkeypatch.setattr(history, "DB_PATH", str(tmp_path / "incidents.db"))
+    monkeypatch.setattr(history, "LEGACY_JSON", str(legacy))
+    monkeypatch.setattr(history, "_initialized", False)
+    monkeypatch.setattr(history, "_local", threading.local())
+    return legacy
+
+
+def test_legacy_json_is_migrated_once(store):
+    entries = history.query_entries()
+    assert len(entries) == 5
+    # Newest first, with severity derived from the usage figures
+    assert [entry["timestamp"] for entry in entries] == sorted((entry["timestamp"] for entry in entries), reverse=True)
+    assert {entry["timestamp"]: entry["severity"] for entry in entries}[1751817702] == "critical"
+    assert entries[0]["cpu_usage"] is None
+
+    reopen()
+    history.init_store()
+    assert len(history.query_entries()) == 5
+
+
+def test_query_filters(store):
+    history.append_entry({"timestamp": 1751822000, "cpu_usage": 99.0, "remediation": "Restarted app container",
+                          "instance": "app:8080"})
+    assert [entry["timestamp"] for entry in history.query_entries(start=1751820100, end=1751821000)] == \
+        [1751821000, 1751820500, 1751820100]
+    assert [entry["timestamp"] for entry in history.query_entries(action="Restarted app container")] == \
+        [1751822000, 1751819865]
+    assert [entry["timestamp"] for entry in history.query_entries(severity="warning")] == [1751820100]
+    assert [entry["timestamp"] for entry in history.query_entries(instance="app:8080")] == [1751822000, 1751820100]
+    assert [entry["timestamp"] for entry in history.query_entries(severity="critical", instance="app:8080")] == [1751822000]
+    assert len(history.query_entries(limit=2)) == 2
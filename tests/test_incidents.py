@@ -0,0 +1,121 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'agent'))
+
+from incidents import IncidentTracker
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def tracker(tmp_path, clock):
+    return IncidentTracker(db_path=str(tmp_path / "incidents.db"), cooldown=300, resolve_after=2,
+                           breaker_restarts=2, breaker_window=1800, clock=clock)
+
+
+def anomaly(instance="app:8080", *metrics):
+    return {"instance": instance, "container": "app",
+            "detections": [{"metric": metric, "instance": instance} for metric in metrics or ("cpu",)]}
+
+
+def remediate(tracker, decision):
+    # What handle_incident and remediate.restart_container do for one restart
+    tracker.record_restart("app")
+    tracker.record_remediation(decision["incident"]["id"], {"attempted": True})
+
+
+def test_open_repeat_resolve(tracker):
+    opened = tracker.observe(anomaly(), {})
+    assert opened["transition"] == "opened" and opened["remediate"] and opened["notify"]
+    assert opened["incident"]["state"] == "mitigating"
+    remediate(tracker, opened)
+
+    repeat = tracker.observe(anomaly(), {})
+    assert repeat["transition"] is None and not repeat["remediate"] and not repeat["notify"]
+    assert repeat["incident"]["id"] == opened["incident"]["id"]
+    assert repeat["incident"]["cycles"] == 2
+
+    # Resolves only after RESOLVE_AFTER cycles without the target firing
+    assert tracker.sweep(set()) == []
+    resolved = tracker.sweep(set())
+    assert [incident["id"] for incident in resolved] == [opened["incident"]["id"]]
+    assert resolved[0]["state"] == "resolved"
+    assert tracker.active() == []
+    assert tracker.observe(anomaly(), {})["transition"] == "opened"
+
+
+def test_refires_after_cooldown(tracker, clock):
+    remediate(tracker, tracker.observe(anomaly(), {}))
+    clock.now += 299
+    assert tracker.observe(anomaly(), {})["transition"] is None
+    clock.now += 1
+    refiring = tracker.observe(anomaly(), {})
+    assert refiring["transition"] == "refiring" and refiring["remediate"]
+
+
+def test_breaker_blocks_restarts_and_escalates_once(tracker, clock):
+    remediate(tracker, tracker.observe(anomaly(), {}))
+    clock.now += 300
+    remediate(tracker, tracker.observe(anomaly(), {}))
+    clock.now += 300
+    assert tracker.breaker_open("app")
+
+    escalated = tracker.observe(anomaly(), {})
+    assert escalated["transition"] == "escalated" and not escalated["remediate"]
+    assert "circuit breaker open" in escalated["blocked"]
+    clock.now += 300
+    quiet = tracker.observe(anomaly(), {})
+    assert quiet["transition"] is None and not quiet["notify"]
+
+    # The breaker closes once the restarts fall out of its window
+    clock.now += 1800
+    assert not tracker.breaker_open("app")
+
+
+def test_one_restart_counts_once_for_incidents_sharing_a_container(tracker):
+    first = tracker.observe(anomaly("app:8080"), {})
+    second = tracker.observe(anomaly("app:9100"), {})
+    tracker.record_restart("app")
+    tracker.record_remediation(first["incident"]["id"], {"attempted": True})
+    tracker.record_remediation(second["incident"]["id"], {"attempted": True})
+    assert not tracker.breaker_open("app")
+
+
+def test_sweep_keeps_seen_and_still_firing_targets(tracker):
+    seen = tracker.observe(anomaly("app:8080"), {})["incident"]
+    firing = tracker.observe(anomaly("app:9100"), {})["incident"]
+    gone = tracker.observe(anomaly("host:9100"), {})["incident"]
+    for _ in range(2):
+        resolved = tracker.sweep({seen["id"]}, skip_instances={"app:9100"})
+    assert [incident["id"] for incident in resolved] == [gone["id"]]
+    assert {incident["id"] for incident in tracker.active()} == {seen["id"], firing["id"]}
+
+
+def test_new_metric_joins_the_open_incident(tracker):
+    opened = tracker.observe(anomaly("app:8080", "cpu"), {})
+    joined = tracker.observe(anomaly("app:8080", "cpu", "memory"), {})
+    assert joined["transition"] is None
+    assert joined["incident"]["id"] == opened["incident"]["id"]
+    assert joined["incident"]["metrics"] == "cpu,memory"
+    assert joined["incident"]["signature"].startswith("cpu,memory|")
+
+
+def test_incidents_survive_a_restart(tmp_path, tracker, clock):
+    opened = tracker.observe(anomaly(), {})
+    restarted = IncidentTracker(db_path=str(tmp_path / "incidents.db"), clock=clock)
+    assert [incident["id"] for incident in restarted.active()] == [opened["incident"]["id"]]
+    assert restarted.observe(anomaly(), {})["transition"] is None
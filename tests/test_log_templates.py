@@ -0,0 +1,45 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'agent'))
+
+from log_templates import TemplateMiner, estimate_tokens, render
+
+
+def test_lines_differing_in_numbers_and_ids_share_a_template():
+    lines = [f"2025-07-06 14:59:{second:02d},{second * 7:03d} - ERROR - Request {request_id} failed after {ms}ms"
+             for second, request_id, ms in ((1, "a1f3", 120), (5, "9bc0", 85), (9, "77de", 3001))]
+    summary = TemplateMiner().summarize(lines)
+    assert len(summary) == 1
+    group = summary[0]
+    assert group["template"] == "ERROR - Request <*> failed after <*>"
+    assert group["count"] == 3
+    assert group["first_seen"] == "2025-07-06 14:59:01,007"
+    assert group["last_seen"] == "2025-07-06 14:59:09,063"
+    assert group["examples"][0] == "a1f3 120ms"
+
+
+def test_different_messages_get_different_templates():
+    summary = TemplateMiner().summarize(["ERROR - OutOfMemory in app"] * 3 + ["WARNING - Infinite loop detected in app"])
+    assert [(group["template"], group["count"]) for group in summary] == [
+        ("ERROR - OutOfMemory in app", 3), ("WARNING - Infinite loop detected in app", 1)]
+
+
+def test_render_stays_within_the_token_budget():
+    services = ("billing", "checkout", "inventory", "payments", "search", "shipping", "users", "reports")
+    lines = [f"{service} upstream returned status {500 + n} after {n * 37}ms"
+             for n in range(3) for service in services]
+    templates = TemplateMiner().summarize(lines)
+    assert len(templates) == len(services)
+    for budget in (20, 40, 80):
+        rendered = render(templates, budget)
+        assert estimate_tokens(rendered) <= budget
+        assert "more templates" in rendered
+    assert "omitted" not in render(templates)
+
+
+def test_single_oversized_template_is_cut_to_fit():
+    templates = TemplateMiner().summarize(["ERROR - " + " ".join(f"word{n}x" for n in range(200))])
+    rendered = render(templates, 30)
+    assert rendered
+    assert estimate_tokens(rendered) <= 30
@@ -0,0 +1,51 @@
+import os
+import sys
+import urllib.request
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'agent'))
+
+import metrics
+
+parser = pytest.importorskip("prometheus_client.parser")
+
+
+def families(text):
+    return {family.name: family for family in parser.text_string_to_metric_families(text)}
+
+
+def test_exposition_parses_with_prometheus_client():
+    registry = []
+    stage = metrics.Histogram("test_stage_duration_seconds", "Stage time.", ["stage"], buckets=(0.1, 1), registry=registry)
+    retries = metrics.Counter("test_retries_total", "Retries.", ["backend"], registry=registry)
+    interval = metrics.Gauge("test_interval_seconds", "Interval.", registry=registry)
+    for value in (0.05, 0.5, 5):
+        stage.labels("monitor").observe(value)
+    retries.labels('odd "quoted"\nname\\').inc(2)
+    interval.set(12.5)
+
+    parsed = families(metrics.render(registry))
+    assert parsed["test_stage_duration_seconds"].type == "histogram"
+    buckets = {sample.labels["le"]: sample.value for sample in parsed["test_stage_duration_seconds"].samples
+               if sample.name.endswith("_bucket")}
+    assert buckets == {"0.1": 1, "1.0": 2, "+Inf": 3}
+    # The parser reports counters without their _total suffix
+    (sample,) = parsed["test_retries"].samples
+    assert sample.labels == {"backend": 'odd "quoted"\nname\\'} and sample.value == 2
+    assert parsed["test_interval_seconds"].samples[0].value == 12.5
+
+
+def test_metrics_endpoint_serves_valid_exposition():
+    metrics.STAGE_SECONDS.labels("monitor").observe(0.2)
+    server = metrics.start_http_server(port=0, addr="127.0.0.1")
+    try:
+        host, port = server.server_address[:2]
+        with urllib.request.urlopen(f"http://{host}:{port}/metrics", timeout=5) as response:
+            assert response.headers["Content-Type"] == metrics.CONTENT_TYPE
+            parsed = families(response.read().decode())
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert "opsbot_stage_duration_seconds" in parsed
+    assert "opsbot_missed_ticks" in parsed
@@ -0,0 +1,31 @@
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'agent'))
+
+from rules import DEFAULT_RULES, build_engine
+
+
+def test_invalid_rules_fall_back_to_defaults():
+    for rules in ([{"category": "bad", "pattern": "(unclosed"}],
+                  [{"category": "first", "pattern": "a"}, {"category": "flagged", "pattern": "(?i)oom"}],
+                  [{"category": "unknown_field", "pattern": "a", "owner": "ops"}]):
+        engine = build_engine(rules)
+        assert [rule.category for rule in engine.rules] == [rule["category"] for rule in DEFAULT_RULES]
+
+
+def test_unmapped_match_is_skipped():
+    engine = build_engine([{"category": "after_a", "pattern": "(?<=a)b"}])
+    # Stand in for a combined hit that no single rule explains at its position
+    engine.matcher = re.compile("b")
+    classification = engine.classify(["xb", "ab"])
+    assert classification["lines"] == 2
+    assert classification["matched"] == 1
+    assert classification["categories"][0]["category"] == "after_a"
+
+
+def test_only_memory_and_loop_failures_restart_by_default():
+    engine = build_engine(DEFAULT_RULES)
+    assert engine.classify(["Traceback (most recent call last):"])["actions"] == []
+    assert engine.classify(["OutOfMemory in app", "Infinite loop detected"])["actions"] == ["restart_container"]
@@ -0,0 +1,42 @@
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'agent'))
+
+import metrics
+import orchestrate
+from scheduler import CycleScheduler
+
+
+def missed_ticks():
+    return metrics.MISSED_TICKS._default.fold()
+
+
+def test_slow_monitor_skips_ticks_instead_of_overlapping(monkeypatch):
+    monkeypatch.setitem(orchestrate.STAGE_TIMEOUTS, "monitor", 0.05)
+    release = threading.Event()
+    running = []
+
+    def slow_monitor():
+        running.append(True)
+        release.wait(5)
+        running.pop()
+
+    scheduler = CycleScheduler(interval=0.02, fast_interval=0.02, max_interval=0.02, jitter=0)
+    overlapping = []
+
+    def cycle():
+        overlapping.append(len(running))
+        # The stage is abandoned at its deadline but keeps running
+        orchestrate.run_stage("monitor", slow_monitor)
+        if len(overlapping) == 1:
+            threading.Timer(0.3, release.set).start()
+        elif len(overlapping) == 3:
+            scheduler.stop()
+        return False
+
+    missed_before = missed_ticks()
+    scheduler.run(cycle, busy=orchestrate.outstanding_work)
+    assert overlapping == [0, 0, 0]
+    assert missed_ticks() > missed_before
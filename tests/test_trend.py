@@ -0,0 +1,50 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'agent'))
+
+from trend import analyze_series
+
+STEP = 15
+TIMESTAMPS = [1_700_000_000 + STEP * i for i in range(240)]
+NOISE = np.random.default_rng(7).normal(0, 0.2, len(TIMESTAMPS))
+
+
+def trends(series):
+    return {report["instance"]: report for report in analyze_series(series)}
+
+
+def test_steady_growth_is_a_leak_and_a_level_shift_is_a_step():
+    leak = [20 + 0.01 * i + noise for i, noise in enumerate(NOISE)]
+    step = [20 + (15 if i >= 120 else 0) + noise for i, noise in enumerate(NOISE)]
+    reports = trends([("leaky:8080", TIMESTAMPS, leak), ("stepped:8080", TIMESTAMPS, step)])
+    assert reports["leaky:8080"]["trend"] == "leak"
+    assert reports["leaky:8080"]["exhaustion_seconds"] is not None
+    assert reports["stepped:8080"]["trend"] == "step"
+    assert reports["stepped:8080"]["change_point"] == TIMESTAMPS[120]
+
+
+def test_flat_series_is_stable():
+    flat = [30 + noise for noise in NOISE]
+    assert trends([("flat:8080", TIMESTAMPS, flat)])["flat:8080"]["trend"] == "stable"
+
+
+def test_short_series_get_no_trend():
+    flat = [30 + noise for noise in NOISE]
+    reports = trends([("flat:8080", TIMESTAMPS, flat),
+                      ("new:8080", TIMESTAMPS[-2:], [10.0, 60.0]),
+                      ("lone:8080", TIMESTAMPS[:1], [50.0])])
+    for instance in ("new:8080", "lone:8080"):
+        assert reports[instance]["trend"] == "none"
+        assert reports[instance]["change_point"] is None
+
+
+def test_misaligned_series_is_scored_on_its_own_samples():
+    # A steady series that only started late in the window is not a step
+    late = [40 + noise for noise in NOISE[:30]]
+    flat = [30 + noise for noise in NOISE]
+    reports = trends([("flat:8080", TIMESTAMPS, flat), ("late:8080", TIMESTAMPS[-30:], late)])
+    assert reports["late:8080"]["trend"] == "stable"
+    assert reports["late:8080"]["change_point"] is None